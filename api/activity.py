@@ -0,0 +1,169 @@
+# api/activity.py
+"""
+🔥 Единая лента активности (GET /api/activity/): загрузки, репосты треков,
+новые плейлисты и репосты плейлистов авторов, на которых подписан пользователь.
+
+Четыре потока уже отсортированы в БД (время DESC, id DESC) и сливаются
+k-way merge (heapq.merge) в общий порядок (время DESC, ранг потока, id DESC).
+Курсор - позиция последнего выданного события (время, ранг, id): каждый поток
+продолжает строго после неё, так что на страницу - не больше per_page + 1 строк
+с потока, независимо от глубины.
+
+Дубликаты (трек загружен одним автором и репостнут другим, репосты нескольких
+подписок) схлопываются: объект показывается один раз - по самому свежему событию.
+"""
+import heapq
+from collections import namedtuple
+from datetime import datetime
+
+from django.db.models import Max, Q
+
+Event = namedtuple('Event', 'created_at rank id kind actor_id object_id')
+
+# kind: (ранг в общем порядке, тип объекта)
+STREAMS = {
+    'upload': (0, 'track'),
+    'repost': (1, 'track'),
+    'playlist': (2, 'playlist'),
+    'playlist_repost': (3, 'playlist'),
+}
+
+PLAYLIST_VISIBILITY = ('public', 'unlisted')
+
+
+def _stream_queryset(kind, following):
+    """(время, id события, автор, объект) потока kind для подписок following (подзапрос)"""
+    from .models import Playlist, PlaylistRepost, Track, TrackRepost
+
+    if kind == 'upload':
+        return Track.objects.filter(
+            uploaded_by_id__in=following, status='published', is_private=False
+        ).values_list('created_at', 'id', 'uploaded_by_id', 'id'), 'created_at'
+    if kind == 'repost':
+        return TrackRepost.objects.filter(
+            user_id__in=following, track__status='published', track__is_private=False
+        ).values_list('reposted_at', 'id', 'user_id', 'track_id'), 'reposted_at'
+    if kind == 'playlist':
+        return Playlist.objects.filter(
+            created_by_id__in=following, visibility__in=PLAYLIST_VISIBILITY
+        ).values_list('created_at', 'id', 'created_by_id', 'id'), 'created_at'
+    return PlaylistRepost.objects.filter(
+        user_id__in=following, playlist__visibility='public'
+    ).values_list('created_at', 'id', 'user_id', 'playlist_id'), 'created_at'
+
+
+def parse_position(values):
+    """
+    Позиция курсора (время, ранг, id) из декодированного курсора.
+    Неверные типы - InvalidCursor (иначе ошибка всплыла бы 500-кой при сравнении в БД).
+    """
+    from django.utils import timezone
+    from .pagination import InvalidCursor
+
+    if not isinstance(values, (list, tuple)) or len(values) != 3:
+        raise InvalidCursor("Неверный курсор: ожидается (время, ранг, id)")
+    created_at, rank, event_id = values
+    ranks = {stream_rank for stream_rank, _ in STREAMS.values()}
+    if not isinstance(created_at, datetime) or timezone.is_naive(created_at):
+        raise InvalidCursor("Неверный курсор: время события")
+    if isinstance(rank, bool) or not isinstance(rank, int) or rank not in ranks:
+        raise InvalidCursor("Неверный курсор: ранг потока")
+    if isinstance(event_id, bool) or not isinstance(event_id, int):
+        raise InvalidCursor("Неверный курсор: id события")
+    return created_at, rank, event_id
+
+
+def _after_position(field, rank, position):
+    """Q "строго после позиции курсора" для потока с рангом rank"""
+    created_at, position_rank, position_id = position
+    if rank < position_rank:
+        return Q(**{f'{field}__lt': created_at})
+    if rank > position_rank:
+        return Q(**{f'{field}__lte': created_at})
+    return Q(**{f'{field}__lt': created_at}) | Q(**{field: created_at, 'id__lt': position_id})
+
+
+def _fetch_stream(kind, following, position, limit):
+    rank, _ = STREAMS[kind]
+    queryset, field = _stream_queryset(kind, following)
+    if position is not None:
+        queryset = queryset.filter(_after_position(field, rank, position))
+    rows = queryset.order_by(f'-{field}', '-id')[:limit]
+    return [Event(created_at, rank, event_id, kind, actor_id, object_id)
+            for created_at, event_id, actor_id, object_id in rows]
+
+
+def _latest_events(following, events):
+    """
+    {(тип объекта, id): время самого свежего события} по всем подпискам - для объектов страницы.
+    До четырёх запросов по id объектов страницы, не зависящих от её глубины.
+    """
+    from .models import Playlist, PlaylistRepost, Track, TrackRepost
+
+    track_ids = {e.object_id for e in events if STREAMS[e.kind][1] == 'track'}
+    playlist_ids = {e.object_id for e in events if STREAMS[e.kind][1] == 'playlist'}
+
+    latest = {}
+
+    def bump(key, created_at):
+        if created_at is not None and (key not in latest or created_at > latest[key]):
+            latest[key] = created_at
+
+    if track_ids:
+        for track_id, created_at in Track.objects.filter(
+                id__in=track_ids, uploaded_by_id__in=following).values_list('id', 'created_at'):
+            bump(('track', track_id), created_at)
+        for track_id, created_at in TrackRepost.objects.filter(
+                track_id__in=track_ids, user_id__in=following
+        ).values('track_id').annotate(m=Max('reposted_at')).values_list('track_id', 'm'):
+            bump(('track', track_id), created_at)
+    if playlist_ids:
+        for playlist_id, created_at in Playlist.objects.filter(
+                id__in=playlist_ids, created_by_id__in=following).values_list('id', 'created_at'):
+            bump(('playlist', playlist_id), created_at)
+        for playlist_id, created_at in PlaylistRepost.objects.filter(
+                playlist_id__in=playlist_ids, user_id__in=following
+        ).values('playlist_id').annotate(m=Max('created_at')).values_list('playlist_id', 'm'):
+            bump(('playlist', playlist_id), created_at)
+    return latest
+
+
+def get_activity_page(user, position=None, per_page=20):
+    """
+    (события страницы, позиция для следующего курсора или None).
+    position - (время, ранг, id) последнего события предыдущей страницы
+    (проверяется parse_position, неверная - InvalidCursor).
+    """
+    from .models import Follow
+
+    if position is not None:
+        position = parse_position(position)
+
+    following = Follow.objects.filter(follower=user).values('following_id')
+    streams = [_fetch_stream(kind, following, position, per_page + 1) for kind in STREAMS]
+
+    merged = heapq.merge(*streams, key=lambda e: (e.created_at, -e.rank, e.id), reverse=True)
+    consumed = []
+    for event in merged:
+        consumed.append(event)
+        if len(consumed) > per_page:
+            break
+
+    has_next = len(consumed) > per_page
+    consumed = consumed[:per_page]
+    next_position = None
+    if has_next and consumed:
+        last = consumed[-1]
+        next_position = (last.created_at, last.rank, last.id)
+
+    # дедупликация: объект - только по самому свежему событию (в т.ч. с прошлых страниц)
+    latest = _latest_events(following, consumed)
+    seen = set()
+    events = []
+    for event in consumed:
+        key = (STREAMS[event.kind][1], event.object_id)
+        if key in seen or latest.get(key, event.created_at) > event.created_at:
+            continue
+        seen.add(key)
+        events.append(event)
+    return events, next_position
@@ -0,0 +1,157 @@
+# api/analytics_rollup.py
+"""
+🔥 Инкрементальный rollup событий в TrackAnalytics (трек × день).
+
+Источники читаются только ПОСЛЕ сохранённого high-water mark (последнего
+обработанного id) - каждый запуск обрабатывает лишь новые строки:
+  PlayHistory  -> plays     (по played_at)
+  TrackLike    -> likes     (по liked_at)
+  TrackRepost  -> reposts   (по reposted_at)
+  TrackComment -> comments  (по created_at, без удалённых на момент rollup-а)
+
+Агрегаты пачки и новый high-water mark пишутся одной транзакцией.
+Счётчики - события за день (снятый лайк не вычитается из дня, когда его поставили).
+Запуск: `python manage.py rollup_track_analytics` (cron / планировщик).
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_NAME = 'track_analytics'
+
+DEFAULT_BATCH_SIZE = 5000
+
+
+def _sources():
+    """(ключ high-water mark, queryset источника, поле даты, колонка TrackAnalytics)"""
+    from .models import PlayHistory, TrackLike, TrackRepost, TrackComment
+
+    return (
+        ('plays', PlayHistory.objects.all(), 'played_at', 'plays'),
+        ('likes', TrackLike.objects.all(), 'liked_at', 'likes'),
+        ('reposts', TrackRepost.objects.all(), 'reposted_at', 'reposts'),
+        ('comments', TrackComment.objects.filter(is_deleted=False), 'created_at', 'comments'),
+    )
+
+
+def _apply_counts(counts, column):
+    """
+    Прибавляет {(track_id, date): n} к TrackAnalytics.column:
+    существующие строки - bulk_update с F()-выражением, новые - bulk_create.
+    """
+    from django.db.models import F
+    from .models import TrackAnalytics
+
+    if not counts:
+        return
+
+    track_ids = {track_id for track_id, _ in counts}
+    dates = {day for _, day in counts}
+
+    existing = []
+    for row in TrackAnalytics.objects.filter(track_id__in=track_ids, date__in=dates).only('id', 'track_id', 'date'):
+        n = counts.pop((row.track_id, row.date), None)
+        if n:
+            setattr(row, column, F(column) + n)
+            existing.append(row)
+
+    TrackAnalytics.objects.bulk_update(existing, [column], batch_size=500)
+    TrackAnalytics.objects.bulk_create([
+        TrackAnalytics(track_id=track_id, date=day, **{column: n})
+        for (track_id, day), n in counts.items()
+    ], batch_size=500)
+
+
+def rollup_track_analytics(batch_size=DEFAULT_BATCH_SIZE, plays_since=None):
+    """
+    Обрабатывает все новые события (пачками по batch_size id на источник).
+    plays_since - учитывать только прослушивания не раньше этого момента
+    (пересборка поверх заархивированных дней, см. rebuild_track_analytics).
+    Возвращает {источник: обработано строк}.
+    """
+    from django.db import transaction
+    from django.db.models import Count
+    from django.db.models.functions import TruncDate
+    from .models import AnalyticsRollupState, Track
+
+    state, _ = AnalyticsRollupState.objects.get_or_create(name=ROLLUP_NAME)
+    processed = {}
+
+    for key, source, date_field, column in _sources():
+        processed[key] = 0
+        if key == 'plays' and plays_since is not None:
+            source = source.filter(**{f'{date_field}__gte': plays_since})
+
+        while True:
+            last_id = int(state.high_water_marks.get(key, 0))
+            batch_ids = list(
+                source.model.objects.filter(id__gt=last_id)
+                .order_by('id')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not batch_ids:
+                break
+            upper_id = batch_ids[-1]
+
+            rows = (source.filter(id__gt=last_id, id__lte=upper_id)
+                    .annotate(day=TruncDate(date_field))
+                    .values('track_id', 'day')
+                    .annotate(c=Count('id'))
+                    .order_by())
+            counts = {(row['track_id'], row['day']): row['c'] for row in rows}
+
+            # События удалённых треков пропускаем (FK)
+            live_tracks = set(Track.objects.filter(id__in={t for t, _ in counts}).values_list('id', flat=True))
+            counts = {k: n for k, n in counts.items() if k[0] in live_tracks}
+
+            with transaction.atomic():
+                _apply_counts(counts, column)
+                state.high_water_marks[key] = upper_id
+                state.save(update_fields=['high_water_marks', 'updated_at'])
+
+            processed[key] += len(batch_ids)
+            logger.info(f"📊 Rollup {key}: id ≤ {upper_id}, пар трек×день: {len(counts)}")
+
+    return processed
+
+
+def reset_track_analytics(keep_plays_through=None):
+    """
+    Полная перестройка: очищает TrackAnalytics и high-water mark.
+    keep_plays_through - дни по эту дату сохраняют plays (и downloads/shares),
+    обнуляются только likes/reposts/comments: их источники пересчитываются целиком.
+    """
+    from django.db import transaction
+    from .models import AnalyticsRollupState, TrackAnalytics
+
+    with transaction.atomic():
+        if keep_plays_through is None:
+            TrackAnalytics.objects.all().delete()
+        else:
+            TrackAnalytics.objects.filter(date__gt=keep_plays_through).delete()
+            TrackAnalytics.objects.filter(date__lte=keep_plays_through).update(likes=0, reposts=0, comments=0)
+        AnalyticsRollupState.objects.filter(name=ROLLUP_NAME).delete()
+
+
+def rebuild_track_analytics(batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Пересборка TrackAnalytics с начала.
+    PlayHistory старше срока хранения уехала в архив (play_archive) - plays дней
+    заархивированных месяцев не трогаем и считаем прослушивания только после них.
+    Возвращает (обработано по источникам, дата, по которую plays сохранены, или None).
+    """
+    from datetime import datetime, time, timedelta
+    from django.utils import timezone
+    from .play_archive import archived_through
+
+    frozen_through = archived_through()
+    plays_since = None
+    if frozen_through is not None:
+        plays_since = timezone.make_aware(
+            datetime.combine(frozen_through + timedelta(days=1), time.min),
+            timezone.get_current_timezone()
+        )
+
+    reset_track_analytics(keep_plays_through=frozen_through)
+    processed = rollup_track_analytics(batch_size=batch_size, plays_since=plays_since)
+    return processed, frozen_through
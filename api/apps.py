@@ -56,4 +56,9 @@ class ApiConfig(AppConfig):
             
             # Запускаем в фоне
             thread = threading.Thread(target=startup_waveform_check)
-            thread.daemon = True
\ No newline at end of file
+            thread.daemon = True
+
+        # 🔎 Прогрев индекса подсказок поиска (в фоне; миграции и прочие команды не трогаем)
+        from .suggest_index import should_warm_on_startup, warm_suggest_index_async
+        if should_warm_on_startup():
+            warm_suggest_index_async()
@@ -0,0 +1,667 @@
+# api/audio_analysis.py
+"""
+🔥 Единый движок анализа аудио - ОДИН проход декодирования.
+
+Раньше одна загрузка декодировала файл до 4 раз (pydub, librosa для длительности,
+librosa для sample rate, analyze_audio_file для waveform + ffprobe).
+Теперь:
+  1. probe_audio()      - заголовок файла (ffprobe JSON / soundfile / mutagen), без декодирования
+  2. open_pcm_stream()  - потоковое декодирование в mono PCM блоками по BLOCK_SECONDS
+                          (ffmpeg → s16le; фолбэк: soundfile, wave)
+  3. analyze_audio()    - за один проход считает длительность, sample rate, битрейт
+                          и огибающую RMS/пиков (StreamingBinner); из неё строится waveform
+
+Память постоянная: один блок PCM (BLOCK_SECONDS) плюс ENVELOPE_CAPACITY столбиков
+огибающей - независимо от длительности трека.
+"""
+import os
+import json
+import wave
+import struct
+import logging
+import subprocess
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Частота, к которой ffmpeg приводит звук для анализа (для waveform этого более чем достаточно)
+ANALYSIS_SAMPLE_RATE = 22050
+
+# Размер блока PCM, читаемого за раз
+BLOCK_SECONDS = 2
+
+# Начальная ширина столбика огибающей (~23 мс при 22050 Hz)
+ENVELOPE_HOP = 512
+
+# Максимум столбиков огибающей в памяти (после слияния пар остаётся не меньше половины)
+ENVELOPE_CAPACITY = 8192
+
+# Шкала waveform: dBFS от DB_FLOOR до 0 → от WAVEFORM_MIN до 100
+DB_FLOOR = -60.0
+WAVEFORM_MIN = 10.0
+WAVEFORM_MAX = 100.0
+
+
+def _binary(setting_name, default):
+    """Путь к ffmpeg/ffprobe из settings (работает и вне Django)"""
+    try:
+        from django.conf import settings
+        return getattr(settings, setting_name, default)
+    except Exception:
+        return default
+
+
+def format_duration(seconds):
+    """Форматирует секунды в M:SS или H:MM:SS"""
+    if not seconds or seconds < 0:
+        seconds = 0
+
+    hours = int(seconds // 3600)
+    minutes = int((seconds % 3600) // 60)
+    seconds_int = int(seconds % 60)
+
+    if hours > 0:
+        return f"{hours}:{minutes:02d}:{seconds_int:02d}"
+    return f"{minutes}:{seconds_int:02d}"
+
+
+# ==================== ЗАГОЛОВОК ФАЙЛА ====================
+
+def probe_audio(file_path):
+    """
+    Метаданные из заголовка файла без декодирования звука.
+    Возвращает dict: duration (сек), sample_rate, channels, bitrate (kbps), source.
+    """
+    info = {
+        'duration': 0.0,
+        'sample_rate': 0,
+        'channels': 0,
+        'bitrate': 0,
+        'source': None,
+    }
+
+    # Метод 1: ffprobe одним вызовом (формат + первый аудиопоток)
+    try:
+        cmd = [
+            _binary('FFPROBE_BINARY', 'ffprobe'), '-v', 'error',
+            '-select_streams', 'a:0',
+            '-show_entries', 'format=duration,bit_rate:stream=sample_rate,channels',
+            '-of', 'json',
+            file_path
+        ]
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
+        if result.returncode == 0:
+            data = json.loads(result.stdout or '{}')
+            fmt = data.get('format') or {}
+            stream = (data.get('streams') or [{}])[0]
+
+            info['duration'] = float(fmt.get('duration') or 0)
+            info['bitrate'] = int(int(fmt.get('bit_rate') or 0) / 1000)
+            info['sample_rate'] = int(stream.get('sample_rate') or 0)
+            info['channels'] = int(stream.get('channels') or 0)
+            info['source'] = 'ffprobe'
+
+            if info['duration'] > 0:
+                return _fill_bitrate(info, file_path)
+    except FileNotFoundError:
+        logger.debug("ffprobe не установлен")
+    except Exception as ffprobe_error:
+        logger.debug(f"ffprobe не сработал: {ffprobe_error}")
+
+    # Метод 2: soundfile (wav/flac/ogg, mp3 при libsndfile >= 1.1)
+    try:
+        import soundfile as sf
+        sf_info = sf.info(file_path)
+        if sf_info.duration > 0:
+            info.update({
+                'duration': float(sf_info.duration),
+                'sample_rate': int(sf_info.samplerate),
+                'channels': int(sf_info.channels),
+                'source': 'soundfile',
+            })
+            return _fill_bitrate(info, file_path)
+    except Exception as sf_error:
+        logger.debug(f"soundfile не сработал: {sf_error}")
+
+    # Метод 3: mutagen (теги/заголовки mp3, m4a, aac)
+    try:
+        import mutagen
+        audio = mutagen.File(file_path)
+        if audio and audio.info and getattr(audio.info, 'length', 0) > 0:
+            info.update({
+                'duration': float(audio.info.length),
+                'sample_rate': int(getattr(audio.info, 'sample_rate', 0) or 0),
+                'channels': int(getattr(audio.info, 'channels', 0) or 0),
+                'bitrate': int((getattr(audio.info, 'bitrate', 0) or 0) / 1000),
+                'source': 'mutagen',
+            })
+            return _fill_bitrate(info, file_path)
+    except Exception as mutagen_error:
+        logger.debug(f"mutagen не сработал: {mutagen_error}")
+
+    return info
+
+
+def _fill_bitrate(info, file_path):
+    """Если битрейт не указан в заголовке - считаем по размеру файла"""
+    if not info['bitrate'] and info['duration'] > 0:
+        try:
+            info['bitrate'] = int(os.path.getsize(file_path) * 8 / info['duration'] / 1000)
+        except OSError:
+            pass
+    return info
+
+
+def get_audio_duration(file_path):
+    """
+    Длительность в секундах: сначала заголовок, и только если он пуст - полное декодирование.
+    Возвращает 0.0, если определить не удалось.
+    """
+    if not os.path.exists(file_path):
+        logger.warning(f"Файл не найден: {file_path}")
+        return 0.0
+
+    info = probe_audio(file_path)
+    if info['duration'] > 0:
+        return info['duration']
+
+    try:
+        return analyze_audio(file_path)['duration']
+    except Exception as e:
+        logger.warning(f"⚠️ Не удалось определить длительность {file_path}: {e}")
+        return 0.0
+
+
+# ==================== ПОТОКОВОЕ ДЕКОДИРОВАНИЕ ====================
+
+def open_pcm_stream(file_path, block_seconds=BLOCK_SECONDS):
+    """
+    Открывает файл для потокового чтения mono PCM (float32, -1..1).
+    Возвращает (sample_rate, генератор блоков).
+    """
+    # Способ 1: ffmpeg → s16le mono с ресемплингом до ANALYSIS_SAMPLE_RATE
+    try:
+        process = subprocess.Popen(
+            [
+                _binary('FFMPEG_BINARY', 'ffmpeg'), '-v', 'error', '-nostdin',
+                '-i', file_path,
+                '-f', 's16le', '-acodec', 'pcm_s16le',
+                '-ac', '1', '-ar', str(ANALYSIS_SAMPLE_RATE),
+                '-'
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+        block_frames = int(ANALYSIS_SAMPLE_RATE * block_seconds)
+        return ANALYSIS_SAMPLE_RATE, _ffmpeg_blocks(process, block_frames)
+    except (FileNotFoundError, OSError) as ffmpeg_error:
+        logger.debug(f"ffmpeg недоступен: {ffmpeg_error}")
+
+    # Способ 2: soundfile (libsndfile), родная частота файла
+    try:
+        import soundfile as sf
+        sf_file = sf.SoundFile(file_path)
+        block_frames = int(sf_file.samplerate * block_seconds)
+        return sf_file.samplerate, _soundfile_blocks(sf_file, block_frames)
+    except Exception as sf_error:
+        logger.debug(f"soundfile не смог открыть файл: {sf_error}")
+
+    # Способ 3: wave для несжатого WAV
+    try:
+        wav_file = wave.open(file_path, 'rb')
+        block_frames = int(wav_file.getframerate() * block_seconds)
+        return wav_file.getframerate(), _wave_blocks(wav_file, block_frames)
+    except Exception as wave_error:
+        logger.debug(f"wave не смог открыть файл: {wave_error}")
+
+    raise ValueError(f"Не удалось декодировать аудио: {file_path}")
+
+
+def _ffmpeg_blocks(process, block_frames):
+    bytes_per_block = block_frames * 2
+    produced = False
+    try:
+        while True:
+            chunk = process.stdout.read(bytes_per_block)
+            if not chunk:
+                break
+            if len(chunk) % 2:
+                chunk = chunk[:-1]
+            produced = True
+            yield np.frombuffer(chunk, dtype='<i2').astype(np.float32) / 32768.0
+
+        process.wait(timeout=30)
+        if process.returncode != 0 and not produced:
+            error = process.stderr.read().decode('utf-8', errors='ignore').strip()
+            raise RuntimeError(f"ffmpeg завершился с кодом {process.returncode}: {error}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        process.stderr.close()
+
+
+def _soundfile_blocks(sf_file, block_frames):
+    try:
+        for block in sf_file.blocks(blocksize=block_frames, dtype='float32', always_2d=True):
+            yield block.mean(axis=1)
+    finally:
+        sf_file.close()
+
+
+def _wave_blocks(wav_file, block_frames):
+    channels = wav_file.getnchannels()
+    sample_width = wav_file.getsampwidth()
+    try:
+        while True:
+            raw = wav_file.readframes(block_frames)
+            if not raw:
+                break
+
+            if sample_width == 1:
+                samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+            elif sample_width == 2:
+                samples = np.frombuffer(raw, dtype='<i2').astype(np.float32) / 32768.0
+            elif sample_width == 4:
+                samples = np.frombuffer(raw, dtype='<i4').astype(np.float32) / 2147483648.0
+            else:
+                raise ValueError(f"Неподдерживаемая разрядность WAV: {sample_width * 8} бит")
+
+            if channels > 1:
+                samples = samples[:len(samples) - len(samples) % channels].reshape(-1, channels).mean(axis=1)
+            yield samples
+    finally:
+        wav_file.close()
+
+
+# ==================== ОГИБАЮЩАЯ (RMS / ПИКИ) ====================
+
+class StreamingBinner:
+    """
+    Потоковая огибающая с ПОСТОЯННОЙ памятью.
+
+    Сэмплы сворачиваются в столбики по `width` сэмплов (reshape + reduce по оси),
+    для каждого храним сумму квадратов, минимум и максимум. Когда столбиков становится `capacity`,
+    соседние пары сливаются (reshape(-1, 2)), а ширина столбика удваивается.
+    Длину трека знать заранее не нужно, а память - это capacity столбиков
+    плюс один блок PCM, независимо от длительности (хоть часовой DJ-микс).
+    """
+
+    def __init__(self, capacity=ENVELOPE_CAPACITY, hop=ENVELOPE_HOP):
+        if capacity % 2:
+            raise ValueError('capacity должна быть чётной')
+
+        self.capacity = capacity
+        self.width = hop
+        self.frames = 0
+        self.filled = 0
+        self._sumsq = np.zeros(capacity, dtype=np.float64)
+        self._min = np.zeros(capacity, dtype=np.float32)
+        self._max = np.zeros(capacity, dtype=np.float32)
+        self._tail = np.empty(0, dtype=np.float32)
+
+    def add(self, block):
+        self.frames += len(block)
+        if self._tail.size:
+            block = np.concatenate((self._tail, block))
+
+        while True:
+            windows_count = len(block) // self.width
+            room = self.capacity - self.filled
+
+            if windows_count <= room:
+                self._write(block[:windows_count * self.width])
+                self._tail = block[windows_count * self.width:].copy()
+                return
+
+            # Заполняем до конца, сливаем пары и продолжаем с удвоенной шириной
+            self._write(block[:room * self.width])
+            block = block[room * self.width:]
+            self._merge_pairs()
+
+    def _write(self, samples):
+        if not samples.size:
+            return
+
+        windows = samples.reshape(-1, self.width)
+        count = len(windows)
+        position = slice(self.filled, self.filled + count)
+
+        self._sumsq[position] = np.square(windows, dtype=np.float64).sum(axis=1)
+        self._min[position] = windows.min(axis=1)
+        self._max[position] = windows.max(axis=1)
+        self.filled += count
+
+    def _merge_pairs(self):
+        half = self.filled // 2
+        self._sumsq[:half] = self._sumsq[:self.filled].reshape(-1, 2).sum(axis=1)
+        self._min[:half] = self._min[:self.filled].reshape(-1, 2).min(axis=1)
+        self._max[:half] = self._max[:self.filled].reshape(-1, 2).max(axis=1)
+        self._sumsq[half:] = 0
+        self._min[half:] = 0
+        self._max[half:] = 0
+        self.filled = half
+        self.width *= 2
+
+    def finish(self):
+        """
+        Возвращает dict с массивами по столбикам (последний может быть неполным):
+        sumsq, counts, min, max и peak = max(|min|, |max|).
+        """
+        sumsq = self._sumsq[:self.filled].copy()
+        mins = self._min[:self.filled].copy()
+        maxs = self._max[:self.filled].copy()
+        counts = np.full(self.filled, self.width, dtype=np.int64)
+
+        if self._tail.size:
+            sumsq = np.append(sumsq, np.square(self._tail, dtype=np.float64).sum())
+            mins = np.append(mins, self._tail.min())
+            maxs = np.append(maxs, self._tail.max())
+            counts = np.append(counts, self._tail.size)
+
+        return {
+            'sumsq': sumsq,
+            'counts': counts,
+            'min': mins,
+            'max': maxs,
+            'peak': np.maximum(-mins, maxs),
+            'width': self.width,
+        }
+
+
+def _bin_edges(windows, num_bins):
+    """Индексы начала каждого из num_bins столбиков в массиве из windows окон"""
+    if windows >= num_bins:
+        return np.linspace(0, windows, num_bins + 1).astype(np.int64)[:-1]
+    # Окон меньше, чем столбиков - растягиваем (каждое окно повторяется)
+    return (np.arange(num_bins) * windows) // num_bins
+
+
+def envelope_rms(envelope, num_bins):
+    """RMS каждого из num_bins столбиков (без нормализации), numpy-массив"""
+    sumsq = envelope['sumsq']
+    counts = envelope['counts']
+    windows = len(sumsq)
+
+    if windows == 0 or num_bins <= 0:
+        return np.zeros(max(num_bins, 0), dtype=np.float64)
+
+    edges = _bin_edges(windows, num_bins)
+    if windows >= num_bins:
+        bin_sumsq = np.add.reduceat(sumsq, edges)
+        bin_counts = np.add.reduceat(counts, edges)
+    else:
+        bin_sumsq = sumsq[edges]
+        bin_counts = counts[edges]
+
+    return np.sqrt(bin_sumsq / np.maximum(bin_counts, 1))
+
+
+def smooth(values, window=5):
+    """Скользящее среднее свёрткой (края дополняются крайними значениями)"""
+    values = np.asarray(values, dtype=np.float64)
+    if window <= 1 or len(values) <= window:
+        return values
+
+    kernel = np.ones(window) / window
+    padded = np.pad(values, window // 2, mode='edge')
+    return np.convolve(padded, kernel, mode='valid')[:len(values)]
+
+
+def rms_to_heights(rms, peak):
+    """
+    RMS столбиков → высоты 10..100 для плеера.
+    Нормализация по пику всего трека (как раньше y / max|y|), затем dBFS.
+    """
+    rms = np.asarray(rms, dtype=np.float64)
+    if peak > 1e-8:
+        rms = rms / peak
+
+    db = 20 * np.log10(np.maximum(rms, 1e-8))
+    return np.clip((db - DB_FLOOR) * (WAVEFORM_MAX / -DB_FLOOR), WAVEFORM_MIN, WAVEFORM_MAX)
+
+
+def envelope_to_waveform(envelope, num_points=120):
+    """
+    Сворачивает огибающую в num_points столбиков (RMS → dBFS → 10..100)
+    и сглаживает скользящим средним (свёртка окном 5).
+    """
+    if not len(envelope['sumsq']) or num_points <= 0:
+        return [WAVEFORM_MIN] * max(num_points, 0)
+
+    rms = envelope_rms(envelope, num_points)
+    peak = float(envelope['peak'].max()) if len(envelope['peak']) else 0.0
+    values = smooth(rms_to_heights(rms, peak))
+
+    return [round(float(v), 2) for v in values]
+
+
+# ==================== КОМПАКТНОЕ ХРАНЕНИЕ WAVEFORM ====================
+#
+# Track.waveform_data / Message.waveform хранятся в БД не JSON-списком float,
+# а квантованными uint8: заголовок '<4sff' (magic, минимум, максимум) + 1 байт на точку.
+# 120 точек ≈ 132 байта вместо ~800 байт JSON.
+
+WAVEFORM_MAGIC = b'WF8\x01'
+_WAVEFORM_HEADER = struct.Struct('<4sff')
+
+
+def encode_waveform(values):
+    """Список чисел → байты (uint8, линейно между минимумом и максимумом)"""
+    values = np.nan_to_num(np.asarray(list(values), dtype=np.float64).ravel())
+
+    low = float(values.min()) if values.size else 0.0
+    high = float(values.max()) if values.size else 0.0
+    span = high - low
+
+    # Целые значения с разбросом до 255 (голосовые сообщения) - храним без потерь
+    if 0 < span <= 255 and np.all(values == np.rint(values)):
+        high = low + 255.0
+        span = 255.0
+
+    if span > 0:
+        quantized = np.rint((values - low) / span * 255).astype(np.uint8)
+    else:
+        quantized = np.zeros(values.size, dtype=np.uint8)
+
+    return _WAVEFORM_HEADER.pack(WAVEFORM_MAGIC, low, high) + quantized.tobytes()
+
+
+def decode_waveform(data):
+    """Байты из encode_waveform → список чисел (2 знака после запятой)"""
+    data = bytes(data)
+    if not data:
+        return []
+
+    magic, low, high = _WAVEFORM_HEADER.unpack_from(data, 0)
+    if magic != WAVEFORM_MAGIC:
+        raise ValueError('Неизвестный формат waveform')
+
+    quantized = np.frombuffer(data, dtype=np.uint8, offset=_WAVEFORM_HEADER.size)
+    values = low + quantized.astype(np.float64) * ((high - low) / 255)
+    return np.round(values, 2).tolist()
+
+
+# ==================== ПИРАМИДА WAVEFORM ====================
+#
+# Несколько уровней детализации (min/max/RMS на столбик), считаются один раз
+# при анализе и хранятся в Track.waveform_pyramid в бинарном виде:
+#   заголовок '<4sffB': magic, длительность (сек), масштаб (пик трека), число уровней
+#   '<NI': количество столбиков на каждом уровне
+#   далее для каждого уровня: min (int8), max (int8), rms (uint8) - доли масштаба
+# 64+256+1024+4096 столбиков ≈ 16 КБ на трек.
+
+PYRAMID_LEVELS = (64, 256, 1024, 4096)
+PYRAMID_MAGIC = b'WFP1'
+_PYRAMID_HEADER = struct.Struct('<4sffB')
+
+
+def build_waveform_pyramid(envelope, duration, levels=PYRAMID_LEVELS):
+    """Строит уровни пирамиды из огибающей: {bins: {'min', 'max', 'rms'}} + duration/scale"""
+    sumsq = envelope['sumsq']
+    windows = len(sumsq)
+    scale = float(envelope['peak'].max()) if windows else 0.0
+
+    pyramid = {'duration': float(duration), 'scale': scale, 'levels': {}}
+
+    for bins in levels:
+        if windows == 0:
+            zeros = np.zeros(bins, dtype=np.float32)
+            pyramid['levels'][bins] = {'min': zeros, 'max': zeros, 'rms': zeros}
+            continue
+
+        edges = _bin_edges(windows, bins)
+        if windows >= bins:
+            level_min = np.minimum.reduceat(envelope['min'], edges)
+            level_max = np.maximum.reduceat(envelope['max'], edges)
+        else:
+            level_min = envelope['min'][edges]
+            level_max = envelope['max'][edges]
+
+        pyramid['levels'][bins] = {
+            'min': level_min.astype(np.float32),
+            'max': level_max.astype(np.float32),
+            'rms': envelope_rms(envelope, bins).astype(np.float32),
+        }
+
+    return pyramid
+
+
+def pack_waveform_pyramid(pyramid):
+    """Пирамида → компактные байты для BinaryField"""
+    scale = pyramid['scale'] if pyramid['scale'] > 1e-8 else 1.0
+    levels = sorted(pyramid['levels'])
+
+    parts = [
+        _PYRAMID_HEADER.pack(PYRAMID_MAGIC, pyramid['duration'], scale, len(levels)),
+        struct.pack(f'<{len(levels)}I', *levels),
+    ]
+    for bins in levels:
+        level = pyramid['levels'][bins]
+        parts.append(np.clip(np.rint(level['min'] / scale * 127), -127, 127).astype(np.int8).tobytes())
+        parts.append(np.clip(np.rint(level['max'] / scale * 127), -127, 127).astype(np.int8).tobytes())
+        parts.append(np.clip(np.rint(level['rms'] / scale * 255), 0, 255).astype(np.uint8).tobytes())
+
+    return b''.join(parts)
+
+
+def unpack_waveform_pyramid(data):
+    """Байты из BinaryField → пирамида (значения снова в долях полной шкалы -1..1)"""
+    data = bytes(data)
+    magic, duration, scale, count = _PYRAMID_HEADER.unpack_from(data, 0)
+    if magic != PYRAMID_MAGIC:
+        raise ValueError('Неизвестный формат пирамиды waveform')
+
+    offset = _PYRAMID_HEADER.size
+    levels = struct.unpack_from(f'<{count}I', data, offset)
+    offset += 4 * count
+
+    pyramid = {'duration': duration, 'scale': scale, 'levels': {}}
+    for bins in levels:
+        level_min = np.frombuffer(data, dtype=np.int8, count=bins, offset=offset)
+        level_max = np.frombuffer(data, dtype=np.int8, count=bins, offset=offset + bins)
+        level_rms = np.frombuffer(data, dtype=np.uint8, count=bins, offset=offset + 2 * bins)
+        offset += 3 * bins
+
+        pyramid['levels'][bins] = {
+            'min': level_min.astype(np.float32) * (scale / 127),
+            'max': level_max.astype(np.float32) * (scale / 127),
+            'rms': level_rms.astype(np.float32) * (scale / 255),
+        }
+
+    return pyramid
+
+
+def slice_waveform_pyramid(pyramid, points, start=None, end=None):
+    """
+    Выбирает уровень пирамиды для `points` точек на отрезке [start, end] (сек)
+    и возвращает ровно `points` столбиков min/max/rms + высоты 10..100 для плеера.
+    Ничего не пересчитывается из аудио - только срез и свёртка готового уровня.
+    """
+    duration = pyramid['duration'] or 0.0
+    start = max(0.0, float(start or 0.0))
+    end = float(end) if end is not None else duration
+    if duration > 0:
+        end = min(end, duration)
+    if end <= start:
+        raise ValueError('end должен быть больше start')
+
+    start_fraction = start / duration if duration > 0 else 0.0
+    end_fraction = end / duration if duration > 0 else 1.0
+    span = end_fraction - start_fraction
+
+    # Самый грубый уровень, где на отрезок приходится не меньше points столбиков
+    levels = sorted(pyramid['levels'])
+    bins = next((level for level in levels if level * span >= points), levels[-1])
+    level = pyramid['levels'][bins]
+
+    first = min(int(np.floor(start_fraction * bins)), bins - 1)
+    last = max(first + 1, int(np.ceil(end_fraction * bins)))
+    level_min = level['min'][first:last]
+    level_max = level['max'][first:last]
+    level_rms = level['rms'][first:last]
+
+    available = len(level_rms)
+    edges = _bin_edges(available, points)
+    if available >= points:
+        level_min = np.minimum.reduceat(level_min, edges)
+        level_max = np.maximum.reduceat(level_max, edges)
+        # RMS объединяем через среднее квадратов
+        widths = np.diff(np.append(edges, available))
+        level_rms = np.sqrt(np.add.reduceat(np.square(level_rms, dtype=np.float64), edges) / widths)
+    else:
+        level_min, level_max, level_rms = level_min[edges], level_max[edges], level_rms[edges]
+
+    return {
+        'level': bins,
+        'start': start,
+        'end': end,
+        'duration': duration,
+        'min': [round(float(v), 4) for v in level_min],
+        'max': [round(float(v), 4) for v in level_max],
+        'rms': [round(float(v), 4) for v in level_rms],
+        'waveform': [round(float(v), 2) for v in rms_to_heights(level_rms, pyramid['scale'])],
+    }
+
+
+# ==================== ПОЛНЫЙ АНАЛИЗ ====================
+
+def analyze_audio(file_path, num_points=None):
+    """
+    Один проход по файлу: длительность, sample rate, каналы, битрейт, огибающая
+    и (если передан num_points) готовый waveform и пирамида уровней.
+    """
+    info = probe_audio(file_path)
+    stream_rate, blocks = open_pcm_stream(file_path)
+
+    accumulator = StreamingBinner()
+    for block in blocks:
+        accumulator.add(block)
+
+    envelope = accumulator.finish()
+
+    # Длительность по декодированным сэмплам точнее заголовка (VBR mp3)
+    if accumulator.frames:
+        info['duration'] = accumulator.frames / float(stream_rate)
+    if not info['sample_rate']:
+        info['sample_rate'] = int(stream_rate)
+    _fill_bitrate(info, file_path)
+
+    result = dict(info)
+    result.update({
+        'analysis_sample_rate': int(stream_rate),
+        'frames': accumulator.frames,
+        'envelope': envelope,
+    })
+
+    if num_points:
+        result['waveform'] = envelope_to_waveform(envelope, num_points)
+        result['pyramid'] = build_waveform_pyramid(envelope, info['duration'])
+
+    logger.info(
+        f"✅ Аудио проанализировано за один проход: {format_duration(info['duration'])}, "
+        f"{info['sample_rate']} Hz, {info['bitrate']} kbps, столбиков огибающей: {len(envelope['sumsq'])}"
+    )
+    return result
@@ -0,0 +1,155 @@
+# api/conditional.py
+"""
+🔥 Условные GET (ETag / Last-Modified -> 304 Not Modified) для часто опрашиваемых эндпоинтов:
+трек для плеера, waveform, публичный профиль.
+
+Валидатор считается одним запросом .values() (счётчики + подзапросы EXISTS/COUNT
+в том же SELECT) ещё до сериализации: если клиент прислал совпадающий If-None-Match,
+ответ - 304 без тела и без загрузки связей.
+
+ETag учитывает всё, что меняет ответ, в том числе счётчики, которые двигаются
+F()-UPDATE без updated_at, и состояние зрителя (лайк/репост/подписка).
+Поэтому для трека и профиля решение принимается по ETag; Last-Modified
+(updated_at) отдаётся справочно. Для waveform Last-Modified точен
+(waveform_generated_at) и проверяется вместе с ETag.
+"""
+import hashlib
+
+from django.http import HttpResponseNotModified
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+# waveform меняется только при повторном анализе - браузер может не спрашивать час
+WAVEFORM_MAX_AGE = 60 * 60
+WAVEFORM_CACHE = {'public': True, 'max_age': WAVEFORM_MAX_AGE}
+
+# Зависит от зрителя: браузер хранит, но каждый раз переспрашивает (дешёвый 304)
+PRIVATE_REVALIDATE = {'private': True, 'no_cache': True}
+
+
+def make_etag(*parts):
+    """Слабый ETag (тело - тот же JSON, но не побайтово: сжатие, порядок ключей)"""
+    digest = hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
+    return f'W/"{digest}"'
+
+
+def _timestamp(value):
+    return value.timestamp() if value else None
+
+
+# ==================== ВАЛИДАТОРЫ ====================
+def track_validators(track_id, user=None):
+    """(etag, last_modified) трека для get_track_info или None, если трека нет"""
+    from django.db.models import Exists, OuterRef
+    from .models import Track, TrackLike, TrackRepost
+
+    queryset = Track.objects.filter(id=track_id)
+    fields = [
+        'updated_at', 'uploaded_by__updated_at',
+        'play_count', 'like_count', 'repost_count', 'comment_count',
+        # анализ (generate_all_waveforms) уточняет длительность bulk_update-ом
+        'duration', 'duration_seconds',
+    ]
+    if user is not None and user.is_authenticated:
+        queryset = queryset.annotate(
+            viewer_liked=Exists(TrackLike.objects.filter(user=user, track=OuterRef('pk'))),
+            viewer_reposted=Exists(TrackRepost.objects.filter(user=user, track=OuterRef('pk'))),
+        )
+        fields += ['viewer_liked', 'viewer_reposted']
+
+    row = queryset.values(*fields).first()
+    if row is None:
+        return None
+    viewer_id = user.id if user is not None and user.is_authenticated else None
+    etag = make_etag('track', track_id, viewer_id, *[
+        _timestamp(value) if field.endswith('updated_at') else value
+        for field, value in ((f, row[f]) for f in fields)
+    ])
+    return etag, row['updated_at']
+
+
+def waveform_validators(track_id, params='', zoom=False):
+    """
+    (etag, last_modified) waveform или None, если отдавать нечего кэшировать:
+    waveform ещё не готов (get_waveform ставит трек в очередь анализа
+    и отдаёт заглушку) или для зума нет пирамиды.
+    """
+    from django.db.models import BooleanField, ExpressionWrapper, Q
+    from .models import Track
+
+    row = Track.objects.filter(id=track_id).annotate(
+        has_pyramid=ExpressionWrapper(Q(waveform_pyramid__isnull=False), output_field=BooleanField())
+    ).values('waveform_generated', 'waveform_generated_at', 'waveform_points', 'has_pyramid').first()
+    if row is None or not row['waveform_generated'] or not row['waveform_generated_at']:
+        return None
+    if zoom and not row['has_pyramid']:
+        return None
+    etag = make_etag(
+        'waveform', track_id, params, _timestamp(row['waveform_generated_at']),
+        row['waveform_points'], row['has_pyramid']
+    )
+    return etag, row['waveform_generated_at']
+
+
+def profile_validators(user_id, viewer=None):
+    """(etag, last_modified) публичного профиля или None, если пользователя нет"""
+    from django.db.models import Count, Exists, IntegerField, OuterRef, Subquery
+    from .models import CustomUser, Follow, Track
+
+    def count_of(queryset, field):
+        return Subquery(
+            queryset.order_by().values(field).annotate(c=Count('id')).values('c'),
+            output_field=IntegerField()
+        )
+
+    queryset = CustomUser.objects.filter(id=user_id).annotate(
+        live_followers=count_of(Follow.objects.filter(following=OuterRef('pk')), 'following'),
+        live_following=count_of(Follow.objects.filter(follower=OuterRef('pk')), 'follower'),
+        live_tracks=count_of(Track.objects.filter(uploaded_by=OuterRef('pk'), status='published'), 'uploaded_by'),
+    )
+    fields = ['updated_at', 'live_followers', 'live_following', 'live_tracks']
+    if viewer is not None and viewer.is_authenticated:
+        queryset = queryset.annotate(
+            viewer_follows=Exists(Follow.objects.filter(follower=viewer, following=OuterRef('pk')))
+        )
+        fields.append('viewer_follows')
+
+    row = queryset.values(*fields).first()
+    if row is None:
+        return None
+    viewer_id = viewer.id if viewer is not None and viewer.is_authenticated else None
+    etag = make_etag('profile', user_id, viewer_id, _timestamp(row['updated_at']), *[
+        row[f] or 0 for f in fields[1:]
+    ])
+    return etag, row['updated_at']
+
+
+# ==================== ОТВЕТЫ ====================
+def not_modified(request, validators, use_last_modified=False):
+    """304-ответ, если валидаторы совпали с If-None-Match (/ If-Modified-Since), иначе None"""
+    if validators is None or request.method not in ('GET', 'HEAD'):
+        return None
+    etag, last_modified = validators
+    response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified.timestamp()) if use_last_modified and last_modified else None,
+    )
+    if isinstance(response, HttpResponseNotModified):
+        return response
+    return None
+
+
+def apply_validators(response, validators, cache_control=None, vary_auth=True):
+    """ETag / Last-Modified / Cache-Control на ответ (и на 304 - те же заголовки)"""
+    if validators is None:
+        return response
+    etag, last_modified = validators
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    if cache_control:
+        patch_cache_control(response, **cache_control)
+    if vary_auth:
+        patch_vary_headers(response, ('Authorization',))
+    return response
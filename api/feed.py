@@ -0,0 +1,355 @@
+# api/feed.py
+"""
+🔥 Лента новостей (fan-out on write): у каждого пользователя свой inbox - FeedItem.
+
+Записи в inbox подписчиков появляются при событиях автора, а не считаются при чтении:
+  - трек стал опубликованным и не приватным (publish / approve / upload сразу в published)
+  - автор сделал репост трека
+Сигналы (models.py) только ставят задачу FeedFanoutTask, раскладку по подписчикам
+пачками (bulk_create) делает воркер `python manage.py process_feed_fanout`.
+  - подписка    - в inbox сразу добавляются последние FEED_BACKFILL_LIMIT событий автора
+  - отписка     - записи автора удаляются из inbox (перетёртые репостом загрузки возвращаются)
+  - inbox обрезается до FEED_MAX_ITEMS последних записей
+
+get_feed читает одну страницу по индексу (user, -created_at): без списка подписок,
+без фильтра по uploaded_by_id__in. Трек, снятый с публикации или ставший приватным,
+отфильтровывается при чтении (JOIN по первичному ключу).
+FEED_FANOUT_INLINE=True (по умолчанию при DEBUG) - раскладывать сразу после COMMIT в процессе
+запроса, без воркера. Миграция 0037 заполняет inbox-ы по существующим подпискам;
+`python manage.py process_feed_fanout --rebuild --once` - полная пересборка вручную.
+"""
+import logging
+from datetime import timedelta
+
+logger = logging.getLogger(__name__)
+
+# После стольких неудачных попыток задача остаётся в 'failed'
+MAX_ATTEMPTS = 3
+
+# Задача в 'processing' дольше этого времени считается брошенной (упал воркер)
+STALE_PROCESSING_TIMEOUT = timedelta(minutes=10)
+
+# Сколько подписчиков вставлять одной пачкой
+FANOUT_BATCH_SIZE = 1000
+
+
+def _setting(name, default):
+    from django.conf import settings
+    return getattr(settings, name, default)
+
+
+def track_is_feed_visible(track):
+    return track.status == 'published' and not track.is_private
+
+
+# ==================== ПОСТАНОВКА ЗАДАЧ ====================
+def enqueue_fanout(kind, actor_id, track_id):
+    """
+    Ставит задачу раскладки после COMMIT текущей транзакции.
+    kind: 'upload' | 'repost' | 'unrepost'
+    """
+    from django.db import transaction
+
+    def create():
+        from .models import CustomUser, FeedFanoutTask, Track
+
+        # каскадное удаление трека/пользователя: раскладывать нечего
+        if not (Track.objects.filter(id=track_id).exists() and CustomUser.objects.filter(id=actor_id).exists()):
+            return
+        task = FeedFanoutTask.objects.create(kind=kind, actor_id=actor_id, track_id=track_id)
+        logger.info(f"📥 Лента: задача {task.id} ({kind}, автор {actor_id}, трек {track_id})")
+        if _setting('FEED_FANOUT_INLINE', False) and _claim(task.id):
+            process_fanout_tasks([task.id])
+
+    transaction.on_commit(create)
+
+
+# ==================== РАСКЛАДКА ====================
+def _follower_ids(actor_id):
+    from .models import Follow
+    return Follow.objects.filter(following_id=actor_id).values_list('follower_id', flat=True).iterator(
+        chunk_size=FANOUT_BATCH_SIZE
+    )
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _write_items(user_ids, track, actor_id, reason, created_at):
+    """
+    Пачка записей inbox. Загрузка не перетирает существующую запись трека,
+    репост - поднимает трек наверх (последнее событие по треку).
+    """
+    from .models import FeedItem
+
+    items = [
+        FeedItem(user_id=user_id, track_id=track.id, actor_id=actor_id, reason=reason, created_at=created_at)
+        for user_id in user_ids
+        if user_id != track.uploaded_by_id
+    ]
+    if not items:
+        return 0
+    if reason == 'upload':
+        FeedItem.objects.bulk_create(items, ignore_conflicts=True)
+    else:
+        FeedItem.objects.bulk_create(
+            items,
+            update_conflicts=True,
+            unique_fields=['user', 'track'],
+            update_fields=['actor', 'reason', 'created_at'],
+        )
+    return len(items)
+
+
+def fanout_upload(track):
+    """Новый трек автора - в inbox всех подписчиков"""
+    if not track_is_feed_visible(track):
+        return set()
+    affected = set()
+    created_at = track.published_at or track.created_at
+    for user_ids in _chunks(_follower_ids(track.uploaded_by_id), FANOUT_BATCH_SIZE):
+        _write_items(user_ids, track, track.uploaded_by_id, 'upload', created_at)
+        affected.update(user_ids)
+    return affected
+
+
+def fanout_repost(track, actor_id):
+    """Репост - в inbox подписчиков репостнувшего"""
+    from .models import TrackRepost
+
+    if not track_is_feed_visible(track):
+        return set()
+    reposted_at = TrackRepost.objects.filter(user_id=actor_id, track=track).values_list(
+        'reposted_at', flat=True
+    ).first()
+    if reposted_at is None:
+        return set()
+
+    affected = set()
+    for user_ids in _chunks(_follower_ids(actor_id), FANOUT_BATCH_SIZE):
+        _write_items(user_ids, track, actor_id, 'repost', reposted_at)
+        affected.update(user_ids)
+    return affected
+
+
+def remove_repost(track, actor_id):
+    """
+    Репост отменён: убираем записи репоста. Подписчикам самого автора трека
+    возвращаем запись загрузки (репост мог её перетереть).
+    """
+    from .models import FeedItem, Follow
+
+    user_ids = list(FeedItem.objects.filter(
+        track=track, actor_id=actor_id, reason='repost'
+    ).values_list('user_id', flat=True))
+    if not user_ids:
+        return 0
+
+    FeedItem.objects.filter(track=track, actor_id=actor_id, reason='repost').delete()
+
+    if track_is_feed_visible(track):
+        restore = Follow.objects.filter(
+            following_id=track.uploaded_by_id, follower_id__in=user_ids
+        ).values_list('follower_id', flat=True)
+        _write_items(list(restore), track, track.uploaded_by_id, 'upload', track.published_at or track.created_at)
+    return len(user_ids)
+
+
+def backfill_follow(follower_id, following_id):
+    """Новая подписка: последние загрузки и репосты автора - в inbox подписчика"""
+    from .models import FeedItem, Track, TrackRepost
+
+    limit = _setting('FEED_BACKFILL_LIMIT', 50)
+
+    uploads = Track.objects.filter(
+        uploaded_by_id=following_id, status='published', is_private=False
+    ).order_by('-created_at').values_list('id', 'published_at', 'created_at')[:limit]
+    reposts = TrackRepost.objects.filter(
+        user_id=following_id, track__status='published', track__is_private=False
+    ).exclude(track__uploaded_by_id=follower_id).order_by('-reposted_at').values_list('track_id', 'reposted_at')[:limit]
+
+    events = {}
+    for track_id, published_at, created_at in uploads:
+        events[track_id] = FeedItem(
+            user_id=follower_id, track_id=track_id, actor_id=following_id,
+            reason='upload', created_at=published_at or created_at
+        )
+    for track_id, reposted_at in reposts:
+        current = events.get(track_id)
+        if current is None or reposted_at > current.created_at:
+            events[track_id] = FeedItem(
+                user_id=follower_id, track_id=track_id, actor_id=following_id,
+                reason='repost', created_at=reposted_at
+            )
+
+    FeedItem.objects.bulk_create(list(events.values()), ignore_conflicts=True)
+    trim_feeds([follower_id])
+    return len(events)
+
+
+def remove_follow(follower_id, following_id):
+    """
+    Отписка: записи автора (загрузки и репосты) уходят из inbox. Если репост перетёр
+    запись загрузки, а на автора трека подписка осталась - возвращаем запись загрузки
+    (как remove_repost).
+    """
+    from .models import FeedItem, Follow, Track
+
+    items = FeedItem.objects.filter(user_id=follower_id, actor_id=following_id)
+    reposted_ids = list(items.filter(reason='repost').values_list('track_id', flat=True))
+    removed = items.delete()[0]
+
+    if reposted_ids:
+        restore = Track.objects.filter(
+            id__in=reposted_ids,
+            status='published',
+            is_private=False,
+            uploaded_by_id__in=Follow.objects.filter(follower_id=follower_id).values('following_id'),
+        ).values_list('id', 'uploaded_by_id', 'published_at', 'created_at')
+        FeedItem.objects.bulk_create([
+            FeedItem(
+                user_id=follower_id, track_id=track_id, actor_id=uploaded_by_id,
+                reason='upload', created_at=published_at or created_at
+            )
+            for track_id, uploaded_by_id, published_at, created_at in restore
+        ], ignore_conflicts=True)
+    return removed
+
+
+def trim_feeds(user_ids, max_items=None):
+    """Обрезает inbox до max_items последних записей (только у тех, кто превысил лимит)"""
+    from django.db.models import Count
+    from .models import FeedItem
+
+    max_items = max_items or _setting('FEED_MAX_ITEMS', 500)
+    user_ids = list(user_ids)
+    removed = 0
+    for chunk in _chunks(user_ids, FANOUT_BATCH_SIZE):
+        overflow = (
+            FeedItem.objects.filter(user_id__in=chunk)
+            .values('user_id').annotate(c=Count('id')).filter(c__gt=max_items)
+            .values_list('user_id', flat=True)
+        )
+        for user_id in overflow:
+            border = FeedItem.objects.filter(user_id=user_id).order_by('-created_at', '-id').values_list(
+                'created_at', 'id'
+            )[max_items - 1]
+            removed += FeedItem.objects.filter(user_id=user_id).filter(_older_than(border)).delete()[0]
+    return removed
+
+
+def _older_than(border):
+    """Q "после записи border" в порядке (-created_at, -id)"""
+    from django.db.models import Q
+    created_at, item_id = border
+    return Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=item_id)
+
+
+# ==================== ВОРКЕР ====================
+def _claim(task_id):
+    """
+    Условный UPDATE pending -> processing. Захват сразу считается попыткой:
+    задача, на которой воркер падает целиком, не будет возвращаться в очередь вечно.
+    """
+    from django.db.models import F
+    from django.utils import timezone
+    from .models import FeedFanoutTask
+
+    return FeedFanoutTask.objects.filter(id=task_id, status='pending').update(
+        status='processing', started_at=timezone.now(), attempt_count=F('attempt_count') + 1
+    )
+
+
+def claim_pending_tasks(limit):
+    """Забирает задачи условным UPDATE (несколько воркеров не возьмут одну задачу)"""
+    from .models import FeedFanoutTask
+
+    candidate_ids = list(
+        FeedFanoutTask.objects.filter(status='pending')
+        .order_by('id')
+        .values_list('id', flat=True)[:limit]
+    )
+    return [task_id for task_id in candidate_ids if _claim(task_id)]
+
+
+def reset_stale_tasks(timeout=STALE_PROCESSING_TIMEOUT):
+    """
+    Задачи, зависшие в 'processing' (воркер упал посреди пачки): возвращает в очередь,
+    а исчерпавшие MAX_ATTEMPTS - переводит в 'failed'.
+    Возвращает число задач, возвращённых в очередь.
+    """
+    from django.db.models import Q
+    from django.utils import timezone
+    from .models import FeedFanoutTask
+
+    border = timezone.now() - timeout
+    stale = FeedFanoutTask.objects.filter(
+        Q(started_at__lt=border) | Q(started_at__isnull=True),
+        status='processing',
+    )
+
+    failed = stale.filter(attempt_count__gte=MAX_ATTEMPTS).update(
+        status='failed',
+        error_message=f'Воркер не завершил раскладку за {MAX_ATTEMPTS} попыток (процесс упал или завис)',
+    )
+    if failed:
+        logger.error(f"❌ Лента: зависшие задачи переведены в 'failed': {failed}")
+
+    return stale.filter(attempt_count__lt=MAX_ATTEMPTS).update(status='pending', started_at=None)
+
+
+def process_fanout_tasks(task_ids):
+    """
+    Выполняет захваченные задачи по порядку. Успешные удаляются из очереди, неудачные
+    возвращаются в 'pending' (до MAX_ATTEMPTS попыток - attempt_count растёт при захвате).
+    Возвращает {статус: количество}.
+    """
+    from django.db import transaction
+    from .models import FeedFanoutTask
+
+    stats = {'completed': 0, 'retry': 0, 'failed': 0}
+    affected = set()
+
+    tasks = FeedFanoutTask.objects.filter(id__in=task_ids).select_related('track').order_by('id')
+    for task in tasks:
+        try:
+            with transaction.atomic():
+                if task.track is not None:
+                    if task.kind == 'upload':
+                        affected |= fanout_upload(task.track)
+                    elif task.kind == 'repost':
+                        affected |= fanout_repost(task.track, task.actor_id)
+                    elif task.kind == 'unrepost':
+                        remove_repost(task.track, task.actor_id)
+            task.delete()
+            stats['completed'] += 1
+        except Exception as e:
+            logger.error(f"❌ Лента: задача {task.id} ({task.kind}) упала: {e}")
+            failed = task.attempt_count >= MAX_ATTEMPTS
+            FeedFanoutTask.objects.filter(id=task.id).update(
+                status='failed' if failed else 'pending',
+                error_message=str(e)[:1000],
+            )
+            stats['failed' if failed else 'retry'] += 1
+
+    if affected:
+        trim_feeds(affected)
+    return stats
+
+
+def rebuild_feed_inboxes():
+    """Полная пересборка inbox всех подписок (бэкфилл после миграции). Возвращает число записей"""
+    from .models import FeedItem, Follow
+
+    FeedItem.objects.all().delete()
+    for follower_id, following_id in Follow.objects.values_list('follower_id', 'following_id').iterator():
+        backfill_follow(follower_id, following_id)
+    return FeedItem.objects.count()
@@ -0,0 +1,60 @@
+# api/management/commands/archive_play_history.py
+from django.core.management.base import BaseCommand
+
+from api.play_archive import archive_play_history, compact_play_history, get_archive_dir, DEFAULT_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Переносит старые PlayHistory в сжатые помесячные архивы (запускать по cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=None,
+            help='Горизонт хранения в днях (по умолчанию - PLAY_HISTORY_RETENTION_DAYS)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help='Сколько строк архивировать за одну транзакцию'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать строки старше горизонта'
+        )
+        parser.add_argument(
+            '--compact',
+            action='store_true',
+            help='После архивации выполнить VACUUM/ANALYZE'
+        )
+
+    def handle(self, *args, **options):
+        result = archive_play_history(
+            retention_days=options['days'],
+            batch_size=max(1, options['batch_size']),
+            dry_run=options['dry_run'],
+        )
+
+        self.stdout.write("\n" + "=" * 50)
+        if options['dry_run']:
+            self.stdout.write(f"🔍 Строк старше {result['cutoff']:%Y-%m-%d}, учтённых rollup-ом: {result['archived']}")
+            if result['pending_rollup']:
+                self.stdout.write(
+                    f"⏳ Ещё не учтены rollup-ом: {result['pending_rollup']} "
+                    f"(прогон сначала досчитает TrackAnalytics и заархивирует их тоже)"
+                )
+            self.stdout.write("=" * 50)
+            return
+
+        for month, count in sorted(result['months'].items()):
+            self.stdout.write(f"🗄️ {month}: {count}")
+        self.stdout.write(f"📁 Архив: {get_archive_dir()}")
+        self.stdout.write(self.style.SUCCESS(f"✅ Заархивировано строк: {result['archived']}"))
+
+        if options['compact'] and result['archived']:
+            compact_play_history()
+            self.stdout.write(self.style.SUCCESS("✅ Таблица уплотнена (VACUUM/ANALYZE)"))
+        self.stdout.write("=" * 50)
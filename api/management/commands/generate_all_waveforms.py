@@ -1,12 +1,18 @@
 # api/management/commands/generate_all_waveforms.py
+from django.conf import settings
 from django.core.management.base import BaseCommand
-from api.models import Track
-from api.views import ensure_waveform_for_track
+from django.db import connections, transaction
 from django.db.models import Q
+from django.utils import timezone
+from concurrent.futures import ProcessPoolExecutor
+from api.models import Track
+from api.waveform_tasks import ANALYSIS_FIELDS, init_worker_process, analyze_track_values, shift_playlist_durations
+import json
+import os
 import time
 
 class Command(BaseCommand):
-    help = 'Генерация всех вейвформ с автоматическим созданием треков'
+    help = 'Генерация всех вейвформ (параллельно, пачками, с возобновлением после сбоя)'
     
     def add_arguments(self, parser):
         parser.add_argument(
@@ -19,11 +25,36 @@ class Command(BaseCommand):
             action='store_true',
             help='Пропустить треки с существующими вейвформами'
         )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=max(1, (os.cpu_count() or 2) - 1),
+            help='Количество процессов анализа'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Треков в одной пачке (одна пачка = один bulk_update + чекпоинт)'
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Продолжить с последнего чекпоинта'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            default=os.path.join(settings.BASE_DIR, '.generate_all_waveforms.checkpoint.json'),
+            help='Файл чекпоинта'
+        )
     
     def handle(self, *args, **options):
         self.stdout.write("🚀 Запуск генерации всех waveforms...")
         
         start_time = time.time()
+        workers = max(1, options['workers'])
+        batch_size = max(1, options['batch_size'])
+        checkpoint_path = options['checkpoint']
         
         # Сначала создаем базовые треки если их нет
         self.create_basic_tracks()
@@ -35,76 +66,135 @@ class Command(BaseCommand):
         elif options['skip_existing']:
             tracks = Track.objects.filter(
                 Q(waveform_generated=False) | 
-                Q(waveform_data__len=0)
+                Q(waveform_data=[])
             )
             self.stdout.write("⏭️ Режим: только треки без вейвформ")
         else:
-            tracks = Track.objects.all()
-            self.stdout.write("📊 Режим: проверка и генерация при необходимости")
+            tracks = Track.objects.filter(
+                Q(waveform_generated=False) |
+                Q(waveform_data=[]) |
+                Q(waveform_pyramid__isnull=True)
+            )
+            self.stdout.write("📊 Режим: треки без вейвформ или без пирамиды")
         
-        total = tracks.count()
-        self.stdout.write(f"📊 Найдено {total} треков для обработки")
+        # Чекпоинт: последний обработанный pk
+        checkpoint = self.load_checkpoint(checkpoint_path) if options['resume'] else {}
+        last_pk = checkpoint.get('last_pk', 0)
+        generated = checkpoint.get('generated', 0)
+        errors = checkpoint.get('errors', 0)
+        if last_pk:
+            self.stdout.write(f"↩️  Продолжаем с трека id > {last_pk} (уже обработано: {generated + errors})")
         
-        generated = 0
-        skipped = 0
-        errors = 0
+        total = tracks.filter(pk__gt=last_pk).count()
+        self.stdout.write(f"📊 Найдено {total} треков для обработки ({workers} процесс(ов), пачка {batch_size})")
         
-        for i, track in enumerate(tracks, 1):
-            try:
-                self.stdout.write(f"\n[{i}/{total}] Трек {track.id}: {track.title}")
-                
-                # Проверяем нужно ли генерировать
-                if track.waveform_generated and track.waveform_data and not options['force']:
-                    self.stdout.write("   ⏭️  Пропущен (уже есть)")
-                    skipped += 1
-                    continue
-                
-                # Проверяем наличие аудио
-                has_audio = False
-                if track.audio_file and track.audio_file.path:
-                    import os
-                    has_audio = os.path.exists(track.audio_file.path)
-                elif track.audio_url:
-                    # Проверяем локальный файл по URL
-                    import os
-                    if track.audio_url.startswith('/tracks/'):
-                        local_path = f"frontend/public{track.audio_url}"
-                        has_audio = os.path.exists(local_path)
+        processed = 0
+        
+        # Соединения родителя не должны попасть в дочерние процессы
+        connections.close_all()
+        
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker_process) as pool:
+            while True:
+                # Итерация по pk пачками - без OFFSET и без загрузки всего каталога
+                batch_ids = list(
+                    tracks.filter(pk__gt=last_pk)
+                    .order_by('pk')
+                    .values_list('pk', flat=True)[:batch_size]
+                )
+                if not batch_ids:
+                    break
                 
-                if not has_audio:
-                    self.stdout.write(self.style.WARNING("   ⚠️  Аудиофайл не найден"))
+                connections.close_all()
+                results = list(pool.map(analyze_track_values, batch_ids))
                 
-                # Генерируем вейвформу
-                waveform_data = ensure_waveform_for_track(track)
+                now = timezone.now()
+                updated_tracks = []
+                for result in results:
+                    if 'error' in result:
+                        errors += 1
+                        self.stdout.write(self.style.ERROR(f"   ❌ Трек {result['id']}: {result['error']}"))
+                        continue
+                    
+                    updated_tracks.append(Track(
+                        waveform_generated=True,
+                        waveform_generated_at=now,
+                        updated_at=now,
+                        **result
+                    ))
                 
-                if waveform_data:
-                    generated += 1
-                    self.stdout.write(self.style.SUCCESS(f"   ✅ Сгенерировано"))
-                    self.stdout.write(f"      📊 Палочек: {len(waveform_data)}")
-                    self.stdout.write(f"      📊 Диапазон: {min(waveform_data)}-{max(waveform_data)}")
-                else:
-                    errors += 1
-                    self.stdout.write(self.style.ERROR("   ❌ Ошибка генерации"))
+                if updated_tracks:
+                    # Длительность могла уточниться - как run_track_analysis, сдвигаем
+                    # total_duration_seconds плейлистов на разницу (одна транзакция на пачку)
+                    old_durations = dict(
+                        Track.objects.filter(pk__in=[t.pk for t in updated_tracks])
+                        .values_list('pk', 'duration_seconds')
+                    )
+                    with transaction.atomic():
+                        Track.objects.bulk_update(updated_tracks, ANALYSIS_FIELDS + ['updated_at'])
+                        shift_playlist_durations({
+                            t.pk: (t.duration_seconds or 0) - (old_durations.get(t.pk) or 0)
+                            for t in updated_tracks
+                        })
+                    generated += len(updated_tracks)
                 
-            except Exception as e:
-                errors += 1
-                self.stdout.write(self.style.ERROR(f"   ❌ Исключение: {e}"))
+                processed += len(batch_ids)
+                last_pk = batch_ids[-1]
+                self.save_checkpoint(checkpoint_path, last_pk, generated, errors)
+                self.report_progress(processed, total, start_time)
+        
+        # Каталог пройден полностью - чекпоинт больше не нужен
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
         
         elapsed = time.time() - start_time
         
         self.stdout.write("\n" + "="*60)
         self.stdout.write(self.style.SUCCESS("🎉 ГЕНЕРАЦИЯ ЗАВЕРШЕНА!"))
         self.stdout.write(f"⏱️  Время: {elapsed:.2f} секунд")
-        self.stdout.write(f"📊 Всего треков: {total}")
+        self.stdout.write(f"📊 Обработано за запуск: {processed}")
         self.stdout.write(f"✅ Сгенерировано: {generated}")
-        self.stdout.write(f"⏭️  Пропущено: {skipped}")
         self.stdout.write(f"❌ Ошибок: {errors}")
         self.stdout.write("="*60)
         
         if errors > 0:
             self.stdout.write(self.style.WARNING("\n⚠️  Были ошибки. Проверьте логи."))
         
-        self.stdout.write(self.style.SUCCESS("\n✅ Готово! Waveforms доступны по API: /api/tracks/<id>/waveform/"))
+        self.stdout.write(self.style.SUCCESS("\n✅ Готово! Waveforms доступны по API: /api/track/<id>/waveform/"))
+    
+    def report_progress(self, processed, total, start_time):
+        """Прогресс, скорость и оценка оставшегося времени"""
+        elapsed = time.time() - start_time
+        rate = processed / elapsed if elapsed > 0 else 0
+        remaining = (total - processed) / rate if rate > 0 else 0
+        percent = processed * 100 / total if total else 100
+        
+        self.stdout.write(
+            f"📦 [{processed}/{total}] {percent:.1f}% | "
+            f"{rate:.2f} трек/с | ETA {time.strftime('%H:%M:%S', time.gmtime(remaining))}"
+        )
+    
+    def load_checkpoint(self, path):
+        if not os.path.exists(path):
+            self.stdout.write(self.style.WARNING("⚠️  Чекпоинт не найден, начинаем сначала"))
+            return {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            self.stdout.write(self.style.WARNING(f"⚠️  Чекпоинт повреждён ({e}), начинаем сначала"))
+            return {}
+    
+    def save_checkpoint(self, path, last_pk, generated, errors):
+        # Пишем во временный файл и переименовываем - чекпоинт не побьётся при падении
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'last_pk': last_pk,
+                'generated': generated,
+                'errors': errors,
+                'updated_at': timezone.now().isoformat()
+            }, f)
+        os.replace(tmp_path, path)
     
     def create_basic_tracks(self):
         """Создает базовые треки если их нет"""
@@ -48,7 +48,7 @@ class Command(BaseCommand):
             tracks = Track.objects.filter(
                 Q(waveform_generated=False) | 
                 Q(waveform_data__isnull=True) |
-                Q(waveform_data__len=0)
+                Q(waveform_data=[])
             )
             self.stdout.write("📊 Режим: только треки без waveforms")
         
@@ -0,0 +1,74 @@
+# api/management/commands/process_feed_fanout.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.feed import claim_pending_tasks, process_fanout_tasks, rebuild_feed_inboxes, reset_stale_tasks
+
+
+class Command(BaseCommand):
+    help = 'Фоновый воркер ленты: раскладка публикаций и репостов по inbox подписчиков (очередь FeedFanoutTask)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Сколько задач забирать из очереди за один проход'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2.0,
+            help='Пауза между опросами пустой очереди (сек)'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Обработать текущую очередь и выйти'
+        )
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Перед запуском пересобрать inbox всех пользователей по текущим подпискам'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        poll_interval = options['poll_interval']
+
+        if options['rebuild']:
+            total = rebuild_feed_inboxes()
+            self.stdout.write(self.style.SUCCESS(f"♻️ Inbox пересобраны: записей {total}"))
+
+        self.stdout.write(f"🚀 Воркер ленты: пачка {batch_size}")
+        stats = {'completed': 0, 'retry': 0, 'failed': 0}
+
+        try:
+            while True:
+                stale = reset_stale_tasks()
+                if stale:
+                    self.stdout.write(self.style.WARNING(f"♻️ Возвращено в очередь зависших задач: {stale}"))
+
+                task_ids = claim_pending_tasks(batch_size)
+                if not task_ids:
+                    if options['once']:
+                        break
+                    time.sleep(poll_interval)
+                    continue
+
+                result = process_fanout_tasks(task_ids)
+                for key, value in result.items():
+                    stats[key] += value
+                self.stdout.write(
+                    f"📥 Задач: {len(task_ids)} (готово {result['completed']}, "
+                    f"повтор {result['retry']}, ошибок {result['failed']})"
+                )
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("\n⏹️ Остановлено пользователем"))
+
+        self.stdout.write("\n" + "=" * 50)
+        self.stdout.write(self.style.SUCCESS(f"✅ Готово: {stats['completed']}"))
+        self.stdout.write(f"🔁 На повтор: {stats['retry']}")
+        self.stdout.write(f"❌ Ошибок: {stats['failed']}")
+        self.stdout.write("=" * 50)
@@ -0,0 +1,98 @@
+# api/management/commands/process_waveform_tasks.py
+from django.core.management.base import BaseCommand
+from django.db import connections
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import os
+import time
+
+from api.waveform_tasks import (
+    claim_pending_tasks,
+    reset_stale_tasks,
+    init_worker_process,
+    run_track_analysis,
+)
+
+
+class Command(BaseCommand):
+    help = 'Фоновый воркер: анализ загруженных треков (длительность, waveform) из очереди WaveformGenerationTask'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=max(1, (os.cpu_count() or 2) - 1),
+            help='Количество процессов анализа'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=20,
+            help='Сколько задач забирать из очереди за один проход'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2.0,
+            help='Пауза между опросами пустой очереди (сек)'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Обработать текущую очередь и выйти'
+        )
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        batch_size = max(1, options['batch_size'])
+        poll_interval = options['poll_interval']
+
+        self.stdout.write(f"🚀 Воркер анализа аудио: {workers} процесс(ов), пачка {batch_size}")
+
+        # Соединения родителя не должны попасть в дочерние процессы
+        connections.close_all()
+
+        stats = {'completed': 0, 'retry': 0, 'failed': 0, 'missing': 0}
+
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker_process) as pool:
+                while True:
+                    stale = reset_stale_tasks()
+                    if stale:
+                        self.stdout.write(self.style.WARNING(f"♻️ Возвращено в очередь зависших задач: {stale}"))
+
+                    task_ids = claim_pending_tasks(batch_size)
+                    connections.close_all()
+
+                    if not task_ids:
+                        if options['once']:
+                            break
+                        time.sleep(poll_interval)
+                        continue
+
+                    self.stdout.write(f"📥 Взято задач: {len(task_ids)}")
+                    futures = [pool.submit(run_track_analysis, task_id) for task_id in task_ids]
+
+                    for future in as_completed(futures):
+                        try:
+                            task_id, status = future.result()
+                        except Exception as e:
+                            stats['failed'] += 1
+                            self.stdout.write(self.style.ERROR(f"❌ Процесс анализа упал: {e}"))
+                            continue
+
+                        stats[status] = stats.get(status, 0) + 1
+                        if status == 'completed':
+                            self.stdout.write(self.style.SUCCESS(f"   ✅ Задача {task_id}: готово"))
+                        elif status == 'retry':
+                            self.stdout.write(self.style.WARNING(f"   🔁 Задача {task_id}: ошибка, повтор"))
+                        else:
+                            self.stdout.write(self.style.ERROR(f"   ❌ Задача {task_id}: {status}"))
+
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("\n⏹️ Остановлено пользователем"))
+
+        self.stdout.write("\n" + "=" * 50)
+        self.stdout.write(self.style.SUCCESS(f"✅ Готово: {stats['completed']}"))
+        self.stdout.write(f"🔁 На повтор: {stats['retry']}")
+        self.stdout.write(f"❌ Ошибок: {stats['failed']}")
+        self.stdout.write("=" * 50)
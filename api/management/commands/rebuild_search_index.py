@@ -0,0 +1,21 @@
+# api/management/commands/rebuild_search_index.py
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api.search_index import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Полное перестроение полнотекстового индекса поиска (SQLite FTS5) по трекам, плейлистам и пользователям'
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError(f"FTS5-индекс доступен только на SQLite (сейчас: {connection.vendor})")
+
+        counts = rebuild_search_index()
+
+        self.stdout.write("\n" + "=" * 50)
+        for kind, count in counts.items():
+            self.stdout.write(f"🔎 {kind}: документов {count}")
+        self.stdout.write(self.style.SUCCESS("✅ Индекс поиска перестроен"))
+        self.stdout.write("=" * 50)
@@ -0,0 +1,99 @@
+# api/management/commands/recount_playlist_counters.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from api.models import Playlist, PlaylistTrack, PlaylistLike, PlaylistRepost
+
+COUNTER_FIELDS = ['likes_count', 'reposts_count', 'track_count', 'total_duration_seconds']
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт денормализованных счётчиков плейлистов (лайки, репосты, треки, длительность)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Сколько плейлистов пересчитывать за один проход'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать расхождения, ничего не записывать'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        dry_run = options['dry_run']
+
+        total = Playlist.objects.count()
+        self.stdout.write(f"🔢 Проверка счётчиков {total} плейлистов (пачка {batch_size})")
+
+        checked = 0
+        fixed = 0
+        last_id = 0
+
+        while True:
+            playlists = list(
+                Playlist.objects.filter(id__gt=last_id)
+                .order_by('id')
+                .only('id', *COUNTER_FIELDS)[:batch_size]
+            )
+            if not playlists:
+                break
+            last_id = playlists[-1].id
+
+            actual = self.count_batch([p.id for p in playlists])
+
+            drifted = []
+            for playlist in playlists:
+                values = actual.get(playlist.id, {})
+                changed = False
+                for field in COUNTER_FIELDS:
+                    value = values.get(field, 0)
+                    if getattr(playlist, field) != value:
+                        if dry_run:
+                            self.stdout.write(
+                                f"   ⚠️ Плейлист {playlist.id}: {field} {getattr(playlist, field)} → {value}"
+                            )
+                        setattr(playlist, field, value)
+                        changed = True
+                if changed:
+                    drifted.append(playlist)
+
+            if drifted and not dry_run:
+                with transaction.atomic():
+                    Playlist.objects.bulk_update(drifted, COUNTER_FIELDS)
+
+            checked += len(playlists)
+            fixed += len(drifted)
+
+        self.stdout.write("\n" + "=" * 50)
+        self.stdout.write(f"📋 Проверено: {checked}")
+        if dry_run:
+            self.stdout.write(self.style.WARNING(f"⚠️ С расхождениями: {fixed} (dry-run, без записи)"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"✅ Исправлено: {fixed}"))
+        self.stdout.write("=" * 50)
+
+    def count_batch(self, playlist_ids):
+        """Фактические значения счётчиков для пачки - три сгруппированных запроса"""
+        actual = {playlist_id: {} for playlist_id in playlist_ids}
+
+        for row in (PlaylistTrack.objects.filter(playlist_id__in=playlist_ids)
+                    .values('playlist_id')
+                    .annotate(c=Count('id'), s=Sum('track__duration_seconds'))):
+            actual[row['playlist_id']]['track_count'] = row['c']
+            actual[row['playlist_id']]['total_duration_seconds'] = row['s'] or 0
+
+        for model, field in ((PlaylistLike, 'likes_count'), (PlaylistRepost, 'reposts_count')):
+            rows = (model.objects.filter(playlist_id__in=playlist_ids)
+                    .values('playlist_id')
+                    .annotate(c=Count('id'))
+                    .values_list('playlist_id', 'c'))
+            for playlist_id, count in rows:
+                actual[playlist_id][field] = count
+
+        return actual
@@ -0,0 +1,100 @@
+# api/management/commands/recount_track_counters.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from api.models import Track, TrackLike, TrackRepost, TrackComment, Comment
+
+COUNTER_FIELDS = ['like_count', 'repost_count', 'comment_count']
+
+
+class Command(BaseCommand):
+    help = 'Периодическая сверка счётчиков треков (лайки, репосты, комментарии) с таблицами-источниками'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько треков сверять за один проход'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать расхождения, ничего не записывать'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        dry_run = options['dry_run']
+
+        total = Track.objects.count()
+        self.stdout.write(f"🔢 Сверка счётчиков {total} треков (пачка {batch_size})")
+
+        checked = 0
+        fixed = 0
+        last_id = 0
+
+        while True:
+            tracks = list(
+                Track.objects.filter(id__gt=last_id)
+                .order_by('id')
+                .only('id', *COUNTER_FIELDS)[:batch_size]
+            )
+            if not tracks:
+                break
+            last_id = tracks[-1].id
+
+            actual = self.count_batch([t.id for t in tracks])
+
+            drifted = []
+            for track in tracks:
+                values = actual.get(track.id, {})
+                changed = False
+                for field in COUNTER_FIELDS:
+                    value = values.get(field, 0)
+                    if getattr(track, field) != value:
+                        if dry_run:
+                            self.stdout.write(
+                                f"   ⚠️ Трек {track.id}: {field} {getattr(track, field)} → {value}"
+                            )
+                        setattr(track, field, value)
+                        changed = True
+                if changed:
+                    drifted.append(track)
+
+            # bulk_update не вызывает Track.save() - пересчёт длительности и прочая логика save не запускаются
+            if drifted and not dry_run:
+                with transaction.atomic():
+                    Track.objects.bulk_update(drifted, COUNTER_FIELDS)
+
+            checked += len(tracks)
+            fixed += len(drifted)
+
+        self.stdout.write("\n" + "=" * 50)
+        self.stdout.write(f"📋 Проверено: {checked}")
+        if dry_run:
+            self.stdout.write(self.style.WARNING(f"⚠️ С расхождениями: {fixed} (dry-run, без записи)"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"✅ Исправлено: {fixed}"))
+        self.stdout.write("=" * 50)
+
+    def count_batch(self, track_ids):
+        """Фактические значения для пачки - по одному сгруппированному запросу на источник"""
+        actual = {track_id: {} for track_id in track_ids}
+
+        sources = (
+            (TrackLike.objects.all(), 'like_count'),
+            (TrackRepost.objects.all(), 'repost_count'),
+            (TrackComment.objects.filter(is_deleted=False), 'comment_count'),
+            (Comment.objects.all(), 'comment_count'),
+        )
+        for queryset, field in sources:
+            rows = (queryset.filter(track_id__in=track_ids)
+                    .values('track_id')
+                    .annotate(c=Count('id'))
+                    .values_list('track_id', 'c'))
+            for track_id, count in rows:
+                actual[track_id][field] = actual[track_id].get(field, 0) + count
+
+        return actual
@@ -0,0 +1,40 @@
+# api/management/commands/rollup_track_analytics.py
+from django.core.management.base import BaseCommand
+
+from api.analytics_rollup import rollup_track_analytics, rebuild_track_analytics, DEFAULT_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Инкрементальный rollup прослушиваний/лайков/репостов/комментариев в TrackAnalytics по дням'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help='Сколько событий источника обрабатывать за одну транзакцию'
+        )
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Очистить TrackAnalytics и пересчитать всё с начала (plays заархивированных месяцев сохраняются)'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+
+        if options['rebuild']:
+            processed, frozen_through = rebuild_track_analytics(batch_size=batch_size)
+            self.stdout.write(self.style.WARNING("♻️ TrackAnalytics пересчитана с начала"))
+            if frozen_through:
+                self.stdout.write(self.style.WARNING(
+                    f"🗄️ plays по {frozen_through} сохранены: эти дни в архиве PlayHistory"
+                ))
+        else:
+            processed = rollup_track_analytics(batch_size=batch_size)
+
+        self.stdout.write("\n" + "=" * 50)
+        for key, count in processed.items():
+            self.stdout.write(f"📊 {key}: новых событий {count}")
+        self.stdout.write(self.style.SUCCESS("✅ Rollup завершён"))
+        self.stdout.write("=" * 50)
@@ -0,0 +1,46 @@
+# api/management/commands/snapshot_user_stats.py
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.user_stats import snapshot_all_users
+
+
+class Command(BaseCommand):
+    help = 'Ночной снимок статистики всех пользователей в UserDailyStats (запускать по cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            type=str,
+            default=None,
+            help='Дата снимка YYYY-MM-DD (по умолчанию - вчера, последний завершённый день)'
+        )
+        parser.add_argument(
+            '--backfill-days',
+            type=int,
+            default=0,
+            help='Дополнительно пересчитать снимки за N предыдущих дней'
+        )
+
+    def handle(self, *args, **options):
+        if options['date']:
+            try:
+                day = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError(f"Неверная дата: {options['date']} (ожидается YYYY-MM-DD)")
+        else:
+            # сегодняшний день не закончился - его точку история считает на лету
+            day = timezone.localdate() - timedelta(days=1)
+
+        backfill_days = max(0, options['backfill_days'])
+        days = [day - timedelta(days=offset) for offset in range(backfill_days, -1, -1)]
+
+        self.stdout.write(f"📸 Снимок статистики пользователей: {days[0]} … {days[-1]}")
+
+        for snapshot_day in days:
+            count = snapshot_all_users(snapshot_day)
+            self.stdout.write(f"   ✅ {snapshot_day}: {count} пользователей")
+
+        self.stdout.write(self.style.SUCCESS("✅ Снимки сохранены"))
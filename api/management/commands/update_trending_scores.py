@@ -0,0 +1,28 @@
+# api/management/commands/update_trending_scores.py
+from django.core.management.base import BaseCommand
+
+from api.trending import update_trending_scores, refresh_trending_hashtags
+
+
+class Command(BaseCommand):
+    help = 'Инкрементальное обновление рейтинга "в тренде" и кэша трендовых хештегов (cron раз в 5-15 минут)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Обнулить рейтинги и пересчитать по событиям за TRENDING_WINDOW_DAYS'
+        )
+
+    def handle(self, *args, **options):
+        processed = update_trending_scores(rebuild=options['rebuild'])
+
+        self.stdout.write("\n" + "=" * 50)
+        for key in ('plays', 'likes', 'reposts'):
+            self.stdout.write(f"🔥 {key}: новых событий {processed.get(key, 0)}")
+        self.stdout.write(f"🎵 Треков с новым вкладом: {processed.get('tracks', 0)}")
+
+        for window, count in refresh_trending_hashtags().items():
+            self.stdout.write(f"#️⃣ Хештеги {window}: в кэше {count}")
+        self.stdout.write(self.style.SUCCESS("✅ Рейтинг обновлён"))
+        self.stdout.write("=" * 50)
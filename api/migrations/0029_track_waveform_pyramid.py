@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0028_banappeal_ai_error_banappeal_ai_generated_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='track',
+            name='waveform_pyramid',
+            field=models.BinaryField(blank=True, null=True, verbose_name='Пирамида waveform'),
+        ),
+    ]
@@ -0,0 +1,90 @@
+# Перевод Track.waveform_data и Message.waveform из JSON-списков в квантованный uint8
+
+import api.models
+from django.db import migrations
+
+
+def pack_waveforms(apps, schema_editor):
+    Track = apps.get_model('api', 'Track')
+    Message = apps.get_model('api', 'Message')
+
+    tracks = []
+    for track in Track.objects.only('id', 'waveform_data').iterator(chunk_size=500):
+        track.waveform_compact = track.waveform_data or []
+        tracks.append(track)
+        if len(tracks) >= 500:
+            Track.objects.bulk_update(tracks, ['waveform_compact'])
+            tracks = []
+    if tracks:
+        Track.objects.bulk_update(tracks, ['waveform_compact'])
+
+    messages = []
+    for message in Message.objects.exclude(waveform__isnull=True).only('id', 'waveform').iterator(chunk_size=500):
+        waveform = message.waveform
+        message.waveform_compact = waveform if isinstance(waveform, list) else None
+        messages.append(message)
+        if len(messages) >= 500:
+            Message.objects.bulk_update(messages, ['waveform_compact'])
+            messages = []
+    if messages:
+        Message.objects.bulk_update(messages, ['waveform_compact'])
+
+
+def unpack_waveforms(apps, schema_editor):
+    Track = apps.get_model('api', 'Track')
+    Message = apps.get_model('api', 'Message')
+
+    for track in Track.objects.only('id', 'waveform_compact').iterator(chunk_size=500):
+        Track.objects.filter(id=track.id).update(waveform_data=track.waveform_compact or [])
+
+    for message in Message.objects.exclude(waveform_compact__isnull=True).only('id', 'waveform_compact').iterator(chunk_size=500):
+        Message.objects.filter(id=message.id).update(waveform=message.waveform_compact)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0029_track_waveform_pyramid'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='track',
+            name='waveform_compact',
+            field=api.models.CompactWaveformField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='waveform_compact',
+            field=api.models.CompactWaveformField(blank=True, null=True),
+        ),
+        migrations.RunPython(pack_waveforms, unpack_waveforms),
+        migrations.RemoveField(
+            model_name='track',
+            name='waveform_data',
+        ),
+        migrations.RemoveField(
+            model_name='message',
+            name='waveform',
+        ),
+        migrations.RenameField(
+            model_name='track',
+            old_name='waveform_compact',
+            new_name='waveform_data',
+        ),
+        migrations.RenameField(
+            model_name='message',
+            old_name='waveform_compact',
+            new_name='waveform',
+        ),
+        migrations.AlterField(
+            model_name='track',
+            name='waveform_data',
+            field=api.models.CompactWaveformField(blank=True, default=list, help_text='Массив чисел 0-100 для отрисовки waveform (в БД - uint8)', verbose_name='Waveform данные'),
+        ),
+        migrations.AlterField(
+            model_name='message',
+            name='waveform',
+            field=api.models.CompactWaveformField(blank=True, null=True, verbose_name='Waveform данные для голосового сообщения'),
+        ),
+    ]
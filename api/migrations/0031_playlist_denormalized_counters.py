@@ -0,0 +1,58 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:21
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_playlist_counters(apps, schema_editor):
+    """Начальное заполнение счётчиков - сгруппированными запросами по всей таблице"""
+    Playlist = apps.get_model('api', 'Playlist')
+    PlaylistTrack = apps.get_model('api', 'PlaylistTrack')
+    PlaylistRepost = apps.get_model('api', 'PlaylistRepost')
+
+    tracks = {
+        row['playlist_id']: row
+        for row in PlaylistTrack.objects.values('playlist_id').annotate(
+            c=Count('id'), s=Sum('track__duration_seconds')
+        )
+    }
+    reposts = dict(
+        PlaylistRepost.objects.values('playlist_id').annotate(c=Count('id')).values_list('playlist_id', 'c')
+    )
+
+    playlists = list(Playlist.objects.only('id'))
+    for playlist in playlists:
+        row = tracks.get(playlist.id) or {}
+        playlist.track_count = row.get('c') or 0
+        playlist.total_duration_seconds = row.get('s') or 0
+        playlist.reposts_count = reposts.get(playlist.id, 0)
+
+    Playlist.objects.bulk_update(
+        playlists, ['track_count', 'total_duration_seconds', 'reposts_count'], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0030_compact_waveform_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='playlist',
+            name='reposts_count',
+            field=models.IntegerField(default=0, verbose_name='Количество репостов'),
+        ),
+        migrations.AddField(
+            model_name='playlist',
+            name='total_duration_seconds',
+            field=models.IntegerField(default=0, verbose_name='Общая длительность (секунды)'),
+        ),
+        migrations.AddField(
+            model_name='playlist',
+            name='track_count',
+            field=models.IntegerField(default=0, verbose_name='Количество треков'),
+        ),
+        migrations.RunPython(fill_playlist_counters, migrations.RunPython.noop),
+    ]
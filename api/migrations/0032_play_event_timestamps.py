@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:24
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0031_playlist_denormalized_counters'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='listeninghistory',
+            name='listened_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Время прослушивания'),
+        ),
+        migrations.AlterField(
+            model_name='playhistory',
+            name='played_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Время прослушивания'),
+        ),
+    ]
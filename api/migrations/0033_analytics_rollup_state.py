@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0032_play_event_timestamps'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsRollupState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Rollup')),
+                ('high_water_marks', models.JSONField(default=dict, verbose_name='Последние обработанные id')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Состояние rollup-а',
+                'verbose_name_plural': 'Состояния rollup-ов',
+            },
+        ),
+    ]
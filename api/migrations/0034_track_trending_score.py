@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0033_analytics_rollup_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='track',
+            name='trending_score',
+            field=models.FloatField(default=0, editable=False, verbose_name='Рейтинг в тренде'),
+        ),
+        migrations.AddIndex(
+            model_name='track',
+            index=models.Index(fields=['status', '-trending_score'], name='api_track_status_9c3641_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='track',
+            index=models.Index(fields=['genre', 'status', '-trending_score'], name='api_track_genre_9b6264_idx'),
+        ),
+    ]
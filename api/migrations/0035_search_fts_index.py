@@ -0,0 +1,123 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:36
+
+import api.models
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# SQL заморожен на момент миграции: api/search_index.py может меняться дальше,
+# а миграция должна создавать те же таблицы, что и при первом применении
+CREATE_SQL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS api_track_fts USING fts5("
+    "title, artist, username, tags, tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "INSERT INTO api_track_fts(api_track_fts, rank) VALUES('rank', 'bm25(10.0, 5.0, 3.0, 2.0)')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS api_playlist_fts USING fts5("
+    "title, description, username, tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "INSERT INTO api_playlist_fts(api_playlist_fts, rank) VALUES('rank', 'bm25(10.0, 2.0, 3.0)')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS api_user_fts USING fts5("
+    "username, bio, country, tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "INSERT INTO api_user_fts(api_user_fts, rank) VALUES('rank', 'bm25(10.0, 1.0, 2.0)')",
+]
+
+FILL_SQL = [
+    """
+    INSERT INTO api_track_fts(rowid, title, artist, username, tags)
+    SELECT t.id, COALESCE(t.title, ''), COALESCE(t.artist, ''), COALESCE(u.username, ''),
+           TRIM(COALESCE(t.tags, '') || ' ' || COALESCE((
+               SELECT group_concat(h.name, ' ')
+               FROM api_track_hashtags th JOIN api_hashtag h ON h.id = th.hashtag_id
+               WHERE th.track_id = t.id
+           ), ''))
+    FROM api_track t LEFT JOIN api_customuser u ON u.id = t.uploaded_by_id
+    """,
+    """
+    INSERT INTO api_playlist_fts(rowid, title, description, username)
+    SELECT p.id, COALESCE(p.title, ''), COALESCE(p.description, ''), COALESCE(u.username, '')
+    FROM api_playlist p LEFT JOIN api_customuser u ON u.id = p.created_by_id
+    """,
+    """
+    INSERT INTO api_user_fts(rowid, username, bio, country)
+    SELECT u.id, COALESCE(u.username, ''), COALESCE(u.bio, ''), COALESCE(u.country, '')
+    FROM api_customuser u
+    """,
+]
+
+DROP_SQL = [
+    "DROP TABLE IF EXISTS api_track_fts",
+    "DROP TABLE IF EXISTS api_playlist_fts",
+    "DROP TABLE IF EXISTS api_user_fts",
+]
+
+
+def create_fts_tables(apps, schema_editor):
+    """FTS5-таблицы поиска + начальное наполнение (только SQLite)"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for sql in CREATE_SQL + FILL_SQL:
+            cursor.execute(sql)
+
+
+def drop_fts_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for sql in DROP_SQL:
+            cursor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0034_track_trending_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlaylistSearchIndex',
+            fields=[
+                ('playlist', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='api.playlist')),
+                ('document', api.models.FullTextDocumentField(db_column='api_playlist_fts')),
+                ('rank', models.FloatField()),
+                ('title', models.TextField()),
+                ('description', models.TextField()),
+                ('username', models.TextField()),
+            ],
+            options={
+                'db_table': 'api_playlist_fts',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='TrackSearchIndex',
+            fields=[
+                ('track', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='api.track')),
+                ('document', api.models.FullTextDocumentField(db_column='api_track_fts')),
+                ('rank', models.FloatField()),
+                ('title', models.TextField()),
+                ('artist', models.TextField()),
+                ('username', models.TextField()),
+                ('tags', models.TextField()),
+            ],
+            options={
+                'db_table': 'api_track_fts',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='UserSearchIndex',
+            fields=[
+                ('user', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('document', api.models.FullTextDocumentField(db_column='api_user_fts')),
+                ('rank', models.FloatField()),
+                ('username', models.TextField()),
+                ('bio', models.TextField()),
+                ('country', models.TextField()),
+            ],
+            options={
+                'db_table': 'api_user_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_fts_tables, drop_fts_tables),
+    ]
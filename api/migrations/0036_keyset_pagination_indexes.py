@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0035_search_fts_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['following', '-created_at'], name='api_follow_followi_038e18_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['follower', '-created_at'], name='api_follow_followe_a74126_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='playhistory',
+            index=models.Index(fields=['user', '-played_at'], name='api_playhis_user_id_2f35dc_idx'),
+        ),
+    ]
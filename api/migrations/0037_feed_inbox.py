@@ -0,0 +1,97 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:44
+
+from itertools import groupby
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Сколько последних загрузок и репостов автора кладём в inbox подписчика (как FEED_BACKFILL_LIMIT)
+BACKFILL_LIMIT = 50
+
+
+def backfill_feed_inboxes(apps, schema_editor):
+    """Inbox-ы по существующим подпискам - чтобы лента не была пустой сразу после деплоя"""
+    Follow = apps.get_model('api', 'Follow')
+    Track = apps.get_model('api', 'Track')
+    TrackRepost = apps.get_model('api', 'TrackRepost')
+    FeedItem = apps.get_model('api', 'FeedItem')
+    limit = getattr(settings, 'FEED_BACKFILL_LIMIT', BACKFILL_LIMIT)
+
+    follows = Follow.objects.order_by('follower_id').values_list('follower_id', 'following_id')
+    for follower_id, pairs in groupby(follows.iterator(), key=lambda pair: pair[0]):
+        # одна запись на (подписчик, трек) по всем подпискам - по самому свежему событию
+        events = {}
+
+        def keep(track_id, reason, actor_id, created_at):
+            if track_id not in events or created_at > events[track_id][2]:
+                events[track_id] = (reason, actor_id, created_at)
+
+        for _, following_id in pairs:
+            uploads = Track.objects.filter(
+                uploaded_by_id=following_id, status='published', is_private=False
+            ).order_by('-created_at').values_list('id', 'published_at', 'created_at')[:limit]
+            for track_id, published_at, created_at in uploads:
+                keep(track_id, 'upload', following_id, published_at or created_at)
+            reposts = TrackRepost.objects.filter(
+                user_id=following_id, track__status='published', track__is_private=False
+            ).exclude(track__uploaded_by_id=follower_id).order_by('-reposted_at').values_list(
+                'track_id', 'reposted_at'
+            )[:limit]
+            for track_id, reposted_at in reposts:
+                keep(track_id, 'repost', following_id, reposted_at)
+
+        FeedItem.objects.bulk_create([
+            FeedItem(user_id=follower_id, track_id=track_id, actor_id=actor_id,
+                     reason=reason, created_at=created_at)
+            for track_id, (reason, actor_id, created_at) in events.items()
+        ], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0036_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedFanoutTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('upload', 'Публикация трека'), ('repost', 'Репост'), ('unrepost', 'Отмена репоста')], max_length=10, verbose_name='Тип')),
+                ('status', models.CharField(choices=[('pending', '⏳ Ожидание'), ('processing', '⚙️ Обработка'), ('failed', '❌ Ошибка')], default='pending', max_length=20, verbose_name='Статус')),
+                ('attempt_count', models.IntegerField(default=0, verbose_name='Попыток')),
+                ('error_message', models.TextField(blank=True, verbose_name='Сообщение об ошибке')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Время создания')),
+                ('actor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор события')),
+                ('track', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.track', verbose_name='Трек')),
+            ],
+            options={
+                'verbose_name': 'Задача раскладки ленты',
+                'verbose_name_plural': 'Задачи раскладки ленты',
+                'indexes': [models.Index(fields=['status', 'id'], name='api_feedfan_status_8540bf_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='FeedItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reason', models.CharField(choices=[('upload', 'Новый трек'), ('repost', 'Репост')], default='upload', max_length=10, verbose_name='Событие')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Время события')),
+                ('actor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор события')),
+                ('track', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_items', to='api.track', verbose_name='Трек')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_items', to=settings.AUTH_USER_MODEL, verbose_name='Владелец ленты')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты',
+                'verbose_name_plural': 'Записи ленты',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user', '-created_at'], name='api_feedite_user_id_cf7cf7_idx'), models.Index(fields=['user', 'actor'], name='api_feedite_user_id_797873_idx'), models.Index(fields=['track', 'actor'], name='api_feedite_track_i_431f46_idx')],
+                'unique_together': {('user', 'track')},
+            },
+        ),
+        migrations.RunPython(backfill_feed_inboxes, migrations.RunPython.noop),
+    ]
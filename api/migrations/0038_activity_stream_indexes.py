@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0037_feed_inbox'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='playlist',
+            index=models.Index(fields=['created_by', '-created_at'], name='api_playlis_created_74c9db_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='playlistrepost',
+            index=models.Index(fields=['user', '-created_at'], name='api_playlis_user_id_f07d6e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trackrepost',
+            index=models.Index(fields=['user', '-reposted_at'], name='api_trackre_user_id_14d127_idx'),
+        ),
+    ]
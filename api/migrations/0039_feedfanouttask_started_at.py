@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0038_activity_stream_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feedfanouttask',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Время захвата воркером'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0039_feedfanouttask_started_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlayRateCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, unique=True, verbose_name='Область и окно')),
+                ('hits', models.PositiveIntegerField(default=0, verbose_name='Попыток')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='Истекает')),
+            ],
+            options={
+                'verbose_name': 'Счётчик лимитера прослушиваний',
+                'verbose_name_plural': 'Счётчики лимитера прослушиваний',
+            },
+        ),
+    ]
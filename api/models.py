@@ -2,10 +2,10 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.utils import timezone
 import os
+import json
 from django.conf import settings
 import logging
 from django.core.files.storage import FileSystemStorage
-import mutagen  # 🔥 ДЛЯ БЫСТРОГО ВЫЧИСЛЕНИЯ ДЛИТЕЛЬНОСТИ
 from uuid import uuid4  # 🔥 ДЛЯ ГЕНЕРАЦИИ ИМЕН ФАЙЛОВ
 
 logger = logging.getLogger(__name__)
@@ -17,6 +17,43 @@ class OverwriteStorage(FileSystemStorage):
             os.remove(os.path.join(self.location, name))
         return name
 
+# ==================== КОМПАКТНОЕ ПОЛЕ WAVEFORM ====================
+class CompactWaveformField(models.BinaryField):
+    """
+    Waveform в БД - квантованный uint8-массив (audio_analysis.encode_waveform)
+    вместо JSON-списка float. В Python-коде значение - обычный список чисел.
+    """
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return self._decode(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, list):
+            return value
+        if isinstance(value, str):
+            # dumpdata/loaddata: значение сериализуется как JSON-список
+            return json.loads(value)
+        return self._decode(value)
+
+    def get_prep_value(self, value):
+        if value is None or isinstance(value, (bytes, bytearray, memoryview)):
+            return value
+        from .audio_analysis import encode_waveform
+        return encode_waveform(value)
+
+    def value_to_string(self, obj):
+        return json.dumps(self.value_from_object(obj))
+
+    def _decode(self, value):
+        from .audio_analysis import decode_waveform
+        try:
+            return decode_waveform(value)
+        except Exception as e:
+            logger.error(f"Не удалось декодировать waveform: {e}")
+            return []
+
 # ==================== ПУТИ ДЛЯ ФАЙЛОВ ====================
 def avatar_upload_path(instance, filename):
     ext = filename.split('.')[-1].lower()
@@ -88,26 +125,28 @@ def message_video_path(instance, filename):
 def get_audio_duration_fast(file_path):
     """
     🔥 БЫСТРОЕ вычисление длительности аудиофайла
-    Использует mutagen для чтения метаданных, а не весь файл
+    Читает только заголовок (audio_analysis.probe_audio), а не весь файл
     """
+    return int(probe_audio_header(file_path)['duration'])
+
+
+def probe_audio_header(file_path):
+    """Метаданные из заголовка файла: duration, sample_rate, channels, bitrate"""
+    from .audio_analysis import probe_audio
+
     try:
         if not os.path.exists(file_path):
             logger.warning(f"Файл не найден: {file_path}")
-            return 0
-        
-        # 🔥 Мгновенное чтение метаданных через mutagen
-        audio = mutagen.File(file_path, easy=True)
-        if audio and hasattr(audio.info, 'length'):
-            duration = int(audio.info.length)
-            logger.info(f"Длительность файла {file_path}: {duration} секунд")
-            return duration
-        
-        logger.warning(f"Не удалось получить длительность для {file_path}")
-        return 0
-        
+            return {'duration': 0, 'sample_rate': 0, 'channels': 0, 'bitrate': 0, 'source': None}
+
+        info = probe_audio(file_path)
+        if info['duration'] <= 0:
+            logger.warning(f"Не удалось получить длительность для {file_path}")
+        return info
+
     except Exception as e:
         logger.error(f"Ошибка при вычислении длительности {file_path}: {e}")
-        return 0
+        return {'duration': 0, 'sample_rate': 0, 'channels': 0, 'bitrate': 0, 'source': None}
 
 # ==================== CUSTOM USER ====================
 class CustomUserManager(BaseUserManager):
@@ -434,6 +473,11 @@ class Follow(models.Model):
     class Meta:
         unique_together = ['follower', 'following']
         ordering = ['-created_at']
+        indexes = [
+            # списки подписчиков/подписок: keyset по (created_at, id)
+            models.Index(fields=['following', '-created_at']),
+            models.Index(fields=['follower', '-created_at']),
+        ]
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
     
@@ -619,11 +663,11 @@ class Track(models.Model):
         default=0
     )
     
-    waveform_data = models.JSONField(
+    waveform_data = CompactWaveformField(
         verbose_name='Waveform данные',
         default=list,
         blank=True,
-        help_text='Массив чисел 0-100 для отрисовки waveform'
+        help_text='Массив чисел 0-100 для отрисовки waveform (в БД - uint8)'
     )
     
     waveform_generated = models.BooleanField(
@@ -648,6 +692,15 @@ class Track(models.Model):
         verbose_name='Количество точек waveform'
     )
     
+    # 🔥 Пирамида waveform (64/256/1024/4096 столбиков min/max/RMS) в бинарном виде
+    # Формат - audio_analysis.pack_waveform_pyramid
+    waveform_pyramid = models.BinaryField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Пирамида waveform'
+    )
+    
     # 🔥 КРИТИЧЕСКОЕ ПОЛЕ: общее количество прослушиваний
     play_count = models.PositiveIntegerField(
         default=0,
@@ -669,6 +722,13 @@ class Track(models.Model):
         verbose_name='Количество комментариев'
     )
     
+    # 🔥 Затухающий рейтинг "в тренде" (пересчитывает команда update_trending_scores)
+    trending_score = models.FloatField(
+        default=0,
+        editable=False,
+        verbose_name='Рейтинг в тренде'
+    )
+    
     download_count = models.PositiveIntegerField(
         default=0,
         verbose_name='Количество скачиваний'
@@ -830,6 +890,8 @@ class Track(models.Model):
             models.Index(fields=['uploaded_by', 'status']),
             models.Index(fields=['genre', 'status']),
             models.Index(fields=['like_count', 'play_count']),
+            models.Index(fields=['status', '-trending_score']),
+            models.Index(fields=['genre', 'status', '-trending_score']),
             models.Index(fields=['created_at']),
             models.Index(fields=['title']),
         ]
@@ -848,17 +910,9 @@ class Track(models.Model):
         # 🔥 1. ТОЛЬКО при создании нового трека вычисляем длительность
         if is_new and self.audio_file and not self._duration_calculated:
             try:
-                # Быстрое вычисление длительности через mutagen
                 file_path = self.audio_file.path
                 if os.path.exists(file_path):
-                    self.duration_seconds = get_audio_duration_fast(file_path)
-                    
-                    # Форматируем в строку
-                    minutes = self.duration_seconds // 60
-                    seconds = self.duration_seconds % 60
-                    self.duration = f"{minutes}:{seconds:02d}"
-                    
-                    self._duration_calculated = True
+                    self._apply_audio_header(file_path)
                     logger.info(f"Трек новый: длительность вычислена = {self.duration_seconds} сек ({self.duration})")
                 else:
                     logger.warning(f"Файл не найден: {file_path}")
@@ -881,13 +935,7 @@ class Track(models.Model):
                     # Аудиофайл изменился - нужно пересчитать
                     file_path = self.audio_file.path
                     if os.path.exists(file_path):
-                        self.duration_seconds = get_audio_duration_fast(file_path)
-                        
-                        minutes = self.duration_seconds // 60
-                        seconds = self.duration_seconds % 60
-                        self.duration = f"{minutes}:{seconds:02d}"
-                        
-                        self._duration_calculated = True
+                        self._apply_audio_header(file_path)
                         logger.info(f"Трек {self.id}: аудио изменено, длительность пересчитана = {self.duration_seconds} сек")
             except Track.DoesNotExist:
                 pass
@@ -926,6 +974,22 @@ class Track(models.Model):
         if self.status == 'published' and not self.waveform_generated:
             logger.info(f"Трек {self.id} опубликован, можно сгенерировать waveform")
     
+    def _apply_audio_header(self, file_path):
+        """
+        Длительность/sample rate/битрейт из заголовка файла (без декодирования).
+        Точные значения и waveform досчитывает фоновый анализ (waveform_tasks).
+        """
+        from .audio_analysis import format_duration
+        
+        info = probe_audio_header(file_path)
+        self.duration_seconds = int(info['duration'])
+        self.duration = format_duration(info['duration'])
+        if info['sample_rate']:
+            self.sample_rate = info['sample_rate']
+        if info['bitrate']:
+            self.bitrate = info['bitrate']
+        self._duration_calculated = True
+    
     def publish(self):
         if self.status == 'draft':
             self.status = 'published'
@@ -1016,14 +1080,37 @@ class Track(models.Model):
         self.save(update_fields=['play_count', 'updated_at'])
         logger.info(f"Трек {self.id}: play_count увеличен до {self.play_count}")
     
+    @classmethod
+    def bump_counters(cls, tracks, **deltas):
+        """
+        Атомарно сдвигает счётчики трека одним UPDATE ... SET field = MAX(field + delta, 0)
+        без чтения-изменения-записи: параллельные лайки не теряются и не ждут COUNT(*).
+        tracks - id, список id или queryset треков.
+        """
+        from django.db.models.functions import Greatest
+
+        updates = {
+            field: Greatest(models.F(field) + delta, 0)
+            for field, delta in deltas.items() if delta
+        }
+        if not updates:
+            return 0
+
+        if isinstance(tracks, models.QuerySet):
+            queryset = tracks
+        elif isinstance(tracks, int):
+            queryset = cls.objects.filter(id=tracks)
+        else:
+            queryset = cls.objects.filter(id__in=list(tracks))
+        return queryset.update(**updates)
+
     def increment_like_count(self):
-        self.like_count += 1
-        self.save(update_fields=['like_count', 'updated_at'])
+        Track.bump_counters(self.id, like_count=1)
+        self.refresh_from_db(fields=['like_count'])
     
     def decrement_like_count(self):
-        if self.like_count > 0:
-            self.like_count -= 1
-            self.save(update_fields=['like_count', 'updated_at'])
+        Track.bump_counters(self.id, like_count=-1)
+        self.refresh_from_db(fields=['like_count'])
     
     def can_be_accessed_by(self, user):
         if self.status != 'published':
@@ -1035,22 +1122,35 @@ class Track(models.Model):
         return True
     
     def get_waveform(self, num_points=None):
+        if num_points and self.waveform_pyramid:
+            # Готовый уровень пирамиды - без пересчёта
+            try:
+                return self.get_waveform_range(num_points)['waveform']
+            except Exception as e:
+                logger.warning(f"Не удалось прочитать пирамиду waveform трека {self.id}: {e}")
+        
         if not self.waveform_data:
             return []
         
         if num_points and len(self.waveform_data) != num_points:
-            import math
+            import numpy as np
             old_len = len(self.waveform_data)
-            new_data = []
-            for i in range(num_points):
-                idx = int(i * old_len / num_points)
-                if idx < old_len:
-                    new_data.append(self.waveform_data[idx])
-                else:
-                    new_data.append(0)
-            return new_data
+            indices = (np.arange(num_points) * old_len) // num_points
+            return np.asarray(self.waveform_data)[indices].tolist()
         
         return self.waveform_data
+    
+    def get_waveform_range(self, points, start=None, end=None):
+        """
+        Столбики min/max/rms для отрезка [start, end] (сек) из пирамиды waveform.
+        Бросает ValueError, если пирамиды нет или отрезок некорректный.
+        """
+        from .audio_analysis import unpack_waveform_pyramid, slice_waveform_pyramid
+        
+        if not self.waveform_pyramid:
+            raise ValueError('Пирамида waveform ещё не построена')
+        
+        return slice_waveform_pyramid(unpack_waveform_pyramid(self.waveform_pyramid), points, start, end)
 
 # ==================== СИСТЕМА РЕПОСТОВ ====================
 class TrackRepost(models.Model):
@@ -1082,12 +1182,119 @@ class TrackRepost(models.Model):
     class Meta:
         unique_together = ['user', 'track']
         ordering = ['-reposted_at']
+        indexes = [
+            # лента активности (api/activity.py): репосты подписок по времени
+            models.Index(fields=['user', '-reposted_at']),
+        ]
         verbose_name = 'Репост трека'
         verbose_name_plural = 'Репосты треков'
     
     def __str__(self):
         return f"{self.user.username} reposted {self.track.title}"
 
+# ==================== ЛЕНТА НОВОСТЕЙ (FAN-OUT ON WRITE) ====================
+# Inbox ленты пользователя: заполняется воркером process_feed_fanout (api/feed.py)
+class FeedItem(models.Model):
+    REASON_CHOICES = [
+        ('upload', 'Новый трек'),
+        ('repost', 'Репост'),
+    ]
+
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Владелец ленты'
+    )
+
+    track = models.ForeignKey(
+        Track,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Трек'
+    )
+
+    actor = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор события'
+    )
+
+    reason = models.CharField(
+        max_length=10,
+        choices=REASON_CHOICES,
+        default='upload',
+        verbose_name='Событие'
+    )
+
+    # время события (публикации или репоста), а не вставки в inbox
+    created_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Время события'
+    )
+
+    class Meta:
+        unique_together = ['user', 'track']
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+            models.Index(fields=['user', 'actor']),
+            models.Index(fields=['track', 'actor']),
+        ]
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+
+    def __str__(self):
+        return f"feed {self.user_id}: {self.reason} {self.track_id} by {self.actor_id}"
+
+
+class FeedFanoutTask(models.Model):
+    KIND_CHOICES = [
+        ('upload', 'Публикация трека'),
+        ('repost', 'Репост'),
+        ('unrepost', 'Отмена репоста'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', '⏳ Ожидание'),
+        ('processing', '⚙️ Обработка'),
+        ('failed', '❌ Ошибка'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, verbose_name='Тип')
+    actor = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор события'
+    )
+    track = models.ForeignKey(
+        Track,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Трек'
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='pending',
+        verbose_name='Статус'
+    )
+    attempt_count = models.IntegerField(default=0, verbose_name='Попыток')
+    error_message = models.TextField(blank=True, verbose_name='Сообщение об ошибке')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Время создания')
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name='Время захвата воркером')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id']),
+        ]
+        verbose_name = 'Задача раскладки ленты'
+        verbose_name_plural = 'Задачи раскладки ленты'
+
+    def __str__(self):
+        return f"FeedFanoutTask #{self.id} {self.kind} track {self.track_id} ({self.status})"
+
 # ==================== LISTENING HISTORY ====================
 class ListeningHistory(models.Model):
     """
@@ -1108,8 +1315,9 @@ class ListeningHistory(models.Model):
         verbose_name='Трек'
     )
     
+    # default вместо auto_now_add: буфер прослушиваний (play_buffer) пишет время события, а не время сброса
     listened_at = models.DateTimeField(
-        auto_now_add=True,
+        default=timezone.now,
         verbose_name='Время прослушивания'
     )
     
@@ -1158,8 +1366,9 @@ class PlayHistory(models.Model):
         verbose_name='Трек'
     )
     
+    # default вместо auto_now_add: буфер прослушиваний (play_buffer) пишет время события, а не время сброса
     played_at = models.DateTimeField(
-        auto_now_add=True,
+        default=timezone.now,
         verbose_name='Время прослушивания'
     )
     
@@ -1189,6 +1398,8 @@ class PlayHistory(models.Model):
         indexes = [
             models.Index(fields=['user', 'track', 'played_at']),
             models.Index(fields=['track', 'played_at']),
+            # история пользователя: keyset по (played_at, id)
+            models.Index(fields=['user', '-played_at']),
         ]
         verbose_name = 'Детальная история прослушивания'
         verbose_name_plural = 'Детальная история прослушиваний'
@@ -1196,6 +1407,36 @@ class PlayHistory(models.Model):
     def __str__(self):
         return f"{self.user.username} played {self.track.title} for {self.duration_listened}s"
 
+# ==================== СЧЁТЧИКИ ЛИМИТЕРА ПРОСЛУШИВАНИЙ ====================
+class PlayRateCounter(models.Model):
+    """
+    Счётчик попыток в окне лимитера прослушиваний (api/utils/play_protection.py),
+    когда кэш не даёт атомарного incr (файловый/локальный). Увеличивается UPDATE ... F()+1,
+    поэтому параллельные процессы не теряют попытки.
+    """
+    key = models.CharField(
+        max_length=255,
+        unique=True,
+        verbose_name='Область и окно'
+    )
+
+    hits = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Попыток'
+    )
+
+    expires_at = models.DateTimeField(
+        db_index=True,
+        verbose_name='Истекает'
+    )
+
+    class Meta:
+        verbose_name = 'Счётчик лимитера прослушиваний'
+        verbose_name_plural = 'Счётчики лимитера прослушиваний'
+
+    def __str__(self):
+        return f"{self.key}: {self.hits}"
+
 # ==================== ГЛОБАЛЬНАЯ СТАТИСТИКА ====================
 class DailyStats(models.Model):
     date = models.DateField(
@@ -1417,6 +1658,10 @@ class PlaylistRepost(models.Model):
     class Meta:
         unique_together = ['user', 'playlist']
         ordering = ['-created_at']
+        indexes = [
+            # лента активности (api/activity.py): репосты подписок по времени
+            models.Index(fields=['user', '-created_at']),
+        ]
         verbose_name = 'Репост плейлиста'
         verbose_name_plural = 'Репосты плейлистов'
     
@@ -1659,6 +1904,18 @@ class TrackComment(models.Model):
         self.update_like_count()
         return liked, self.like_count
     
+    def soft_delete(self):
+        """
+        Мягкое удаление: флаг ставится условным UPDATE, поэтому comment_count
+        трека уменьшается ровно один раз даже при повторном запросе.
+        """
+        updated = TrackComment.objects.filter(id=self.id, is_deleted=False).update(is_deleted=True)
+        self.is_deleted = True
+        if updated:
+            Track.bump_counters(self.track_id, comment_count=-1)
+            _bump_stats_for_track_owner(self.track_id)
+        return bool(updated)
+    
     def is_liked_by_user(self, user):
         if not user or not user.is_authenticated:
             return False
@@ -1737,6 +1994,23 @@ class Playlist(models.Model):
         verbose_name='Количество прослушиваний'
     )
     
+    # 🔥 Денормализованные счётчики: меняются F()-инкрементами при записи,
+    # чтение никогда не агрегирует (см. bump_counters / recount_playlist_counters)
+    reposts_count = models.IntegerField(
+        default=0,
+        verbose_name='Количество репостов'
+    )
+    
+    track_count = models.IntegerField(
+        default=0,
+        verbose_name='Количество треков'
+    )
+    
+    total_duration_seconds = models.IntegerField(
+        default=0,
+        verbose_name='Общая длительность (секунды)'
+    )
+    
     is_featured = models.BooleanField(
         default=False,
         verbose_name='Рекомендуемый'
@@ -1749,6 +2023,10 @@ class Playlist(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # лента активности (api/activity.py): новые плейлисты подписок
+            models.Index(fields=['created_by', '-created_at']),
+        ]
         verbose_name = 'Плейлист'
         verbose_name_plural = 'Плейлисты'
     
@@ -1762,6 +2040,77 @@ class Playlist(models.Model):
             return self.cover_url
         return None
 
+    # ==================== СЧЁТЧИКИ ====================
+    @classmethod
+    def bump_counters(cls, playlists, **deltas):
+        """
+        Атомарно сдвигает счётчики: UPDATE ... SET field = MAX(field + delta, 0).
+        playlists - id, список id или queryset плейлистов.
+        Вызывать внутри транзакции, меняющей лайки/репосты/треки.
+        """
+        from django.db.models.functions import Greatest
+
+        updates = {
+            field: Greatest(models.F(field) + delta, 0)
+            for field, delta in deltas.items() if delta
+        }
+        if not updates:
+            return 0
+
+        if isinstance(playlists, models.QuerySet):
+            queryset = playlists
+        elif isinstance(playlists, int):
+            queryset = cls.objects.filter(id=playlists)
+        else:
+            queryset = cls.objects.filter(id__in=list(playlists))
+        return queryset.update(**updates)
+
+    def replace_tracks(self, track_ids, added_by):
+        """
+        Пересобирает треки плейлиста в заданном порядке пачкой (bulk_create)
+        и выставляет track_count / total_duration_seconds тем же UPDATE.
+        Несуществующие и повторяющиеся id пропускаются.
+        """
+        from django.db import transaction
+
+        durations = dict(
+            Track.objects.filter(id__in=track_ids).values_list('id', 'duration_seconds')
+        )
+        ordered_ids = []
+        for track_id in track_ids:
+            if track_id in durations and track_id not in ordered_ids:
+                ordered_ids.append(track_id)
+
+        with transaction.atomic():
+            PlaylistTrack.objects.filter(playlist=self).delete()
+            PlaylistTrack.objects.bulk_create([
+                PlaylistTrack(playlist=self, track_id=track_id, added_by=added_by, position=idx)
+                for idx, track_id in enumerate(ordered_ids)
+            ])
+
+            self.track_count = len(ordered_ids)
+            self.total_duration_seconds = sum(durations[track_id] or 0 for track_id in ordered_ids)
+            Playlist.objects.filter(id=self.id).update(
+                track_count=self.track_count,
+                total_duration_seconds=self.total_duration_seconds
+            )
+
+    @classmethod
+    def detach_track(cls, track_id):
+        """Убирает трек из всех плейлистов, уменьшая их счётчики (удаление трека)"""
+        from django.db import transaction
+
+        duration = Track.objects.filter(id=track_id).values_list('duration_seconds', flat=True).first() or 0
+
+        with transaction.atomic():
+            links = PlaylistTrack.objects.filter(track_id=track_id)
+            playlist_ids = list(links.values_list('playlist_id', flat=True))
+            if not playlist_ids:
+                return 0
+            links.delete()
+            cls.bump_counters(playlist_ids, track_count=-1, total_duration_seconds=-duration)
+            return len(playlist_ids)
+
 # ==================== ПЛЕЙЛИСТ-ТРЕК СВЯЗЬ ====================
 class PlaylistTrack(models.Model):
     playlist = models.ForeignKey(
@@ -1991,7 +2340,7 @@ class Message(models.Model):
         verbose_name='Длительность голосового сообщения (сек)'
     )
     
-    waveform = models.JSONField(
+    waveform = CompactWaveformField(
         null=True,
         blank=True,
         verbose_name='Waveform данные для голосового сообщения'
@@ -2175,6 +2524,36 @@ class TrackAnalytics(models.Model):
     def __str__(self):
         return f"{self.track.title} - {self.date}"
 
+# ==================== СОСТОЯНИЕ ИНКРЕМЕНТАЛЬНЫХ ROLLUP-ОВ ====================
+class AnalyticsRollupState(models.Model):
+    """
+    High-water mark инкрементального rollup-а: последний обработанный id
+    по каждому источнику ({'plays': 123, 'likes': 45, ...}).
+    Обновляется в той же транзакции, что и агрегаты - каждое событие учитывается ровно один раз.
+    """
+    name = models.CharField(
+        max_length=50,
+        unique=True,
+        verbose_name='Rollup'
+    )
+    
+    high_water_marks = models.JSONField(
+        default=dict,
+        verbose_name='Последние обработанные id'
+    )
+    
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата обновления'
+    )
+    
+    class Meta:
+        verbose_name = 'Состояние rollup-а'
+        verbose_name_plural = 'Состояния rollup-ов'
+    
+    def __str__(self):
+        return f"{self.name}: {self.high_water_marks}"
+
 # ==================== СИСТЕМНЫЕ ЛОГИ ====================
 class SystemLog(models.Model):
     LOG_LEVELS = [
@@ -2506,7 +2885,7 @@ class UserReportOld(models.Model):
         return f"{self.reporter} reported {self.reported_user}"
 
 # ==================== СИГНАЛЫ ====================
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
 from django.dispatch import receiver
 
 @receiver(post_save, sender=CustomUser)
@@ -2524,56 +2903,304 @@ def track_post_save(sender, instance, created, **kwargs):
     if created:
         instance.uploaded_by.update_stats()
 
+# 🔥 Счётчики трека - атомарные F()-инкременты (без COUNT(*) на каждый лайк);
+# дрейф исправляет команда recount_track_counters
 @receiver(post_save, sender=TrackLike)
 def tracklike_post_save(sender, instance, created, **kwargs):
     if created:
-        instance.track.like_count = TrackLike.objects.filter(track=instance.track).count()
-        instance.track.save(update_fields=['like_count'])
+        Track.bump_counters(instance.track_id, like_count=1)
 
 @receiver(post_delete, sender=TrackLike)
 def tracklike_post_delete(sender, instance, **kwargs):
-    instance.track.like_count = TrackLike.objects.filter(track=instance.track).count()
-    instance.track.save(update_fields=['like_count'])
+    Track.bump_counters(instance.track_id, like_count=-1)
 
 @receiver(post_save, sender=Comment)
 def comment_post_save(sender, instance, created, **kwargs):
     if created:
-        instance.track.comment_count = Comment.objects.filter(track=instance.track).count()
-        instance.track.save(update_fields=['comment_count'])
+        Track.bump_counters(instance.track_id, comment_count=1)
 
 @receiver(post_delete, sender=Comment)
 def comment_post_delete(sender, instance, **kwargs):
-    instance.track.comment_count = Comment.objects.filter(track=instance.track).count()
-    instance.track.save(update_fields=['comment_count'])
+    Track.bump_counters(instance.track_id, comment_count=-1)
 
 # ==================== СИГНАЛЫ ДЛЯ ЛАЙКОВ ПЛЕЙЛИСТОВ ====================
 @receiver(post_save, sender=PlaylistLike)
 def playlistlike_post_save(sender, instance, created, **kwargs):
     """Обновление счетчика лайков плейлиста при создании лайка"""
     if created:
-        instance.playlist.likes_count = PlaylistLike.objects.filter(playlist=instance.playlist).count()
-        instance.playlist.save(update_fields=['likes_count'])
+        Playlist.bump_counters(instance.playlist_id, likes_count=1)
 
 @receiver(post_delete, sender=PlaylistLike)
 def playlistlike_post_delete(sender, instance, **kwargs):
     """Обновление счетчика лайков плейлиста при удалении лайка"""
-    instance.playlist.likes_count = PlaylistLike.objects.filter(playlist=instance.playlist).count()
-    instance.playlist.save(update_fields=['likes_count'])
+    Playlist.bump_counters(instance.playlist_id, likes_count=-1)
+
+# ==================== УДАЛЕНИЕ ТРЕКА: СЧЁТЧИКИ ПЛЕЙЛИСТОВ ====================
+# Каскад удалил бы PlaylistTrack без track_count / total_duration_seconds -
+# убираем трек из плейлистов со счётчиками до удаления (любой путь: view, админка, ORM)
+@receiver(pre_delete, sender=Track)
+def track_pre_delete_detach_playlists(sender, instance, **kwargs):
+    Playlist.detach_track(instance.id)
 
 # ==================== СИГНАЛЫ ДЛЯ РЕПОСТОВ ПЛЕЙЛИСТОВ ====================
 @receiver(post_save, sender=PlaylistRepost)
 def playlistrepost_post_save(sender, instance, created, **kwargs):
     """Обновление счетчика репостов плейлиста при создании репоста"""
     if created:
-        # Здесь нужно добавить поле reposts_count в модель Playlist
-        # instance.playlist.reposts_count = PlaylistRepost.objects.filter(playlist=instance.playlist).count()
-        # instance.playlist.save(update_fields=['reposts_count'])
-        pass
+        Playlist.bump_counters(instance.playlist_id, reposts_count=1)
 
 @receiver(post_delete, sender=PlaylistRepost)
 def playlistrepost_post_delete(sender, instance, **kwargs):
     """Обновление счетчика репостов плейлиста при удалении репоста"""
-    # Здесь нужно добавить поле reposts_count в модель Playlist
-    # instance.playlist.reposts_count = PlaylistRepost.objects.filter(playlist=instance.playlist).count()
-    # instance.playlist.save(update_fields=['reposts_count'])
-    pass
\ No newline at end of file
+    Playlist.bump_counters(instance.playlist_id, reposts_count=-1)
+
+# ==================== ИНВАЛИДАЦИЯ КЭША СТАТИСТИКИ ПОЛЬЗОВАТЕЛЯ ====================
+# get_user_stats читает из кэша по версионному ключу (api/user_stats.py);
+# события, меняющие статистику, увеличивают версию затронутых пользователей
+def _bump_stats_for_track_owner(track_id):
+    from .user_stats import bump_user_stats_version
+    owner_id = Track.objects.filter(id=track_id).values_list('uploaded_by_id', flat=True).first()
+    bump_user_stats_version(owner_id)
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_stats_changed(sender, instance, **kwargs):
+    from .user_stats import bump_user_stats_version
+    bump_user_stats_version(instance.follower_id, instance.following_id)
+
+@receiver(post_save, sender=Track)
+@receiver(post_delete, sender=Track)
+def track_stats_changed(sender, instance, **kwargs):
+    from .user_stats import bump_user_stats_version
+    bump_user_stats_version(instance.uploaded_by_id)
+
+@receiver(post_save, sender=Playlist)
+@receiver(post_delete, sender=Playlist)
+def playlist_stats_changed(sender, instance, created=False, **kwargs):
+    if created or kwargs.get('signal') is post_delete:
+        from .user_stats import bump_user_stats_version
+        bump_user_stats_version(instance.created_by_id)
+
+@receiver(post_save, sender=TrackLike)
+@receiver(post_save, sender=TrackRepost)
+@receiver(post_save, sender=TrackComment)
+def track_interaction_created(sender, instance, created, **kwargs):
+    if created:
+        _bump_stats_for_track_owner(instance.track_id)
+
+@receiver(post_delete, sender=TrackLike)
+@receiver(post_delete, sender=TrackRepost)
+@receiver(post_delete, sender=TrackComment)
+def track_interaction_deleted(sender, instance, **kwargs):
+    _bump_stats_for_track_owner(instance.track_id)
+
+# ==================== ПОЛНОТЕКСТОВЫЙ ПОИСК (SQLite FTS5) ====================
+# Виртуальные таблицы создаёт миграция (только на SQLite), наполняет api/search_index.py.
+# Модели ниже - unmanaged-обёртки для JOIN-а из ORM (rowid = id объекта):
+#   Track.objects.filter(search_index__document__match='"рок"*').order_by('search_index__rank')
+class FullTextMatch(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+class FullTextDocumentField(models.TextField):
+    """Скрытая колонка FTS5 с именем таблицы - левая часть MATCH"""
+
+
+FullTextDocumentField.register_lookup(FullTextMatch)
+
+
+class TrackSearchIndex(models.Model):
+    track = models.OneToOneField(
+        Track,
+        primary_key=True,
+        db_column='rowid',
+        on_delete=models.DO_NOTHING,
+        related_name='search_index'
+    )
+    document = FullTextDocumentField(db_column='api_track_fts')
+    rank = models.FloatField()
+    title = models.TextField()
+    artist = models.TextField()
+    username = models.TextField()
+    tags = models.TextField()
+
+    class Meta:
+        managed = False
+        db_table = 'api_track_fts'
+
+
+class PlaylistSearchIndex(models.Model):
+    playlist = models.OneToOneField(
+        Playlist,
+        primary_key=True,
+        db_column='rowid',
+        on_delete=models.DO_NOTHING,
+        related_name='search_index'
+    )
+    document = FullTextDocumentField(db_column='api_playlist_fts')
+    rank = models.FloatField()
+    title = models.TextField()
+    description = models.TextField()
+    username = models.TextField()
+
+    class Meta:
+        managed = False
+        db_table = 'api_playlist_fts'
+
+
+class UserSearchIndex(models.Model):
+    user = models.OneToOneField(
+        CustomUser,
+        primary_key=True,
+        db_column='rowid',
+        on_delete=models.DO_NOTHING,
+        related_name='search_index'
+    )
+    document = FullTextDocumentField(db_column='api_user_fts')
+    rank = models.FloatField()
+    username = models.TextField()
+    bio = models.TextField()
+    country = models.TextField()
+
+    class Meta:
+        managed = False
+        db_table = 'api_user_fts'
+
+
+# Синхронизация индекса: только если менялись индексируемые поля
+TRACK_SEARCH_FIELDS = {'title', 'artist', 'tags', 'uploaded_by'}
+PLAYLIST_SEARCH_FIELDS = {'title', 'description', 'created_by'}
+USER_SEARCH_FIELDS = {'username', 'bio', 'country'}
+
+
+def _search_fields_changed(update_fields, fields):
+    return update_fields is None or bool(set(update_fields) & fields)
+
+
+@receiver(post_save, sender=Track)
+def track_search_index_save(sender, instance, update_fields=None, **kwargs):
+    if _search_fields_changed(update_fields, TRACK_SEARCH_FIELDS):
+        from .search_index import index_objects
+        index_objects('track', [instance.id])
+
+@receiver(m2m_changed, sender=Track.hashtags.through)
+def track_search_index_hashtags(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    from .search_index import index_objects
+    if not reverse:
+        index_objects('track', [instance.id])
+    elif pk_set:
+        index_objects('track', pk_set)
+
+@receiver(m2m_changed, sender=Track.hashtags.through)
+def track_hashtags_touch(sender, instance, action, reverse, pk_set, **kwargs):
+    """Хештеги входят в ответ трека: сдвигаем updated_at (ETag, api/conditional.py)"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        Track.objects.filter(id=instance.id).update(updated_at=timezone.now())
+    elif pk_set:
+        Track.objects.filter(id__in=pk_set).update(updated_at=timezone.now())
+
+@receiver(post_delete, sender=Track)
+def track_search_index_delete(sender, instance, **kwargs):
+    from .search_index import remove_from_index
+    remove_from_index('track', [instance.id])
+
+@receiver(post_save, sender=Playlist)
+def playlist_search_index_save(sender, instance, update_fields=None, **kwargs):
+    if _search_fields_changed(update_fields, PLAYLIST_SEARCH_FIELDS):
+        from .search_index import index_objects
+        index_objects('playlist', [instance.id])
+
+@receiver(post_delete, sender=Playlist)
+def playlist_search_index_delete(sender, instance, **kwargs):
+    from .search_index import remove_from_index
+    remove_from_index('playlist', [instance.id])
+
+@receiver(post_save, sender=CustomUser)
+def user_search_index_save(sender, instance, created, update_fields=None, **kwargs):
+    if not _search_fields_changed(update_fields, USER_SEARCH_FIELDS):
+        return
+    from .search_index import index_objects
+    index_objects('user', [instance.id])
+    # username автора входит в документы его треков и плейлистов
+    if not created and (update_fields is None or 'username' in update_fields):
+        index_objects('track', Track.objects.filter(uploaded_by=instance).values_list('id', flat=True))
+        index_objects('playlist', Playlist.objects.filter(created_by=instance).values_list('id', flat=True))
+
+@receiver(post_delete, sender=CustomUser)
+def user_search_index_delete(sender, instance, **kwargs):
+    from .search_index import remove_from_index
+    remove_from_index('user', [instance.id])
+
+# ==================== ПОДСКАЗКИ ПОИСКА (префиксный индекс в памяти) ====================
+# api/suggest_index.py: точечное обновление записей после COMMIT
+@receiver(post_save, sender=Track)
+@receiver(post_save, sender=CustomUser)
+@receiver(post_save, sender=Playlist)
+@receiver(post_save, sender=Hashtag)
+def suggest_index_save(sender, instance, **kwargs):
+    from .suggest_index import schedule_sync
+    kind = {Track: 'track', CustomUser: 'user', Playlist: 'playlist', Hashtag: 'hashtag'}[sender]
+    schedule_sync(kind, instance.id)
+
+@receiver(post_delete, sender=Track)
+@receiver(post_delete, sender=CustomUser)
+@receiver(post_delete, sender=Playlist)
+@receiver(post_delete, sender=Hashtag)
+def suggest_index_delete(sender, instance, **kwargs):
+    from .suggest_index import schedule_sync
+    kind = {Track: 'track', CustomUser: 'user', Playlist: 'playlist', Hashtag: 'hashtag'}[sender]
+    schedule_sync(kind, instance.id, deleted=True)
+
+# ==================== ЛЕНТА НОВОСТЕЙ (fan-out on write) ====================
+# api/feed.py: публикация/репост ставят задачу раскладки, подписка/отписка меняют inbox сразу
+@receiver(pre_save, sender=Track)
+def feed_track_pre_save(sender, instance, **kwargs):
+    from .feed import track_is_feed_visible
+    instance._feed_was_visible = bool(instance.pk) and track_is_feed_visible(instance) and Track.objects.filter(
+        pk=instance.pk, status='published', is_private=False
+    ).exists()
+
+@receiver(post_save, sender=Track)
+def feed_track_published(sender, instance, **kwargs):
+    from .feed import enqueue_fanout, track_is_feed_visible
+    if track_is_feed_visible(instance) and not getattr(instance, '_feed_was_visible', False):
+        enqueue_fanout('upload', instance.uploaded_by_id, instance.id)
+
+@receiver(post_save, sender=TrackRepost)
+def feed_track_reposted(sender, instance, created, **kwargs):
+    if created:
+        from .feed import enqueue_fanout
+        enqueue_fanout('repost', instance.user_id, instance.track_id)
+
+@receiver(post_delete, sender=TrackRepost)
+def feed_track_unreposted(sender, instance, **kwargs):
+    from .feed import enqueue_fanout
+    enqueue_fanout('unrepost', instance.user_id, instance.track_id)
+
+@receiver(post_save, sender=Follow)
+def feed_follow_backfill(sender, instance, created, **kwargs):
+    if created:
+        from django.db import transaction
+        from .feed import backfill_follow
+
+        def run():
+            try:
+                backfill_follow(instance.follower_id, instance.following_id)
+            except Exception as e:
+                logger.error(f"❌ Лента: бэкфилл подписки {instance.follower_id} -> {instance.following_id}: {e}")
+
+        transaction.on_commit(run)
+
+@receiver(post_delete, sender=Follow)
+def feed_follow_removed(sender, instance, **kwargs):
+    from .feed import remove_follow
+    remove_follow(instance.follower_id, instance.following_id)
@@ -0,0 +1,116 @@
+# api/pagination.py
+"""
+🔥 Keyset (cursor) пагинация для списков: поиск, история, подписчики/подписки.
+
+Вместо OFFSET следующая страница выбирается условием "после последней строки":
+  ORDER BY played_at DESC, id DESC
+  WHERE played_at < :v0 OR (played_at = :v0 AND id < :v1)
+Курсор - непрозрачная base64-строка со значениями ключа сортировки последней строки
+(последнее поле ordering должно быть уникальным - обычно id). Глубокие страницы
+стоят столько же, сколько первая, а новые строки не дают дубликатов.
+
+Старые клиенты с ?page=N (без cursor) продолжают работать через OFFSET.
+COUNT(*) не выполняется: total передаёт вызывающий (счётчик из кэша/денормализованного
+поля) или None.
+"""
+import base64
+import json
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return {'$dt': value.isoformat()}
+    raise TypeError(f"Тип {type(value).__name__} не поддерживается в курсоре")
+
+
+def _json_object_hook(obj):
+    if set(obj) == {'$dt'}:
+        return datetime.fromisoformat(obj['$dt'])
+    return obj
+
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), default=_json_default, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, size):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')), object_hook=_json_object_hook)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f"Неверный курсор: {e}")
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor("Неверный курсор: не совпадает ключ сортировки")
+    return values
+
+
+def _parse_ordering(ordering):
+    """['-played_at', '-id'] -> [('played_at', True), ('id', True)]"""
+    return [(field.lstrip('-'), field.startswith('-')) for field in ordering]
+
+
+def keyset_filter(ordering, values):
+    """Q "строго после (values)" для сортировки ordering (поля - аннотации cursor_key_N)"""
+    condition = Q()
+    equal = Q()
+    for (field, descending), value in zip(ordering, values):
+        lookup = 'lt' if descending else 'gt'
+        condition |= equal & Q(**{f'{field}__{lookup}': value})
+        equal &= Q(**{field: value})
+    return condition
+
+
+def paginate_queryset(queryset, request, ordering, per_page, total=None):
+    """
+    (items, pagination): страница по курсору (?cursor=) или, для старых клиентов, по ?page=.
+    ordering - список полей как в order_by (можно через __), последнее - уникальное.
+    """
+    spec = _parse_ordering(ordering)
+    keys = [(f'cursor_key_{i}', descending) for i, (_, descending) in enumerate(spec)]
+
+    queryset = queryset.annotate(**{
+        key: F(field) for (key, _), (field, _) in zip(keys, spec)
+    }).order_by(*[f"{'-' if descending else ''}{key}" for key, descending in keys])
+
+    cursor = (request.GET.get('cursor') or '').strip()
+    page = None
+    offset = 0
+    if cursor:
+        values = decode_cursor(cursor, len(keys))
+        try:
+            # значения приводятся к типам полей сразу при построении условия
+            queryset = queryset.filter(keyset_filter(keys, values))
+        except (ValueError, TypeError, ValidationError) as e:
+            raise InvalidCursor(f"Неверный курсор: {e}")
+    else:
+        try:
+            page = max(1, int(request.GET.get('page') or 1))
+        except (TypeError, ValueError):
+            page = 1
+        offset = (page - 1) * per_page
+
+    items = list(queryset[offset:offset + per_page + 1])
+    has_next = len(items) > per_page
+    items = items[:per_page]
+
+    next_cursor = None
+    if has_next and items:
+        last = items[-1]
+        next_cursor = encode_cursor([getattr(last, key) for key, _ in keys])
+
+    return items, {
+        'per_page': per_page,
+        'page': page,
+        'has_next': has_next,
+        'next_cursor': next_cursor,
+        'total': total,
+    }
@@ -0,0 +1,178 @@
+# api/play_archive.py
+"""
+🗄️ Архивация PlayHistory: горячая таблица хранит только последние
+PLAY_HISTORY_RETENTION_DAYS дней, всё старше уезжает в сжатые помесячные файлы
+PLAY_HISTORY_ARCHIVE_DIR/play_history-YYYY-MM.jsonl.gz (одна строка JSON на событие).
+
+Порядок одного прогона:
+  1. rollup_track_analytics - дневные агрегаты (TrackAnalytics.plays) досчитываются
+     до удаления строк; архивируются только строки не выше high-water mark rollup-а
+  2. пачками по id: строки пачки дописываются в gzip соответствующего месяца
+     (новый gzip-member на каждую запись - файл читается как единый поток),
+     файл синхронизируется на диск, и только потом строки удаляются из БД
+
+Сбой между записью файла и DELETE даст дубликаты в архиве, но не потерю данных.
+Последнее прослушивание каждой пары (пользователь, трек) остаётся в ListeningHistory.
+Запуск: `python manage.py archive_play_history` (cron, раз в сутки).
+"""
+import gzip
+import json
+import logging
+import os
+from collections import defaultdict
+from datetime import timedelta
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 5000
+
+ARCHIVE_FIELDS = (
+    'id', 'user_id', 'track_id', 'played_at',
+    'ip_address', 'user_agent', 'duration_listened', 'is_full_play',
+)
+
+
+def get_archive_dir():
+    from django.conf import settings
+
+    return getattr(settings, 'PLAY_HISTORY_ARCHIVE_DIR',
+                   os.path.join(settings.BASE_DIR, 'archive', 'play_history'))
+
+
+def archive_path(month):
+    """Файл архива месяца 'YYYY-MM'"""
+    return os.path.join(get_archive_dir(), f"play_history-{month}.jsonl.gz")
+
+
+def archived_through():
+    """
+    Последний день самого позднего заархивированного месяца (date) или None.
+    Дни по эту дату частично или полностью ушли из PlayHistory - их plays
+    в TrackAnalytics по горячей таблице уже не пересчитать.
+    """
+    import calendar
+    import re
+    from datetime import date
+
+    months = []
+    directory = get_archive_dir()
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            match = re.fullmatch(r'play_history-(\d{4})-(\d{2})\.jsonl\.gz', name)
+            if match:
+                months.append((int(match.group(1)), int(match.group(2))))
+    if not months:
+        return None
+    year, month = max(months)
+    return date(year, month, calendar.monthrange(year, month)[1])
+
+
+def _append_to_archive(month, rows):
+    path = archive_path(month)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with open(path, 'ab') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='ab') as gz:
+            for row in rows:
+                gz.write((json.dumps(row, ensure_ascii=False) + '\n').encode('utf-8'))
+        raw.flush()
+        os.fsync(raw.fileno())
+
+
+def iter_archive(month):
+    """Читает события месяца из архива (для отчётов и восстановления)"""
+    path = archive_path(month)
+    if not os.path.exists(path):
+        return
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _rolled_up_plays_id():
+    """High-water mark rollup-а по прослушиваниям: строки с id не выше уже учтены в TrackAnalytics"""
+    from .analytics_rollup import ROLLUP_NAME
+    from .models import AnalyticsRollupState
+
+    state = AnalyticsRollupState.objects.filter(name=ROLLUP_NAME).first()
+    return int(state.high_water_marks.get('plays', 0)) if state else 0
+
+
+def archive_play_history(retention_days=None, batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+    """
+    Переносит PlayHistory старше retention_days дней в помесячные архивы.
+    Месяц файла - по локальной дате (TIME_ZONE), как дни TrackAnalytics в rollup-е.
+    Возвращает {'cutoff', 'archived', 'months': {месяц: строк}};
+    dry_run - только счёт строк, уже учтённых rollup-ом, и 'pending_rollup' - ещё не учтённых
+    (настоящий прогон сначала досчитает rollup, и они тоже уедут в архив).
+    """
+    from django.conf import settings
+    from django.db import transaction
+    from django.utils import timezone
+    from .analytics_rollup import rollup_track_analytics
+    from .models import PlayHistory
+
+    if retention_days is None:
+        retention_days = getattr(settings, 'PLAY_HISTORY_RETENTION_DAYS', 180)
+    cutoff = timezone.now() - timedelta(days=max(1, retention_days))
+
+    old_rows = PlayHistory.objects.filter(played_at__lt=cutoff)
+    result = {'cutoff': cutoff, 'archived': 0, 'months': defaultdict(int)}
+
+    if dry_run:
+        rolled_up_id = _rolled_up_plays_id()
+        result['archived'] = old_rows.filter(id__lte=rolled_up_id).count()
+        result['pending_rollup'] = old_rows.filter(id__gt=rolled_up_id).count()
+        return result
+
+    # 1. Дневные агрегаты должны учесть строки до их удаления
+    rollup_track_analytics()
+    old_rows = old_rows.filter(id__lte=_rolled_up_plays_id())
+
+    # 2. Пачками по id: файл -> fsync -> DELETE
+    last_id = 0
+    while True:
+        rows = list(
+            old_rows.filter(id__gt=last_id)
+            .order_by('id')
+            .values(*ARCHIVE_FIELDS)[:batch_size]
+        )
+        if not rows:
+            break
+        last_id = rows[-1]['id']
+
+        by_month = defaultdict(list)
+        for row in rows:
+            played_at = row['played_at']
+            row['played_at'] = played_at.isoformat()
+            by_month[timezone.localtime(played_at).strftime('%Y-%m')].append(row)
+
+        for month, month_rows in by_month.items():
+            _append_to_archive(month, month_rows)
+            result['months'][month] += len(month_rows)
+
+        with transaction.atomic():
+            PlayHistory.objects.filter(id__in=[row['id'] for row in rows]).delete()
+
+        result['archived'] += len(rows)
+        logger.info(f"🗄️ PlayHistory: заархивировано {len(rows)} строк (id ≤ {last_id})")
+
+    result['months'] = dict(result['months'])
+    return result
+
+
+def compact_play_history():
+    """Возвращает место после удаления и обновляет статистику планировщика"""
+    from django.db import connection
+    from .models import PlayHistory
+
+    table = connection.ops.quote_name(PlayHistory._meta.db_table)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('VACUUM')
+            cursor.execute(f'ANALYZE {table}')
+        elif connection.vendor == 'postgresql':
+            cursor.execute(f'VACUUM ANALYZE {table}')
+        else:
+            cursor.execute(f'ANALYZE TABLE {table}')
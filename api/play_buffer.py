@@ -0,0 +1,233 @@
+# api/play_buffer.py
+"""
+🔥 Буфер прослушиваний (write-behind) для record_play.
+
+record_play больше не пишет в БД на каждый запрос (PlayHistory + ListeningHistory
++ play_count = 4-5 записей, а SQLite сериализует всех писателей). Событие кладётся
+в очередь процесса, фоновый поток раз в PLAY_BUFFER_FLUSH_INTERVAL_MS мс
+(или сразу при PLAY_BUFFER_MAX_EVENTS событиях) пишет всю пачку одной транзакцией:
+  - PlayHistory          - bulk_create
+  - ListeningHistory     - bulk_update существующих + bulk_create новых пар
+  - Track.play_count     - F()-инкремент за новые пары (пользователь, трек)
+
+Семантика at-least-once: события удаляются из очереди только после COMMIT,
+при ошибке пачка возвращается в начало очереди и пишется повторно.
+При остановке процесса (atexit) буфер сбрасывается.
+⚠️ При аварийном падении процесса (kill -9) несброшенные события теряются.
+"""
+import atexit
+import logging
+import threading
+from collections import Counter, defaultdict
+
+logger = logging.getLogger(__name__)
+
+# После стольких неудачных попыток записи событие отбрасывается (битые данные)
+MAX_FLUSH_ATTEMPTS = 5
+
+
+def write_play_events(events):
+    """
+    Пишет пачку событий прослушивания одной транзакцией.
+    События для удалённых треков/пользователей пропускаются.
+    Возвращает количество записанных событий.
+    """
+    from django.db import transaction
+    from .models import Track, CustomUser, PlayHistory, ListeningHistory
+
+    track_ids = {e['track_id'] for e in events}
+    user_ids = {e['user_id'] for e in events}
+    existing_tracks = set(Track.objects.filter(id__in=track_ids).values_list('id', flat=True))
+    existing_users = set(CustomUser.objects.filter(id__in=user_ids).values_list('id', flat=True))
+
+    events = [
+        e for e in events
+        if e['track_id'] in existing_tracks and e['user_id'] in existing_users
+    ]
+    if not events:
+        return 0
+
+    # (пользователь, трек) -> последнее время и максимум прослушанных секунд
+    latest = {}
+    for e in events:
+        key = (e['user_id'], e['track_id'])
+        data = latest.get(key)
+        if data is None:
+            latest[key] = {'listened_at': e['played_at'], 'listened_seconds': e['duration_listened']}
+        else:
+            data['listened_at'] = max(data['listened_at'], e['played_at'])
+            data['listened_seconds'] = max(data['listened_seconds'], e['duration_listened'])
+
+    with transaction.atomic():
+        # ✅ 1) Детальная история - каждое событие
+        PlayHistory.objects.bulk_create([
+            PlayHistory(
+                user_id=e['user_id'],
+                track_id=e['track_id'],
+                played_at=e['played_at'],
+                ip_address=e['ip_address'],
+                user_agent=e['user_agent'],
+                duration_listened=e['duration_listened'],
+                is_full_play=e['is_full_play'],
+            )
+            for e in events
+        ], batch_size=500)
+
+        # ✅ 2) ListeningHistory: существующие пары - обновляем
+        to_update = []
+        existing = ListeningHistory.objects.filter(
+            user_id__in={user_id for user_id, _ in latest},
+            track_id__in={track_id for _, track_id in latest}
+        )
+        for lh in existing:
+            data = latest.pop((lh.user_id, lh.track_id), None)
+            if data is None:
+                continue
+            lh.listened_at = max(lh.listened_at, data['listened_at'])
+            lh.listened_seconds = max(lh.listened_seconds or 0, data['listened_seconds'])
+            to_update.append(lh)
+        ListeningHistory.objects.bulk_update(to_update, ['listened_at', 'listened_seconds'], batch_size=500)
+
+        # ✅ 3) Новые пары - первое прослушивание: запись + play_count один раз
+        ListeningHistory.objects.bulk_create([
+            ListeningHistory(
+                user_id=user_id,
+                track_id=track_id,
+                listened_at=data['listened_at'],
+                listened_seconds=data['listened_seconds'],
+            )
+            for (user_id, track_id), data in latest.items()
+        ], batch_size=500)
+
+        tracks_by_delta = defaultdict(list)
+        for track_id, delta in Counter(track_id for _, track_id in latest).items():
+            tracks_by_delta[delta].append(track_id)
+        for delta, ids in tracks_by_delta.items():
+            Track.bump_counters(ids, play_count=delta)
+
+    return len(events)
+
+
+class PlayBuffer:
+    """Очередь событий в памяти процесса + фоновый поток сброса"""
+
+    def __init__(self, max_events, flush_interval):
+        self.max_events = max_events
+        self.flush_interval = flush_interval
+        self._events = []
+        self._pending_pairs = set()  # (user_id, track_id) ещё не записанных событий
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._stopped = False
+
+    def add(self, event):
+        with self._lock:
+            self._events.append(event)
+            self._pending_pairs.add((event['user_id'], event['track_id']))
+            size = len(self._events)
+            self._ensure_thread()
+
+        if size >= self.max_events:
+            self._wakeup.set()
+
+    def is_pending(self, user_id, track_id):
+        with self._lock:
+            return (user_id, track_id) in self._pending_pairs
+
+    def _ensure_thread(self):
+        # Поток стартует лениво - при первом событии (не в manage.py-командах)
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='play-buffer-flusher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Сбрасывает накопленные события в БД. Возвращает количество записанных."""
+        from django.db import close_old_connections
+
+        with self._flush_lock:
+            with self._lock:
+                events, self._events = self._events, []
+            if not events:
+                return 0
+
+            close_old_connections()
+            try:
+                written = write_play_events(events)
+                logger.info(f"💾 Буфер прослушиваний: записано {written} событий")
+            except Exception as e:
+                logger.error(f"❌ Ошибка записи буфера прослушиваний ({len(events)} событий): {e}")
+                retry = []
+                for event in events:
+                    event['attempts'] += 1
+                    if event['attempts'] < MAX_FLUSH_ATTEMPTS:
+                        retry.append(event)
+                    else:
+                        logger.error(f"❌ Событие прослушивания отброшено после {MAX_FLUSH_ATTEMPTS} попыток: {event}")
+                # at-least-once: возвращаем пачку в начало очереди
+                with self._lock:
+                    self._events = retry + self._events
+                written = 0
+
+            with self._lock:
+                self._pending_pairs = {(e['user_id'], e['track_id']) for e in self._events}
+            return written
+
+    def shutdown(self):
+        self._stopped = True
+        self._wakeup.set()
+        self.flush()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_play_buffer():
+    """Буфер процесса (создаётся при первом обращении, сбрасывается при выходе)"""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                from django.conf import settings
+                _buffer = PlayBuffer(
+                    max_events=max(1, getattr(settings, 'PLAY_BUFFER_MAX_EVENTS', 200)),
+                    flush_interval=getattr(settings, 'PLAY_BUFFER_FLUSH_INTERVAL_MS', 500) / 1000.0,
+                )
+                atexit.register(_buffer.shutdown)
+    return _buffer
+
+
+def is_play_pending(user_id, track_id):
+    """Есть ли в буфере ещё не записанное прослушивание этой пары"""
+    return _buffer is not None and _buffer.is_pending(user_id, track_id)
+
+
+def record_play_event(user_id, track_id, duration_listened, is_full_play, ip_address=None, user_agent=''):
+    """Ставит прослушивание в буфер (или пишет сразу, если PLAY_BUFFER_ENABLED=False)"""
+    from django.conf import settings
+    from django.utils import timezone
+
+    event = {
+        'user_id': user_id,
+        'track_id': track_id,
+        'played_at': timezone.now(),
+        'ip_address': ip_address or None,
+        'user_agent': user_agent or '',
+        'duration_listened': duration_listened,
+        'is_full_play': is_full_play,
+        'attempts': 0,
+    }
+
+    if not getattr(settings, 'PLAY_BUFFER_ENABLED', True):
+        write_play_events([event])
+        return
+
+    get_play_buffer().add(event)
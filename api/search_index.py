@@ -0,0 +1,270 @@
+# api/search_index.py
+"""
+🔎 Полнотекстовый индекс поиска на SQLite FTS5.
+
+Три виртуальные таблицы (rowid = id объекта):
+  api_track_fts     - title, artist, username автора, теги (хештеги + поле tags)
+  api_playlist_fts  - title, description, username автора
+  api_user_fts      - username, bio, country
+
+Таблицы создаёт миграция 0035 (только на SQLite), документы пересобираются
+одним INSERT ... SELECT - и при полном перестроении (`python manage.py
+rebuild_search_index`), и для отдельных объектов из сигналов (models.py).
+Поиск - JOIN с FTS-таблицей через unmanaged-модели *SearchIndex:
+  Track.objects.filter(search_index__document__match=expr).order_by('search_index__rank')
+Ранжирование - bm25 с весами колонок, каждое слово запроса - префикс ("рок"*).
+На других СУБД (или без таблиц) поиск откатывается на icontains.
+"""
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+FTS_TOKENIZE = "unicode61 remove_diacritics 2"
+
+# kind: (таблица, колонки, веса bm25, источник документов)
+SEARCH_TABLES = {
+    'track': (
+        'api_track_fts',
+        ('title', 'artist', 'username', 'tags'),
+        'bm25(10.0, 5.0, 3.0, 2.0)',
+        """
+        SELECT t.id, COALESCE(t.title, ''), COALESCE(t.artist, ''), COALESCE(u.username, ''),
+               TRIM(COALESCE(t.tags, '') || ' ' || COALESCE((
+                   SELECT group_concat(h.name, ' ')
+                   FROM api_track_hashtags th JOIN api_hashtag h ON h.id = th.hashtag_id
+                   WHERE th.track_id = t.id
+               ), ''))
+        FROM api_track t LEFT JOIN api_customuser u ON u.id = t.uploaded_by_id
+        """,
+        't.id',
+    ),
+    'playlist': (
+        'api_playlist_fts',
+        ('title', 'description', 'username'),
+        'bm25(10.0, 2.0, 3.0)',
+        """
+        SELECT p.id, COALESCE(p.title, ''), COALESCE(p.description, ''), COALESCE(u.username, '')
+        FROM api_playlist p LEFT JOIN api_customuser u ON u.id = p.created_by_id
+        """,
+        'p.id',
+    ),
+    'user': (
+        'api_user_fts',
+        ('username', 'bio', 'country'),
+        'bm25(10.0, 1.0, 2.0)',
+        """
+        SELECT u.id, COALESCE(u.username, ''), COALESCE(u.bio, ''), COALESCE(u.country, '')
+        FROM api_customuser u
+        """,
+        'u.id',
+    ),
+}
+
+# Не больше стольких слов запроса попадает в MATCH
+MAX_QUERY_TERMS = 8
+
+_fts_available = {}
+
+
+def create_search_tables(cursor):
+    """CREATE VIRTUAL TABLE ... USING fts5 + постоянная настройка ранжирования"""
+    for table, columns, rank, _, _ in SEARCH_TABLES.values():
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+            f"{', '.join(columns)}, tokenize='{FTS_TOKENIZE}', prefix='2 3')"
+        )
+        cursor.execute(f"INSERT INTO {table}({table}, rank) VALUES('rank', %s)", [rank])
+
+
+def drop_search_tables(cursor):
+    for table, *_ in SEARCH_TABLES.values():
+        cursor.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+def fill_search_tables(cursor, kind=None, ids=None):
+    """Пересобирает документы: все (ids=None) или только указанные id"""
+    kinds = [kind] if kind else list(SEARCH_TABLES)
+    for name in kinds:
+        table, columns, _, source_sql, id_column = SEARCH_TABLES[name]
+        if ids is None:
+            cursor.execute(f"DELETE FROM {table}")
+            where, params = '', []
+        else:
+            ids = [int(i) for i in ids]
+            if not ids:
+                continue
+            placeholders = ', '.join(['%s'] * len(ids))
+            cursor.execute(f"DELETE FROM {table} WHERE rowid IN ({placeholders})", ids)
+            where, params = f" WHERE {id_column} IN ({placeholders})", ids
+        cursor.execute(
+            f"INSERT INTO {table}(rowid, {', '.join(columns)}) {source_sql}{where}",
+            params
+        )
+
+
+def fts_enabled(using='default'):
+    """FTS-поиск доступен: SQLite и таблицы индекса созданы (проверка кэшируется)"""
+    from django.db import connections
+
+    if using not in _fts_available:
+        connection = connections[using]
+        available = False
+        if connection.vendor == 'sqlite':
+            tables = set(connection.introspection.table_names())
+            available = all(table in tables for table, *_ in SEARCH_TABLES.values())
+        _fts_available[using] = available
+    return _fts_available[using]
+
+
+def index_objects(kind, ids):
+    """Переиндексирует объекты (вызывается из сигналов)"""
+    from django.db import connection
+
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        fill_search_tables(cursor, kind, ids)
+
+
+def remove_from_index(kind, ids):
+    from django.db import connection
+
+    if not fts_enabled():
+        return
+    ids = [int(i) for i in ids]
+    if not ids:
+        return
+    table = SEARCH_TABLES[kind][0]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {table} WHERE rowid IN ({', '.join(['%s'] * len(ids))})", ids
+        )
+
+
+def rebuild_search_index():
+    """Полное перестроение (бэкфилл). Возвращает {kind: документов}"""
+    from django.db import connection, transaction
+
+    counts = {}
+    with transaction.atomic(), connection.cursor() as cursor:
+        create_search_tables(cursor)
+        fill_search_tables(cursor)
+        for kind, (table, *_) in SEARCH_TABLES.items():
+            cursor.execute(f"SELECT COUNT(*) FROM {table}")
+            counts[kind] = cursor.fetchone()[0]
+            cursor.execute(f"INSERT INTO {table}({table}) VALUES('optimize')")
+    _fts_available.clear()
+    return counts
+
+
+def build_match_expression(q):
+    """
+    Строка пользователя -> выражение FTS5: каждое слово в кавычках и с префиксом,
+    слова через пробел (AND). None - если слов нет.
+    """
+    terms = re.findall(r'\w+', (q or '').lower())[:MAX_QUERY_TERMS]
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def full_text_filter(queryset, q, fallback):
+    """
+    (queryset, ranked): FTS-фильтр по search_index, если индекс доступен,
+    иначе - fallback (Q с icontains). ranked=True - можно сортировать по search_index__rank.
+    """
+    expr = build_match_expression(q)
+    if expr and fts_enabled(queryset.db):
+        return queryset.filter(search_index__document__match=expr), True
+    return queryset.filter(fallback), False
+
+
+# ==================== ФАСЕТЫ ПОИСКА (search_hub) ====================
+# Счётчики и фасеты считаются в БД одним GROUP BY на сущность (строки в Python не тянутся):
+#   треки  - GROUP BY genre -> count (сумма групп) + фасет жанров; теги - GROUP BY по связке
+#   люди   - GROUP BY country -> count (сумма групп) + фасет стран
+#   плейлисты - один COUNT
+# Результат кэшируется на SEARCH_FACETS_TTL по нормализованному запросу.
+SEARCH_FACETS_TTL = 60
+FACET_LIMITS = {
+    'tags': 40,
+    'genres': 20,
+    'countries': 60,
+}
+
+
+def normalize_search_key(q, tags=(), country=''):
+    """Ключ кэша: регистр/пробелы/порядок тегов не влияют"""
+    import hashlib
+
+    normalized = '|'.join([
+        ' '.join((q or '').lower().split()),
+        ','.join(sorted({t.lower() for t in tags})),
+        (country or '').strip().lower(),
+    ])
+    return f"search:facets:{hashlib.md5(normalized.encode('utf-8')).hexdigest()}"
+
+
+def _top(counter, limit, key):
+    return [
+        {key: value, 'count': count}
+        for value, count in sorted(counter.items(), key=lambda item: (-item[1], item[0]))[:limit]
+    ]
+
+
+def compute_search_facets(tracks_qs, playlists_qs, users_qs):
+    """
+    {'counts': {...}, 'facets': {'tags', 'genres', 'countries'}} по готовым queryset-ам поиска.
+    Жанры и страны - GROUP BY в БД; total - сумма групп (пустой жанр/страна
+    входят в total, но не в фасеты).
+    """
+    from collections import Counter
+    from django.db.models import Count
+    from .models import Track
+
+    tracks_qs = tracks_qs.order_by()
+    genre_groups = dict(tracks_qs.values('genre').annotate(c=Count('id')).order_by().values_list('genre', 'c'))
+    tracks_total = sum(genre_groups.values())
+    genres = Counter({genre: count for genre, count in genre_groups.items() if genre})
+
+    tags = Counter()
+    if tracks_total:
+        tags.update(dict(
+            Track.hashtags.through.objects
+            .filter(track_id__in=tracks_qs.values('id'))
+            .exclude(hashtag__name='')
+            .values('hashtag__name')
+            .annotate(c=Count('track_id'))
+            .order_by()
+            .values_list('hashtag__name', 'c')
+        ))
+
+    country_groups = dict(
+        users_qs.order_by().values('country').annotate(c=Count('id')).order_by().values_list('country', 'c')
+    )
+    countries = Counter({country: count for country, count in country_groups.items() if country})
+
+    return {
+        'counts': {
+            'tracks': tracks_total,
+            'playlists': playlists_qs.order_by().count(),
+            'people': sum(country_groups.values()),
+        },
+        'facets': {
+            'tags': _top(tags, FACET_LIMITS['tags'], 'name'),
+            'genres': _top(genres, FACET_LIMITS['genres'], 'genre'),
+            'countries': _top(countries, FACET_LIMITS['countries'], 'country'),
+        },
+    }
+
+
+def get_search_facets(cache_key, tracks_qs, playlists_qs, users_qs):
+    """Фасеты из кэша (при промахе - compute_search_facets)"""
+    from django.core.cache import cache
+
+    facets = cache.get(cache_key)
+    if facets is None:
+        facets = compute_search_facets(tracks_qs, playlists_qs, users_qs)
+        cache.set(cache_key, facets, timeout=SEARCH_FACETS_TTL)
+    return facets
@@ -188,6 +188,138 @@ def get_default_color_scheme():
         'gradient_end': '#963100',
     }
 
+# ==================== WAVEFORM ====================
+class WaveformField(serializers.Field):
+    """
+    Waveform из CompactWaveformField (в БД - квантованные uint8-байты) → список чисел.
+    Декодирует и сырые байты (например, из .values()).
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('read_only', True)
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if value is None:
+            return None
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            from .audio_analysis import decode_waveform
+            return decode_waveform(value)
+        return list(value)
+
+
+def include_waveform(serializer):
+    """
+    Нужно ли отдавать тяжёлое поле waveform.
+    Явно: context['include_waveform'] или ?include=waveform / ?include_waveform=1.
+    По умолчанию: в списках (many=True) - нет, для одного объекта - да.
+    """
+    context = serializer.context
+    if 'include_waveform' in context:
+        return bool(context['include_waveform'])
+
+    if waveform_requested(context.get('request')):
+        return True
+
+    return not isinstance(serializer.parent, serializers.ListSerializer)
+
+
+def waveform_requested(request):
+    """?include=waveform / ?include_waveform=1 в запросе"""
+    if request is None:
+        return False
+    params = getattr(request, 'query_params', None) or getattr(request, 'GET', {})
+    if 'waveform' in (params.get('include') or '').split(','):
+        return True
+    return (params.get('include_waveform') or '').lower() in ('1', 'true', 'yes')
+
+
+def defer_waveform(queryset, request=None, prefix=''):
+    """
+    Списки не отдают waveform - блобы waveform_data / waveform_pyramid не читаем из БД.
+    request с ?include=waveform (для TrackSerializer) оставляет waveform_data.
+    prefix - путь до трека для select_related: 'track__'.
+    """
+    fields = ['waveform_pyramid']
+    if not waveform_requested(request):
+        fields.append('waveform_data')
+    return queryset.defer(*(prefix + field for field in fields))
+
+
+# ==================== КОНТЕКСТ ЗРИТЕЛЯ ДЛЯ СПИСКОВ ТРЕКОВ ====================
+def prefetch_track_relations(queryset, request=None):
+    """
+    Автор и хештеги трека одним JOIN + одним запросом на всю страницу,
+    без блобов waveform (см. defer_waveform).
+    """
+    return defer_waveform(queryset.select_related('uploaded_by').prefetch_related('hashtags'), request)
+
+
+def track_viewer_context(request, track_ids, **extra):
+    """
+    Контекст для TrackSerializer(many=True): какие треки из страницы текущий
+    пользователь лайкнул/репостнул - два запроса на всю страницу вместо
+    EXISTS на каждый трек.
+    """
+    context = {'request': request, **extra}
+    user = getattr(request, 'user', None)
+
+    if user is not None and user.is_authenticated:
+        track_ids = list(track_ids)
+        context['liked_track_ids'] = set(
+            TrackLike.objects.filter(user=user, track_id__in=track_ids)
+            .values_list('track_id', flat=True)
+        )
+        context['reposted_track_ids'] = set(
+            TrackRepost.objects.filter(user=user, track_id__in=track_ids)
+            .values_list('track_id', flat=True)
+        )
+    else:
+        context['liked_track_ids'] = set()
+        context['reposted_track_ids'] = set()
+
+    return context
+
+
+# ==================== КОНТЕКСТ ЗРИТЕЛЯ ДЛЯ СПИСКОВ ПЛЕЙЛИСТОВ ====================
+def prefetch_playlist_relations(queryset):
+    """
+    Автор плейлиста одним JOIN + id треков (поле 'tracks') одним запросом на страницу.
+    Счётчики (track_count, total_duration_seconds, reposts_count, likes_count) -
+    денормализованные колонки Playlist, их не нужно агрегировать.
+    """
+    from django.db.models import Prefetch
+
+    return queryset.select_related('created_by').prefetch_related(
+        Prefetch('tracks', queryset=Track.objects.only('id'))
+    )
+
+
+def playlist_viewer_context(request, playlist_ids, **extra):
+    """
+    Контекст для PlaylistSerializer(many=True): лайки/репосты текущего
+    пользователя среди плейлистов страницы - два запроса вместо EXISTS на каждый.
+    """
+    context = {'request': request, **extra}
+    user = getattr(request, 'user', None)
+
+    if user is not None and user.is_authenticated:
+        playlist_ids = list(playlist_ids)
+        context['liked_playlist_ids'] = set(
+            PlaylistLike.objects.filter(user=user, playlist_id__in=playlist_ids)
+            .values_list('playlist_id', flat=True)
+        )
+        context['reposted_playlist_ids'] = set(
+            PlaylistRepost.objects.filter(user=user, playlist_id__in=playlist_ids)
+            .values_list('playlist_id', flat=True)
+        )
+    else:
+        context['liked_playlist_ids'] = set()
+        context['reposted_playlist_ids'] = set()
+
+    return context
+
+
 # ==================== КОМПАКТНЫЙ СЕРИАЛИЗАТОР ПОЛЬЗОВАТЕЛЯ ====================
 class CompactUserSerializer(serializers.ModelSerializer):
     """Компактный сериализатор пользователя - используется ВЕЗДЕ где нужен uploaded_by"""
@@ -256,6 +388,9 @@ class TrackSerializer(serializers.ModelSerializer):
     author_avatar = serializers.SerializerMethodField()
     # ================================================
     
+    # 🔥 Тяжёлое поле: в списках не отдаётся (см. include_waveform)
+    waveform_data = WaveformField(allow_null=True)
+    
     class Meta:
         model = Track
         fields = [
@@ -285,6 +420,12 @@ class TrackSerializer(serializers.ModelSerializer):
             'author_username', 'author_avatar',
         ]
     
+    def get_fields(self):
+        fields = super().get_fields()
+        if not include_waveform(self):
+            fields.pop('waveform_data', None)
+        return fields
+    
     def get_artist(self, obj):
         """artist всегда берется из uploaded_by.username"""
         return obj.uploaded_by.username if obj.uploaded_by else ''
@@ -306,6 +447,10 @@ class TrackSerializer(serializers.ModelSerializer):
         return obj.audio_url or None
     
     def get_is_liked(self, obj):
+        liked_ids = self.context.get('liked_track_ids')
+        if liked_ids is not None:
+            return obj.id in liked_ids
+        
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return TrackLike.objects.filter(user=request.user, track=obj).exists()
@@ -313,6 +458,10 @@ class TrackSerializer(serializers.ModelSerializer):
     
     def get_is_reposted(self, obj):
         """Возвращает True, если текущий пользователь репостнул этот трек"""
+        reposted_ids = self.context.get('reposted_track_ids')
+        if reposted_ids is not None:
+            return obj.id in reposted_ids
+        
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             try:
@@ -535,6 +684,10 @@ class PlayerTrackSerializer(serializers.ModelSerializer):
     
     def get_is_reposted(self, obj):
         """Возвращает True, если у request.user есть запись в TrackRepost для данного трека"""
+        reposted_ids = self.context.get('reposted_track_ids')
+        if reposted_ids is not None:
+            return obj.id in reposted_ids
+        
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             try:
@@ -1093,12 +1246,13 @@ class PlaylistSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at', 'likes_count', 'play_count',
             'repost_count', 'reposts_count',  # ← ДОБАВЛЕНО
             'is_featured', 'is_collaborative', 'track_count',
-            'total_duration', 'is_owner', 'is_liked', 'is_reposted'
+            'total_duration', 'total_duration_seconds',
+            'is_owner', 'is_liked', 'is_reposted'
         ]
         read_only_fields = [
             'id', 'created_by', 'created_at', 'updated_at',
             'likes_count', 'play_count', 'repost_count', 'reposts_count',  # ← ДОБАВЛЕНО
-            'is_liked', 'is_reposted'
+            'total_duration_seconds', 'is_liked', 'is_reposted'
         ]
     
     def get_cover_url(self, obj):
@@ -1110,13 +1264,12 @@ class PlaylistSerializer(serializers.ModelSerializer):
         return obj.cover_url or None
     
     def get_track_count(self, obj):
-        return obj.tracks.count()
-    
+        # 🔥 Денормализованный счётчик (Playlist.replace_tracks / recount_playlist_counters)
+        return obj.track_count
+
     def get_total_duration(self, obj):
-        total_seconds = 0
-        for track in obj.tracks.all():
-            total_seconds += track.get_duration_seconds()
-        
+        total_seconds = obj.total_duration_seconds or 0
+
         hours = total_seconds // 3600
         minutes = (total_seconds % 3600) // 60
         seconds = total_seconds % 60
@@ -1128,11 +1281,15 @@ class PlaylistSerializer(serializers.ModelSerializer):
     def get_is_owner(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return obj.created_by == request.user
+            return obj.created_by_id == request.user.id
         return False
-    
+
     def get_is_liked(self, obj):
         """Проверяет, лайкнул ли текущий пользователь этот плейлист"""
+        liked_ids = self.context.get('liked_playlist_ids')
+        if liked_ids is not None:
+            return obj.id in liked_ids
+
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return PlaylistLike.objects.filter(
@@ -1143,22 +1300,22 @@ class PlaylistSerializer(serializers.ModelSerializer):
     
     def get_is_reposted(self, obj):
         """Проверяет, репостнул ли текущий пользователь этот плейлист"""
+        reposted_ids = self.context.get('reposted_playlist_ids')
+        if reposted_ids is not None:
+            return obj.id in reposted_ids
+
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return PlaylistRepost.objects.filter(
-                user=request.user, 
+                user=request.user,
                 playlist=obj
             ).exists()
         return False
-    
+
     # ✅ МЕТОДЫ ДЛЯ РЕПОСТОВ
     def get_repost_count(self, obj):
-        """Количество репостов плейлиста"""
-        try:
-            return PlaylistRepost.objects.filter(playlist=obj).count()
-        except Exception as e:
-            logger.error(f"Error counting playlist reposts: {e}")
-            return 0
+        """Количество репостов плейлиста (денормализованный счётчик)"""
+        return obj.reposts_count
     
     def get_reposts_count(self, obj):
         """Алиас для repost_count (на случай если фронт ожидает именно reposts_count)"""
@@ -1632,7 +1789,7 @@ class MessageSerializer(serializers.ModelSerializer):
     
     # ✅ ГОЛОСОВЫЕ СООБЩЕНИЯ
     voice_url = serializers.SerializerMethodField()
-    waveform = serializers.JSONField(read_only=True, allow_null=True)
+    waveform = WaveformField(allow_null=True)
     
     # ✅ МЕДИА ПОЛЯ (ИЗОБРАЖЕНИЯ/ВИДЕО) - НОВЫЕ
     image_url = serializers.SerializerMethodField()
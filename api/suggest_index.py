@@ -0,0 +1,266 @@
+# api/suggest_index.py
+"""
+🔎 Подсказки поиска (typeahead) из префиксного индекса в памяти процесса.
+
+Индекс - отсортированный список (термин, тип, id); поиск префикса - bisect
+и последовательный проход, пока термины начинаются с префикса (без запросов к БД).
+Термины записи - нормализованная подпись и все её "хвосты" по словам,
+поэтому "blue" находит "Where Our Blue Is".
+
+Источники и вес (популярность):
+  track    - опубликованные публичные треки: play_count + 5 * like_count
+  user     - активные пользователи:  followers_count
+  playlist - публичные плейлисты:    likes_count + 2 * reposts_count
+  hashtag  - хештеги:                usage_count + число опубликованных треков
+
+Индекс строится целиком при старте (в фоне, см. apps.py) и обновляется точечно
+сигналами моделей (models.py). Счётчики, меняющиеся через F()-UPDATE, сигналов
+не дают - поэтому индекс пересобирается в фоне, если старше SUGGEST_INDEX_REBUILD_SECONDS.
+⚠️ Индекс свой у каждого процесса: изменения из других процессов видны после пересборки.
+"""
+import bisect
+import logging
+import os
+import re
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SUGGEST_TYPES = ('track', 'user', 'playlist', 'hashtag')
+
+# Сколько слов подписи индексировать и сколько терминов просматривать на запрос
+MAX_LABEL_WORDS = 8
+MAX_SCAN = 1000
+
+
+def normalize(text):
+    return ' '.join(re.findall(r'\w+', (text or '').lower()))
+
+
+def _terms(label):
+    words = normalize(label).split()[:MAX_LABEL_WORDS]
+    return {' '.join(words[i:]) for i in range(len(words))}
+
+
+class SuggestIndex:
+    """Префиксный индекс: отсортированный массив терминов + записи по (тип, id)"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._keys = []
+        self._entries = {}
+        self.built_at = None
+        self._rebuilding = False
+
+    @property
+    def is_built(self):
+        return self.built_at is not None
+
+    def __len__(self):
+        return len(self._entries)
+
+    # ---------- запись ----------
+    # Копирование при записи: читатели держат ссылки на старые _keys/_entries
+    # (search берёт их под блокировкой и сканирует без неё), поэтому массив
+    # и словарь не меняются на месте - строятся новые и подменяются целиком.
+    def _without(self, keys, entries, key):
+        entry = entries.pop(key, None)
+        if not entry:
+            return
+        for term in entry['terms']:
+            item = (term, key[0], key[1])
+            pos = bisect.bisect_left(keys, item)
+            if pos < len(keys) and keys[pos] == item:
+                del keys[pos]
+
+    def upsert(self, kind, obj_id, label, weight):
+        key = (kind, obj_id)
+        terms = _terms(label)
+        with self._lock:
+            keys = list(self._keys)
+            entries = dict(self._entries)
+            self._without(keys, entries, key)
+            if terms:
+                entries[key] = {'label': label, 'weight': weight, 'terms': terms}
+                for term in terms:
+                    bisect.insort(keys, (term, kind, obj_id))
+            self._keys = keys
+            self._entries = entries
+
+    def remove(self, kind, obj_id):
+        with self._lock:
+            if (kind, obj_id) not in self._entries:
+                return
+            keys = list(self._keys)
+            entries = dict(self._entries)
+            self._without(keys, entries, (kind, obj_id))
+            self._keys = keys
+            self._entries = entries
+
+    def replace_all(self, rows):
+        """rows: (тип, id, подпись, вес). Новый массив строится без блокировки и подменяется целиком"""
+        entries = {}
+        keys = []
+        for kind, obj_id, label, weight in rows:
+            terms = _terms(label)
+            if not terms:
+                continue
+            entries[(kind, obj_id)] = {'label': label, 'weight': weight, 'terms': terms}
+            keys.extend((term, kind, obj_id) for term in terms)
+        keys.sort()
+        with self._lock:
+            self._keys = keys
+            self._entries = entries
+            self.built_at = time.monotonic()
+
+    # ---------- чтение ----------
+    def search(self, q, limit=10, types=None):
+        prefix = normalize(q)
+        if not prefix:
+            return []
+
+        with self._lock:
+            keys = self._keys
+            entries = self._entries
+
+        found = {}
+        pos = bisect.bisect_left(keys, (prefix,))
+        end = min(len(keys), pos + MAX_SCAN)
+        while pos < end:
+            term, kind, obj_id = keys[pos]
+            if not term.startswith(prefix):
+                break
+            pos += 1
+            if types and kind not in types:
+                continue
+            entry = entries.get((kind, obj_id))
+            if entry:
+                found[(kind, obj_id)] = entry
+
+        ranked = sorted(found.items(), key=lambda item: (-item[1]['weight'], item[1]['label'].lower()))
+        return [
+            {'type': kind, 'id': obj_id, 'label': entry['label'], 'weight': entry['weight']}
+            for (kind, obj_id), entry in ranked[:limit]
+        ]
+
+
+# ==================== ИСТОЧНИКИ ====================
+def load_rows(kinds=SUGGEST_TYPES, ids=None):
+    """(тип, id, подпись, вес) из БД - по запросу на тип"""
+    from django.db.models import Count, Q
+    from .models import CustomUser, Hashtag, Playlist, Track
+
+    def by_ids(queryset):
+        return queryset.filter(id__in=ids) if ids is not None else queryset
+
+    rows = []
+    if 'track' in kinds:
+        tracks = by_ids(Track.objects.filter(status='published', is_private=False))
+        for obj_id, title, plays, likes in tracks.values_list('id', 'title', 'play_count', 'like_count'):
+            rows.append(('track', obj_id, title, (plays or 0) + 5 * (likes or 0)))
+    if 'user' in kinds:
+        for obj_id, username, followers in by_ids(CustomUser.objects.filter(is_active=True)).values_list(
+                'id', 'username', 'followers_count'):
+            rows.append(('user', obj_id, username, followers or 0))
+    if 'playlist' in kinds:
+        for obj_id, title, likes, reposts in by_ids(Playlist.objects.filter(visibility='public')).values_list(
+                'id', 'title', 'likes_count', 'reposts_count'):
+            rows.append(('playlist', obj_id, title, (likes or 0) + 2 * (reposts or 0)))
+    if 'hashtag' in kinds:
+        hashtags = by_ids(Hashtag.objects.all()).annotate(
+            published=Count('tracks', filter=Q(tracks__status='published'))
+        ).values_list('id', 'name', 'usage_count', 'published')
+        for obj_id, name, usage, published in hashtags:
+            rows.append(('hashtag', obj_id, name, (usage or 0) + (published or 0)))
+    return rows
+
+
+# ==================== ИНДЕКС ПРОЦЕССА ====================
+_index = SuggestIndex()
+_build_lock = threading.Lock()
+
+
+def get_suggest_index():
+    return _index
+
+
+def rebuild_suggest_index():
+    """Полная пересборка (запросы к БД вне блокировки чтения)"""
+    with _build_lock:
+        started = time.monotonic()
+        _index.replace_all(load_rows())
+        logger.info(f"🔎 Индекс подсказок: {len(_index)} записей за {(time.monotonic() - started) * 1000:.0f} мс")
+    return len(_index)
+
+
+def _rebuild_in_background():
+    def run():
+        from django.db import connection
+        try:
+            rebuild_suggest_index()
+        except Exception as e:
+            logger.error(f"❌ Ошибка пересборки индекса подсказок: {e}")
+        finally:
+            _index._rebuilding = False
+            connection.close()
+
+    if _index._rebuilding:
+        return
+    _index._rebuilding = True
+    threading.Thread(target=run, name='suggest-index', daemon=True).start()
+
+
+def warm_suggest_index_async():
+    """Прогрев при старте процесса (apps.ready) - в фоне, не задерживая запуск"""
+    _rebuild_in_background()
+
+
+def should_warm_on_startup():
+    """Прогреваем только процессы-серверы: не миграции и прочие manage.py-команды"""
+    from django.conf import settings
+
+    if not getattr(settings, 'SUGGEST_INDEX_WARM', True):
+        return False
+    if os.environ.get('RUN_MAIN'):
+        return True
+    return os.path.basename(sys.argv[0] if sys.argv else '') != 'manage.py'
+
+
+def suggest(q, limit=10, types=None):
+    """Подсказки для строки q; первый запрос до прогрева строит индекс синхронно"""
+    from django.conf import settings
+
+    if not _index.is_built:
+        with _build_lock:
+            if not _index.is_built:
+                _index.replace_all(load_rows())
+    elif time.monotonic() - _index.built_at > getattr(settings, 'SUGGEST_INDEX_REBUILD_SECONDS', 900):
+        _rebuild_in_background()
+
+    return _index.search(q, limit=limit, types=types)
+
+
+def sync_object(kind, obj_id, deleted=False):
+    """Точечное обновление (после COMMIT, из сигналов). Пока индекс не построен - ничего не делаем"""
+    if not _index.is_built:
+        return
+    if deleted:
+        _index.remove(kind, obj_id)
+        return
+    rows = load_rows(kinds=(kind,), ids=[obj_id])
+    if rows:
+        _, _, label, weight = rows[0]
+        _index.upsert(kind, obj_id, label, weight)
+    else:
+        # не проходит фильтр (черновик, приватный плейлист, неактивный пользователь)
+        _index.remove(kind, obj_id)
+
+
+def schedule_sync(kind, obj_id, deleted=False):
+    """Для сигналов: обновить индекс после фиксации транзакции"""
+    from django.db import transaction
+
+    if _index.is_built:
+        transaction.on_commit(lambda: sync_object(kind, obj_id, deleted=deleted))
@@ -1,3 +1,598 @@
-from django.test import TestCase
+import os
+import tempfile
+from datetime import date, datetime, timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.core.management import call_command
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .activity import get_activity_page
+from .analytics_rollup import ROLLUP_NAME, rebuild_track_analytics, rollup_track_analytics
+from .audio_analysis import StreamingBinner
+from .models import (
+    AnalyticsRollupState, CustomUser, FeedFanoutTask, FeedItem, Follow, ListeningHistory, PlayHistory, PlayRateCounter, Playlist, PlaylistLike, PlaylistRepost, PlaylistTrack,
+    Track, TrackAnalytics, TrackComment, TrackLike, TrackRepost, WaveformGenerationTask,
+)
+from .pagination import InvalidCursor, encode_cursor, paginate_queryset
+from .play_archive import archive_play_history
+from .play_buffer import MAX_FLUSH_ATTEMPTS, PlayBuffer
+from .serializers import prefetch_track_relations
+from .trending import get_trending_tracks
+from . import feed
+from .utils.play_protection import can_count_play
+from .waveform_tasks import MAX_ATTEMPTS, STALE_PROCESSING_TIMEOUT, enqueue_track_analysis, reset_stale_tasks
+
+
+def make_user(name):
+    return CustomUser.objects.create_user(email=f'{name}@example.com', username=name, password='pass12345')
+
+
+def make_track(user, title, **extra):
+    return Track.objects.create(title=title, artist=user.username, uploaded_by=user, status='published', **extra)
+
+
+# ==================== KEYSET-ПАГИНАЦИЯ (api/pagination.py) ====================
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('listener')
+        cls.track = make_track(make_user('artist'), 'Loop')
+        # много одинаковых played_at: граница страницы попадает внутрь группы равных значений
+        base = timezone.now() - timedelta(days=1)
+        for i in range(23):
+            PlayHistory.objects.create(user=cls.user, track=cls.track, played_at=base + timedelta(minutes=i // 5))
+
+    def walk(self, ordering, per_page):
+        factory = RequestFactory()
+        queryset = PlayHistory.objects.filter(user=self.user)
+        seen, cursor = [], None
+        for _ in range(100):
+            params = {'cursor': cursor} if cursor else {}
+            items, pagination = paginate_queryset(queryset, factory.get('/', params), ordering, per_page)
+            seen.extend(item.id for item in items)
+            cursor = pagination['next_cursor']
+            if not pagination['has_next']:
+                self.assertIsNone(cursor)
+                return seen
+        self.fail('курсор не продвигается')
+
+    def test_pages_on_ties_have_no_duplicates_or_gaps(self):
+        expected = list(PlayHistory.objects.filter(user=self.user)
+                        .order_by('-played_at', '-id').values_list('id', flat=True))
+        for per_page in (1, 3, 5, 7, 23, 50):
+            with self.subTest(per_page=per_page):
+                self.assertEqual(self.walk(['-played_at', '-id'], per_page), expected)
+
+    def test_mixed_directions(self):
+        expected = list(PlayHistory.objects.filter(user=self.user)
+                        .order_by('played_at', '-id').values_list('id', flat=True))
+        self.assertEqual(self.walk(['played_at', '-id'], 4), expected)
+
+    def test_wrong_typed_cursor_is_invalid(self):
+        request = RequestFactory().get('/', {'cursor': encode_cursor(['x', 'y'])})
+        with self.assertRaises(InvalidCursor):
+            paginate_queryset(PlayHistory.objects.all(), request, ['-played_at', '-id'], 5)
+
+
+# ==================== ЛЕНТА АКТИВНОСТИ (api/activity.py) ====================
+class ActivityMergeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = make_user('viewer')
+        author = make_user('author')
+        reposter = make_user('reposter')
+        Follow.objects.create(follower=cls.viewer, following=author)
+        Follow.objects.create(follower=cls.viewer, following=reposter)
+
+        # по одному событию на объект (без схлопывания дублей); время часто совпадает между потоками
+        base = timezone.now() - timedelta(hours=1)
+        for i in range(6):
+            moment = base + timedelta(minutes=i // 2)
+            track = make_track(author, f'Upload {i}')
+            Track.objects.filter(id=track.id).update(created_at=moment)
+
+            reposted = make_track(make_user(f'other{i}'), f'Reposted {i}')
+            Track.objects.filter(id=reposted.id).update(created_at=base - timedelta(days=1))
+            repost = TrackRepost.objects.create(user=reposter, track=reposted)
+            TrackRepost.objects.filter(id=repost.id).update(reposted_at=moment)
+
+            playlist = Playlist.objects.create(title=f'Mix {i}', created_by=author)
+            Playlist.objects.filter(id=playlist.id).update(created_at=moment)
+
+            shared = Playlist.objects.create(title=f'Shared {i}', created_by=make_user(f'curator{i}'))
+            Playlist.objects.filter(id=shared.id).update(created_at=base - timedelta(days=1))
+            playlist_repost = PlaylistRepost.objects.create(user=reposter, playlist=shared)
+            PlaylistRepost.objects.filter(id=playlist_repost.id).update(created_at=moment)
+
+    def walk(self, per_page):
+        events, position = [], None
+        for _ in range(100):
+            page, position = get_activity_page(self.viewer, position, per_page)
+            events.extend(page)
+            if position is None:
+                return events
+        self.fail('курсор не продвигается')
+
+    def test_merge_order_across_pages(self):
+        full, _ = get_activity_page(self.viewer, None, 100)
+        self.assertEqual(len(full), 24)
+        keys = [(e.created_at, -e.rank, e.id) for e in full]
+        self.assertEqual(keys, sorted(keys, reverse=True))
+
+        for per_page in (1, 4, 5, 24):
+            with self.subTest(per_page=per_page):
+                self.assertEqual(self.walk(per_page), full)
+
+    def test_malformed_position_is_invalid(self):
+        with self.assertRaises(InvalidCursor):
+            get_activity_page(self.viewer, [1, 'x', 3], 5)
+
+
+# ==================== ПОТОКОВАЯ ОГИБАЮЩАЯ (api/audio_analysis.py) ====================
+class StreamingBinnerTests(SimpleTestCase):
+    def feed(self, samples, chunk_sizes, capacity=8, hop=3):
+        binner = StreamingBinner(capacity=capacity, hop=hop)
+        position = 0
+        for size in chunk_sizes:
+            binner.add(samples[position:position + size])
+            position += size
+        binner.add(samples[position:])
+        return binner.finish()
+
+    def assert_matches(self, samples, result):
+        width = result['width']
+        bins = [samples[i:i + width] for i in range(0, len(samples), width)]
+        self.assertEqual(len(result['counts']), len(bins))
+        self.assertEqual(int(result['counts'].sum()), len(samples))
+        np.testing.assert_array_equal(result['counts'], [len(b) for b in bins])
+        np.testing.assert_allclose(result['sumsq'], [np.square(b, dtype=np.float64).sum() for b in bins])
+        np.testing.assert_array_equal(result['min'], [b.min() for b in bins])
+        np.testing.assert_array_equal(result['max'], [b.max() for b in bins])
+
+    def test_merges_keep_bins_exact(self):
+        rng = np.random.default_rng(7)
+        for length in (1, 23, 24, 25, 97, 1000, 1001):
+            samples = rng.uniform(-1, 1, length).astype(np.float32)
+            for chunks in ([length], [1] * min(length, 40), [7, 5, 13, 1, 11]):
+                with self.subTest(length=length, chunks=chunks[:5]):
+                    result = self.feed(samples, chunks)
+                    self.assertLessEqual(len(result['counts']), 8 + 1)
+                    self.assert_matches(samples, result)
+
+    def test_width_doubles_on_merge(self):
+        samples = np.ones(3 * 8 * 4 + 1, dtype=np.float32)
+        result = self.feed(samples, [])
+        self.assertEqual(result['width'], 3 * 4)
+        self.assertEqual(result['counts'][-1], 1)
+
+    def test_odd_capacity_rejected(self):
+        with self.assertRaises(ValueError):
+            StreamingBinner(capacity=7)
+
+
+# ==================== ОЧЕРЕДЬ АНАЛИЗА (api/waveform_tasks.py) ====================
+class StaleAnalysisTaskTests(TestCase):
+    def setUp(self):
+        self.track = make_track(make_user('uploader'), 'Raw')
+
+    def stale_task(self, attempts):
+        started = timezone.now() - STALE_PROCESSING_TIMEOUT - timedelta(minutes=1)
+        return WaveformGenerationTask.objects.create(
+            track=self.track, status='processing', started_at=started, attempt_count=attempts)
+
+    def test_stale_task_with_attempts_left_is_requeued(self):
+        task = self.stale_task(MAX_ATTEMPTS - 1)
+        self.assertEqual(reset_stale_tasks(), 1)
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'pending')
+
+    def test_exhausted_stale_task_fails_and_track_can_be_requeued(self):
+        task = self.stale_task(MAX_ATTEMPTS)
+        self.assertEqual(reset_stale_tasks(), 0)
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'failed')
+        self.assertTrue(task.error_message)
+        self.assertIsNotNone(task.completed_at)
+        self.assertNotEqual(enqueue_track_analysis(self.track).id, task.id)
+
+
+class WaveformListDeferTests(TestCase):
+    def test_lists_skip_waveform_blobs_unless_requested(self):
+        make_track(make_user('blobby'), 'Heavy', waveform_data=[0.5] * 120)
+        plain = prefetch_track_relations(Track.objects.all()).get()
+        self.assertEqual(plain.get_deferred_fields(), {'waveform_data', 'waveform_pyramid'})
+
+        request = RequestFactory().get('/', {'include': 'waveform'})
+        included = prefetch_track_relations(Track.objects.all(), request).get()
+        self.assertEqual(included.get_deferred_fields(), {'waveform_pyramid'})
+
+
+class WaveformEndpointTests(TestCase):
+    def test_missing_waveform_is_queued_not_decoded_inline(self):
+        track = make_track(make_user('producer'), 'Unanalyzed')
+        url = f'/api/track/{track.id}/waveform/'
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 202)
+        self.assertEqual(first.json()['source'], 'placeholder')
+        self.assertEqual(first.json()['status'], 'pending')
+        self.assertNotIn('ETag', first)
+
+        second = self.client.get(url)
+        self.assertEqual(second.json()['task_id'], first.json()['task_id'])
+        self.assertEqual(WaveformGenerationTask.objects.filter(track=track).count(), 1)
+
+
+# ==================== ЛИМИТЕР ПРОСЛУШИВАНИЙ (api/utils/play_protection.py) ====================
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    PLAY_PROTECTION_ENABLED=True, PLAY_LIMIT_USER_TRACK='3/600', PLAY_LIMIT_USER='100/600', PLAY_LIMIT_IP='100/600',
+)
+class PlayLimiterTests(TestCase):
+    def test_counts_in_db_without_atomic_cache(self):
+        user = make_user('fan')
+        track = make_track(make_user('singer'), 'Hook')
+        decisions = [can_count_play(user, track, ip='10.0.0.1')[:2] for _ in range(4)]
+        self.assertEqual(decisions, [(True, None)] * 3 + [(False, 'user_track')])
+        counter = PlayRateCounter.objects.get(key__startswith=f'play_rl:user_track:{user.id}:{track.id}:')
+        self.assertEqual(counter.hits, 4)
+
+
+# ==================== ТРЕНДЫ (api/trending.py) ====================
+class TrendingTracksTests(TestCase):
+    def test_private_tracks_are_not_trending(self):
+        artist = make_user('charting')
+        public = make_track(artist, 'Public hit', trending_score=5)
+        make_track(artist, 'Private demo', trending_score=50, is_private=True)
+        self.assertEqual([track.id for track in get_trending_tracks()], [public.id])
+
+
+# ==================== СЧЁТЧИКИ ПЛЕЙЛИСТОВ (Playlist.bump_counters) ====================
+class PlaylistCounterTests(TestCase):
+    def setUp(self):
+        self.owner = make_user('curator')
+        self.first = make_track(self.owner, 'First', duration_seconds=100)
+        self.second = make_track(self.owner, 'Second', duration_seconds=40)
+        self.playlist = Playlist.objects.create(title='Mix', created_by=self.owner)
+        self.playlist.replace_tracks([self.first.id, self.second.id, self.first.id, 999999], self.owner)
+
+    def counters(self, playlist=None):
+        return Playlist.objects.filter(id=(playlist or self.playlist).id).values(
+            'track_count', 'total_duration_seconds', 'likes_count', 'reposts_count').get()
+
+    def test_replace_tracks_sets_counters(self):
+        self.assertEqual(self.counters()['track_count'], 2)
+        self.assertEqual(self.counters()['total_duration_seconds'], 140)
+        self.assertEqual(list(PlaylistTrack.objects.filter(playlist=self.playlist)
+                              .order_by('position').values_list('track_id', flat=True)),
+                         [self.first.id, self.second.id])
+
+    def test_likes_and_reposts_follow_signals_and_never_go_negative(self):
+        fan = make_user('fan')
+        like = PlaylistLike.objects.create(user=fan, playlist=self.playlist)
+        PlaylistRepost.objects.create(user=fan, playlist=self.playlist)
+        self.assertEqual(self.counters()['likes_count'], 1)
+        self.assertEqual(self.counters()['reposts_count'], 1)
+
+        like.delete()
+        Playlist.bump_counters(self.playlist.id, likes_count=-5)
+        self.assertEqual(self.counters()['likes_count'], 0)
+
+    def test_track_delete_detaches_from_every_playlist(self):
+        other = Playlist.objects.create(title='Other', created_by=self.owner)
+        other.replace_tracks([self.first.id], self.owner)
+
+        self.first.delete()
+        self.assertEqual(self.counters(), {'track_count': 1, 'total_duration_seconds': 40,
+                                           'likes_count': 0, 'reposts_count': 0})
+        self.assertEqual(self.counters(other)['track_count'], 0)
+        self.assertEqual(self.counters(other)['total_duration_seconds'], 0)
+
+
+# ==================== СЧЁТЧИКИ ТРЕКА (Track.bump_counters) ====================
+class TrackCounterTests(TestCase):
+    def setUp(self):
+        self.track = make_track(make_user('beatmaker'), 'Counted')
+        self.fan = make_user('listener')
+
+    def counters(self):
+        return Track.objects.filter(id=self.track.id).values('like_count', 'comment_count').get()
+
+    def test_like_signals_and_floor_at_zero(self):
+        like = TrackLike.objects.create(user=self.fan, track=self.track)
+        self.assertEqual(self.counters()['like_count'], 1)
+        like.delete()
+        Track.bump_counters(self.track.id, like_count=-3)
+        self.assertEqual(self.counters()['like_count'], 0)
+
+    def test_soft_delete_decrements_once(self):
+        comment = TrackComment.objects.create(user=self.fan, track=self.track, text='nice')
+        Track.bump_counters(self.track.id, comment_count=1)
+        self.assertTrue(comment.soft_delete())
+        self.assertFalse(TrackComment.objects.get(id=comment.id).soft_delete())
+        self.assertEqual(self.counters()['comment_count'], 0)
+
+    def test_recount_fixes_drift(self):
+        TrackLike.objects.create(user=self.fan, track=self.track)
+        TrackComment.objects.create(user=self.fan, track=self.track, text='kept')
+        TrackComment.objects.create(user=self.fan, track=self.track, text='gone', is_deleted=True)
+        Track.objects.filter(id=self.track.id).update(like_count=7, comment_count=7)
+
+        call_command('recount_track_counters', stdout=StringIO())
+        self.assertEqual(self.counters(), {'like_count': 1, 'comment_count': 1})
+
+
+# ==================== БУФЕР ПРОСЛУШИВАНИЙ (api/play_buffer.py) ====================
+class PlayBufferTests(TestCase):
+    def setUp(self):
+        self.user = make_user('buffered')
+        self.track = make_track(make_user('streamed'), 'Buffered')
+        self.buffer = PlayBuffer(max_events=1000, flush_interval=60)
+        self.buffer._ensure_thread = lambda: None  # сбрасываем вручную, без фонового потока
+
+    def add(self, track_id=None, seconds=40):
+        self.buffer.add({
+            'user_id': self.user.id, 'track_id': track_id or self.track.id, 'played_at': timezone.now(),
+            'ip_address': None, 'user_agent': '', 'duration_listened': seconds, 'is_full_play': False,
+            'attempts': 0,
+        })
+
+    def play_count(self):
+        return Track.objects.values_list('play_count', flat=True).get(id=self.track.id)
+
+    def test_flush_writes_every_play_and_counts_pair_once(self):
+        self.add(seconds=40)
+        self.add(seconds=90)
+        self.add(track_id=999999)  # трек удалён до сброса - событие пропускается
+        self.assertTrue(self.buffer.is_pending(self.user.id, self.track.id))
+
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertFalse(self.buffer.is_pending(self.user.id, self.track.id))
+        self.assertEqual(PlayHistory.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(ListeningHistory.objects.get(user=self.user, track=self.track).listened_seconds, 90)
+        self.assertEqual(self.play_count(), 1)
+
+        self.add()
+        self.buffer.flush()
+        self.assertEqual(PlayHistory.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(self.play_count(), 1)
+
+    def test_failed_flush_requeues_until_attempts_run_out(self):
+        self.add()
+        with mock.patch('api.play_buffer.write_play_events', side_effect=RuntimeError('db is locked')):
+            for attempt in range(1, MAX_FLUSH_ATTEMPTS):
+                self.assertEqual(self.buffer.flush(), 0)
+                self.assertEqual(self.buffer._events[0]['attempts'], attempt)
+                self.assertTrue(self.buffer.is_pending(self.user.id, self.track.id))
+
+            self.buffer.flush()
+        self.assertEqual(self.buffer._events, [])
+        self.assertFalse(self.buffer.is_pending(self.user.id, self.track.id))
+
+    def test_retry_keeps_order_and_writes_later(self):
+        self.add(seconds=40)
+        with mock.patch('api.play_buffer.write_play_events', side_effect=RuntimeError('db is locked')):
+            self.buffer.flush()
+        self.add(seconds=60)
+        self.assertEqual([e['duration_listened'] for e in self.buffer._events], [40, 60])
+
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(self.play_count(), 1)
+
+
+# ==================== ROLLUP АНАЛИТИКИ (api/analytics_rollup.py) ====================
+class TrackAnalyticsRollupTests(TestCase):
+    def setUp(self):
+        self.listener = make_user('counted')
+        self.track = make_track(make_user('measured'), 'Measured')
+
+    def play(self, when):
+        PlayHistory.objects.create(user=self.listener, track=self.track, played_at=when)
+
+    def day(self, when):
+        return TrackAnalytics.objects.filter(track=self.track, date=timezone.localdate(when)).values(
+            'plays', 'likes').first()
+
+    def test_each_event_is_counted_once(self):
+        now = timezone.now()
+        self.play(now)
+        self.play(now)
+        TrackLike.objects.create(user=self.listener, track=self.track)
+        self.assertEqual(rollup_track_analytics(batch_size=1)['plays'], 2)
+        self.assertEqual(self.day(now), {'plays': 2, 'likes': 1})
+
+        self.assertEqual(rollup_track_analytics()['plays'], 0)
+        self.play(now)
+        rollup_track_analytics()
+        self.assertEqual(self.day(now), {'plays': 3, 'likes': 1})
+        marks = AnalyticsRollupState.objects.get(name=ROLLUP_NAME).high_water_marks
+        self.assertEqual(marks['plays'], PlayHistory.objects.latest('id').id)
+
+    def test_rebuild_keeps_archived_plays_and_recounts_the_rest(self):
+        archived_day = timezone.make_aware(datetime(2026, 1, 15, 12))
+        leftover_day = timezone.make_aware(datetime(2026, 1, 20, 12))
+        now = timezone.now()
+        # январь уже в архиве: его plays живут только в TrackAnalytics
+        TrackAnalytics.objects.create(track=self.track, date=date(2026, 1, 15), plays=7, likes=4)
+        TrackAnalytics.objects.create(track=self.track, date=date(2026, 1, 20), plays=1)
+        self.play(leftover_day)  # строка, пережившая сбой между записью архива и DELETE
+        self.play(now)
+        TrackLike.objects.create(user=self.listener, track=self.track)
+
+        with tempfile.TemporaryDirectory() as directory, self.settings(PLAY_HISTORY_ARCHIVE_DIR=directory):
+            open(os.path.join(directory, 'play_history-2026-01.jsonl.gz'), 'wb').close()
+            _, frozen_through = rebuild_track_analytics()
+
+        self.assertEqual(frozen_through, date(2026, 1, 31))
+        self.assertEqual(self.day(archived_day), {'plays': 7, 'likes': 0})
+        self.assertEqual(self.day(leftover_day), {'plays': 1, 'likes': 0})
+        self.assertEqual(self.day(now), {'plays': 1, 'likes': 1})
+
+    def test_archive_month_follows_rollup_day(self):
+        # 31 декабря 22:00 UTC - уже 1 января по Москве: архив и TrackAnalytics - в одном месяце
+        self.play(timezone.make_aware(datetime(2025, 12, 31, 22)))
+        with tempfile.TemporaryDirectory() as directory, self.settings(PLAY_HISTORY_ARCHIVE_DIR=directory), \
+                timezone.override('Europe/Moscow'):
+            preview = archive_play_history(retention_days=30, dry_run=True)
+            self.assertEqual((preview['archived'], preview['pending_rollup']), (0, 1))
+
+            result = archive_play_history(retention_days=30)
+            self.assertEqual(result['months'], {'2026-01': 1})
+            self.assertEqual(os.listdir(directory), ['play_history-2026-01.jsonl.gz'])
+            self.assertTrue(TrackAnalytics.objects.filter(track=self.track, date=date(2026, 1, 1), plays=1).exists())
+        self.assertFalse(PlayHistory.objects.exists())
+
+
+# ==================== ЛЕНТА НОВОСТЕЙ (api/feed.py) ====================
+@override_settings(FEED_FANOUT_INLINE=False)
+class FeedTests(TestCase):
+    def setUp(self):
+        self.reader = make_user('reader')
+        self.author = make_user('writer')
+
+    def get_feed(self, **params):
+        return self.client.get('/api/feed/', params, HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.reader)}')
+
+    def test_malformed_per_page_falls_back_to_default(self):
+        Follow.objects.create(follower=self.reader, following=self.author)
+        response = self.get_feed(per_page='many')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [])
+
+    def stale_claim(self, task):
+        self.assertEqual(feed.claim_pending_tasks(10), [task.id])
+        FeedFanoutTask.objects.filter(id=task.id).update(
+            started_at=timezone.now() - feed.STALE_PROCESSING_TIMEOUT - timedelta(minutes=1))
+
+    def test_crashed_worker_counts_as_attempt(self):
+        track = make_track(self.author, 'Crashy')
+        task = FeedFanoutTask.objects.create(kind='upload', actor=self.author, track=track)
+        for _ in range(feed.MAX_ATTEMPTS - 1):
+            self.stale_claim(task)
+            self.assertEqual(feed.reset_stale_tasks(), 1)
+
+        self.stale_claim(task)
+        self.assertEqual(feed.reset_stale_tasks(), 0)
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempt_count), ('failed', feed.MAX_ATTEMPTS))
+        self.assertTrue(task.error_message)
+        self.assertEqual(feed.claim_pending_tasks(10), [])
+
+    def test_failing_task_is_retried_then_failed(self):
+        track = make_track(self.author, 'Broken')
+        task = FeedFanoutTask.objects.create(kind='upload', actor=self.author, track=track)
+        outcomes = []
+        with mock.patch('api.feed.fanout_upload', side_effect=RuntimeError('boom')):
+            for _ in range(feed.MAX_ATTEMPTS):
+                outcomes.append(feed.process_fanout_tasks(feed.claim_pending_tasks(10)))
+        self.assertEqual([o['retry'] for o in outcomes], [1] * (feed.MAX_ATTEMPTS - 1) + [0])
+        self.assertEqual(outcomes[-1]['failed'], 1)
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.error_message), ('failed', 'boom'))
+
+    def run_queue(self):
+        return feed.process_fanout_tasks(feed.claim_pending_tasks(100))
+
+    def inbox(self):
+        return list(FeedItem.objects.filter(user=self.reader).order_by('track_id')
+                    .values_list('track_id', 'actor_id', 'reason'))
+
+    def test_upload_and_repost_fan_out_then_unrepost_restores_upload(self):
+        reposter = make_user('amplifier')
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.create(follower=self.reader, following=self.author)
+            Follow.objects.create(follower=self.reader, following=reposter)
+        with self.captureOnCommitCallbacks(execute=True):
+            track = make_track(self.author, 'Fresh')
+            make_track(self.author, 'Hidden', is_private=True)
+        self.assertEqual(self.run_queue()['completed'], 1)  # приватный трек в очередь не попадает
+        self.assertEqual(self.inbox(), [(track.id, self.author.id, 'upload')])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            repost = TrackRepost.objects.create(user=reposter, track=track)
+        self.run_queue()
+        self.assertEqual(self.inbox(), [(track.id, reposter.id, 'repost')])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            repost.delete()
+        self.run_queue()
+        self.assertEqual(self.inbox(), [(track.id, self.author.id, 'upload')])
+        self.assertFalse(FeedFanoutTask.objects.exists())
+
+    def test_follow_backfills_and_unfollow_restores_overwritten_upload(self):
+        reposter = make_user('curator')
+        own = make_track(self.author, 'Own')
+        shared = make_track(make_user('stranger'), 'Shared')
+        TrackRepost.objects.create(user=reposter, track=own)
+        TrackRepost.objects.create(user=reposter, track=shared)
+        FeedFanoutTask.objects.all().delete()  # раскладывать некому - подписок ещё нет
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.create(follower=self.reader, following=reposter)
+            Follow.objects.create(follower=self.reader, following=self.author)
+        self.assertEqual(self.inbox(), [(own.id, reposter.id, 'repost'), (shared.id, reposter.id, 'repost')])
+
+        Follow.objects.get(follower=self.reader, following=reposter).delete()
+        self.assertEqual(self.inbox(), [(own.id, self.author.id, 'upload')])
+
+    def test_feed_hides_tracks_that_became_private(self):
+        track = make_track(self.author, 'Soon private')
+        FeedItem.objects.create(user=self.reader, track=track, actor=self.author)
+        self.assertEqual([row['id'] for row in self.get_feed().json()], [track.id])
+        Track.objects.filter(id=track.id).update(is_private=True)
+        self.assertEqual(self.get_feed().json(), [])
+
+
+# ==================== УСЛОВНЫЕ GET (api/conditional.py) ====================
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.owner = make_user('etagged')
+        self.viewer = make_user('revisiting')
+        self.track = make_track(self.owner, 'Cached')
+
+    def bearer(self, user):
+        return {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(user)}'}
+
+    def assert_revalidates(self, url, **headers):
+        first = self.client.get(url, **headers)
+        self.assertEqual(first.status_code, 200)
+        etag = first['ETag']
+        second = self.client.get(url, HTTP_IF_NONE_MATCH=etag, **headers)
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second['ETag'], etag)
+        self.assertEqual(second.content, b'')
+        return etag
+
+    def test_track_etag_follows_counters_and_viewer(self):
+        url = f'/api/track/{self.track.id}/'
+        anonymous = self.assert_revalidates(url)
+        as_viewer = self.assert_revalidates(url, **self.bearer(self.viewer))
+        self.assertNotEqual(anonymous, as_viewer)
+
+        TrackLike.objects.create(user=self.viewer, track=self.track)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=as_viewer, **self.bearer(self.viewer))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], as_viewer)
+
+    def test_waveform_revalidates_by_etag_and_last_modified(self):
+        Track.objects.filter(id=self.track.id).update(
+            waveform_data=[0.5] * 120, waveform_generated=True, waveform_generated_at=timezone.now())
+        url = f'/api/track/{self.track.id}/waveform/'
+        etag = self.assert_revalidates(url)
+        response = self.client.get(url)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+        Track.objects.filter(id=self.track.id).update(waveform_generated_at=timezone.now() + timedelta(seconds=5))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_profile_etag_changes_on_follow(self):
+        url = f'/api/users/{self.owner.id}/'
+        etag = self.assert_revalidates(url, **self.bearer(self.viewer))
+        Follow.objects.create(follower=self.viewer, following=self.owner)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag, **self.bearer(self.viewer))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['user']['is_following'])
@@ -0,0 +1,249 @@
+# api/trending.py
+"""
+🔥 Рейтинг "в тренде" для треков (Track.trending_score).
+
+score = Σ вес_события * 0.5 ** (возраст события / период полураспада)
+  прослушивание (PlayHistory) = 1, лайк (TrackLike) = 3, репост (TrackRepost) = 5
+
+Экспоненциальное затухание позволяет обновлять рейтинг инкрементально:
+  1. все ненулевые рейтинги умножаются на 0.5 ** (прошло с прошлого запуска / полураспад)
+     одним UPDATE
+  2. к ним прибавляются только НОВЫЕ события (id выше high-water mark в
+     AnalyticsRollupState 'trending'), сгруппированные по треку и часу
+Первый запуск (или --rebuild) учитывает события за TRENDING_WINDOW_DAYS дней.
+Запуск: `python manage.py update_trending_scores` (cron, раз в 5-15 минут) -
+заодно обновляет кэш трендовых хештегов (см. раздел ниже).
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+logger = logging.getLogger(__name__)
+
+STATE_NAME = 'trending'
+
+EVENT_WEIGHTS = {
+    'plays': 1.0,
+    'likes': 3.0,
+    'reposts': 5.0,
+}
+
+# Меньше этого рейтинг считается нулевым (не держим "хвост" в индексе)
+MIN_SCORE = 0.01
+
+
+def _half_life_seconds():
+    from django.conf import settings
+
+    return float(getattr(settings, 'TRENDING_HALF_LIFE_HOURS', 24)) * 3600
+
+
+def _window():
+    from django.conf import settings
+
+    return timedelta(days=int(getattr(settings, 'TRENDING_WINDOW_DAYS', 7)))
+
+
+def _sources():
+    """(ключ high-water mark, модель, поле даты)"""
+    from .models import PlayHistory, TrackLike, TrackRepost
+
+    return (
+        ('plays', PlayHistory, 'played_at'),
+        ('likes', TrackLike, 'liked_at'),
+        ('reposts', TrackRepost, 'reposted_at'),
+    )
+
+
+def _decay(age_seconds, half_life):
+    return 0.5 ** (max(0.0, age_seconds) / half_life)
+
+
+def update_trending_scores(rebuild=False):
+    """
+    Затухание + новые события. Возвращает {источник: новых событий, 'tracks': затронуто треков}.
+    """
+    from django.db import transaction
+    from django.db.models import Count, F, Max
+    from django.db.models.functions import TruncHour
+    from django.utils import timezone
+    from .models import AnalyticsRollupState, Track
+
+    half_life = _half_life_seconds()
+    now = timezone.now()
+    window_start = now - _window()
+
+    with transaction.atomic():
+        state, _ = AnalyticsRollupState.objects.select_for_update().get_or_create(name=STATE_NAME)
+        marks = {} if rebuild else dict(state.high_water_marks)
+        last_run = marks.get('at')
+
+        # 1. Затухание накопленного рейтинга
+        if last_run is None:
+            Track.objects.filter(trending_score__gt=0).update(trending_score=0)
+        else:
+            factor = _decay(now.timestamp() - float(last_run), half_life)
+            Track.objects.filter(trending_score__gt=0).update(trending_score=F('trending_score') * factor)
+            Track.objects.filter(trending_score__gt=0, trending_score__lt=MIN_SCORE).update(trending_score=0)
+
+        # 2. Новые события по трекам (по часам - затухание с точностью до часа)
+        deltas = defaultdict(float)
+        processed = {}
+        for key, model, date_field in _sources():
+            upper_id = model.objects.aggregate(m=Max('id'))['m'] or 0
+            rows = (model.objects.filter(id__gt=int(marks.get(key, 0)), id__lte=upper_id,
+                                         **{f'{date_field}__gte': window_start})
+                    .annotate(hour=TruncHour(date_field))
+                    .values('track_id', 'hour')
+                    .annotate(c=Count('id'))
+                    .order_by())
+
+            processed[key] = 0
+            for row in rows:
+                age = (now - row['hour']).total_seconds() - 1800  # середина часа
+                deltas[row['track_id']] += EVENT_WEIGHTS[key] * row['c'] * _decay(age, half_life)
+                processed[key] += row['c']
+            marks[key] = upper_id
+
+        tracks = list(Track.objects.filter(id__in=list(deltas)).only('id'))
+        for track in tracks:
+            track.trending_score = F('trending_score') + deltas[track.id]
+        Track.objects.bulk_update(tracks, ['trending_score'], batch_size=500)
+
+        marks['at'] = now.timestamp()
+        state.high_water_marks = marks
+        state.save(update_fields=['high_water_marks', 'updated_at'])
+
+    processed['tracks'] = len(tracks)
+    logger.info(f"🔥 Тренды обновлены: {processed}")
+    return processed
+
+
+def get_trending_tracks(genre=None, limit=20):
+    """Топ треков по trending_score (индекс status/genre + -trending_score), без приватных"""
+    from .models import Track
+    from .serializers import prefetch_track_relations
+
+    queryset = Track.objects.filter(status='published', is_private=False, trending_score__gt=0)
+    if genre:
+        queryset = queryset.filter(genre=genre)
+    return list(prefetch_track_relations(queryset.order_by('-trending_score', '-id'))[:limit])
+
+
+# ==================== ТРЕНДОВЫЕ ХЕШТЕГИ ====================
+# Рейтинг тега за скользящее окно: публикации треков с тегом + прослушивания этих треков.
+# Каждый источник - один GROUP BY по тегу; готовый топ лежит в кэше и обновляется
+# командой update_trending_scores (или лениво при промахе кэша).
+HASHTAG_WINDOWS = {
+    '24h': timedelta(hours=24),
+    '7d': timedelta(days=7),
+}
+DEFAULT_HASHTAG_WINDOW = '7d'
+
+HASHTAG_WEIGHTS = {
+    'tracks': 5,  # публикация трека с тегом
+    'plays': 1,   # прослушивание трека с тегом
+}
+
+HASHTAG_TOP_SIZE = 50
+HASHTAG_CACHE_TTL = 60 * 30  # дольше интервала cron - кэш не остывает между запусками
+
+
+def _hashtags_cache_key(window):
+    return f"hashtags:trending:{window}"
+
+
+def compute_trending_hashtags(window=DEFAULT_HASHTAG_WINDOW, size=HASHTAG_TOP_SIZE):
+    """
+    Топ тегов за окно: 3 сгруппированных запроса (публикации, прослушивания,
+    всего опубликованных треков по тегу) + 1 запрос самих тегов.
+    Если за окно активности мало - топ добивается тегами по usage_count / числу треков.
+    """
+    from django.db.models import Count, Q
+    from django.utils import timezone
+    from .models import Hashtag, PlayHistory, Track
+
+    since = timezone.now() - HASHTAG_WINDOWS[window]
+    TrackHashtag = Track.hashtags.through
+
+    recent_tracks = dict(
+        TrackHashtag.objects.filter(track__status='published')
+        .filter(Q(track__published_at__gte=since) |
+                Q(track__published_at__isnull=True, track__created_at__gte=since))
+        .values('hashtag_id')
+        .annotate(c=Count('track_id'))
+        .order_by()
+        .values_list('hashtag_id', 'c')
+    )
+    recent_plays = dict(
+        PlayHistory.objects.filter(played_at__gte=since, track__status='published',
+                                   track__hashtags__isnull=False)
+        .values('track__hashtags')
+        .annotate(c=Count('id'))
+        .order_by()
+        .values_list('track__hashtags', 'c')
+    )
+
+    scores = defaultdict(int)
+    for tag_id, c in recent_tracks.items():
+        scores[tag_id] += HASHTAG_WEIGHTS['tracks'] * c
+    for tag_id, c in recent_plays.items():
+        scores[tag_id] += HASHTAG_WEIGHTS['plays'] * c
+
+    top_ids = sorted(scores, key=lambda tag_id: -scores[tag_id])[:size]
+    if len(top_ids) < size:
+        top_ids += list(
+            Hashtag.objects.exclude(id__in=top_ids)
+            .annotate(published=Count('tracks', filter=Q(tracks__status='published')))
+            .filter(Q(usage_count__gt=0) | Q(published__gt=0))
+            .order_by('-usage_count', '-published')
+            .values_list('id', flat=True)[:size - len(top_ids)]
+        )
+
+    tracks_count = dict(
+        TrackHashtag.objects.filter(hashtag_id__in=top_ids, track__status='published')
+        .values('hashtag_id')
+        .annotate(c=Count('track_id'))
+        .order_by()
+        .values_list('hashtag_id', 'c')
+    )
+    tags = Hashtag.objects.in_bulk(top_ids)
+
+    return [
+        {
+            'name': tags[tag_id].name,
+            'slug': tags[tag_id].slug,
+            'usage_count': tags[tag_id].usage_count,
+            'tracks_count': tracks_count.get(tag_id, 0),
+            'recent_tracks': recent_tracks.get(tag_id, 0),
+            'recent_plays': recent_plays.get(tag_id, 0),
+            'score': scores.get(tag_id, 0),
+        }
+        for tag_id in top_ids if tag_id in tags
+    ]
+
+
+def refresh_trending_hashtags():
+    """Пересчитывает и кладёт в кэш топ тегов для всех окон (для cron)"""
+    from django.core.cache import cache
+
+    result = {}
+    for window in HASHTAG_WINDOWS:
+        top = compute_trending_hashtags(window)
+        cache.set(_hashtags_cache_key(window), top, timeout=HASHTAG_CACHE_TTL)
+        result[window] = len(top)
+    return result
+
+
+def get_trending_hashtags(window=DEFAULT_HASHTAG_WINDOW, limit=20):
+    """Топ тегов из кэша (при промахе - пересчёт и запись в кэш)"""
+    from django.core.cache import cache
+
+    if window not in HASHTAG_WINDOWS:
+        window = DEFAULT_HASHTAG_WINDOW
+
+    top = cache.get(_hashtags_cache_key(window))
+    if top is None:
+        top = compute_trending_hashtags(window)
+        cache.set(_hashtags_cache_key(window), top, timeout=HASHTAG_CACHE_TTL)
+    return top[:limit]
@@ -64,6 +64,8 @@ urlpatterns = [
 
     # ----------  WAVEFORM ----------
     path('track/<int:track_id>/waveform/', views.get_waveform, name='get_waveform'),
+    path('track/<int:track_id>/processing-status/', views.get_track_processing_status, name='get_track_processing_status'),
+    path('track/<int:track_id>/analytics/', views.get_track_analytics, name='get_track_analytics'),
 
     # ----------  ПРОСЛУШИВАНИЯ ----------
     path('track/<int:track_id>/record-play/', views.record_play, name='record_play'),
@@ -106,10 +108,12 @@ urlpatterns = [
 
     # --------------------  PLAYLISTS --------------------
     path('tracks/search/', views.search_tracks, name='tracks-search'),
+    path('tracks/trending/', views.get_trending_tracks, name='tracks-trending'),
     path('playlists/create/', views.create_playlist, name='playlist-create'),
     path('playlists/<int:playlist_id>/', views.playlist_detail, name='playlist-detail'),
     path('playlists/<int:playlist_id>/update/', views.update_playlist, name='playlist-update'),
     path('users/<int:user_id>/playlists/', views.get_user_playlists, name='user-playlists'),
+    path('search/suggest/', views.search_suggest, name='search-suggest'),
     path('search/', views.search_hub, name='search-hub'),
     path('playlists/<int:playlist_id>/delete/', views.delete_playlist, name='playlist-delete'),
     
@@ -124,6 +128,7 @@ urlpatterns = [
     path('users/<int:user_id>/liked-playlists/', views.get_user_liked_playlists, name='user-liked-playlists'),
     path('users/<int:user_id>/reposted-playlists/', views.get_user_reposted_playlists, name='user-reposted-playlists'),
     path('feed/playlists/', views.get_feed_playlists, name='feed_playlists'),
+    path('activity/', views.get_activity, name='activity'),
     path('tracks/<int:track_id>/playlists/', views.get_track_playlists, name='track_playlists'),
     
     # --------------------  NOW PLAYING / ACTIVITY  --------------------
@@ -158,6 +163,7 @@ urlpatterns = [
     path('admin/tracks/<int:track_id>/delete/', views.admin_delete_track, name='admin_delete_track'),
     path('admin/playlists/', views.admin_list_users_playlists, name='admin_list_users_playlists'),
     path('admin/playlists/<int:playlist_id>/delete/', views.admin_delete_playlist, name='admin_delete_playlist'),
+    path('admin/play-protection/', views.admin_play_protection_stats, name='admin_play_protection_stats'),
     path('admin/users/', views.admin_list_users, name='admin_list_users'),
     path('admin/users/<int:user_id>/ban/', views.admin_ban_user, name='admin_ban_user'),
     path('admin/users/<int:user_id>/unban/', views.admin_unban_user, name='admin_unban_user'),
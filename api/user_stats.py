@@ -0,0 +1,278 @@
+# api/user_stats.py
+"""
+🔥 Статистика пользователя по дням (UserDailyStats).
+
+Totals на конец дня считаются сгруппированными запросами (по одному на источник)
+с накопительной суммой по датам, а не циклом "запрос на каждый день":
+  - compute_user_stats_series  - все дни одного пользователя (история профиля)
+  - compute_users_totals       - все пользователи на одну дату (ночной снимок)
+
+Снимки пишет команда `python manage.py snapshot_user_stats` (cron, раз в ночь),
+история в get_user_stats_history - один диапазонный запрос + bulk_create пропусков.
+Текущая статистика (get_user_stats) - только чтение из кэша с версионным ключом.
+"""
+import logging
+from datetime import datetime, timedelta, time
+
+logger = logging.getLogger(__name__)
+
+STATS_FIELDS = [
+    'followers', 'following', 'tracks',
+    'total_listens', 'total_likes', 'total_reposts', 'total_comments',
+]
+
+
+def _end_of_day_dt(day_date):
+    """Конец дня = начало следующего дня (в текущей таймзоне)"""
+    from django.utils import timezone
+
+    tz = timezone.get_current_timezone()
+    return timezone.make_aware(datetime.combine(day_date + timedelta(days=1), time.min), tz)
+
+
+def _user_sources(user_id):
+    """(queryset, поле даты, {метрика: агрегат}) - источники totals одного пользователя"""
+    from django.db.models import Count, Sum
+    from .models import Follow, Track, TrackComment
+
+    return (
+        (Follow.objects.filter(following_id=user_id), 'created_at', {'followers': Count('id')}),
+        (Follow.objects.filter(follower_id=user_id), 'created_at', {'following': Count('id')}),
+        (Track.objects.filter(uploaded_by_id=user_id, status='published'), 'created_at', {
+            'tracks': Count('id'),
+            # как и раньше: текущие счётчики треков, опубликованных к концу дня
+            'total_listens': Sum('play_count'),
+            'total_likes': Sum('like_count'),
+            'total_reposts': Sum('repost_count'),
+        }),
+        (TrackComment.objects.filter(track__uploaded_by_id=user_id, is_deleted=False), 'created_at', {
+            'total_comments': Count('id'),
+        }),
+    )
+
+
+def compute_user_stats_series(user_id, start, end):
+    """
+    {дата: totals} для каждого дня [start, end].
+    Каждый источник - один GROUP BY по дню; накопительная сумма по отсортированным
+    дням даёт totals на конец каждого дня (всё, что раньше start, - стартовое значение).
+    """
+    from django.db.models.functions import TruncDate
+
+    deltas = {}
+    for queryset, date_field, aggregates in _user_sources(user_id):
+        rows = (queryset.filter(**{f'{date_field}__lt': _end_of_day_dt(end)})
+                .annotate(day=TruncDate(date_field))
+                .values('day')
+                .annotate(**aggregates)
+                .order_by())
+        for row in rows:
+            day_deltas = deltas.setdefault(row['day'], dict.fromkeys(STATS_FIELDS, 0))
+            for field in aggregates:
+                day_deltas[field] += int(row[field] or 0)
+
+    running = dict.fromkeys(STATS_FIELDS, 0)
+    change_days = sorted(deltas)
+    idx = 0
+
+    # всё, что было до start, - стартовое значение
+    while idx < len(change_days) and change_days[idx] < start:
+        for field, value in deltas[change_days[idx]].items():
+            running[field] += value
+        idx += 1
+
+    series = {}
+    day = start
+    while day <= end:
+        if idx < len(change_days) and change_days[idx] == day:
+            for field, value in deltas[day].items():
+                running[field] += value
+            idx += 1
+        series[day] = dict(running)
+        day += timedelta(days=1)
+
+    return series
+
+
+def compute_users_totals(day):
+    """
+    {user_id: totals} на конец дня для ВСЕХ пользователей -
+    по одному запросу с GROUP BY пользователю на каждый источник.
+    """
+    from django.db.models import Count, Sum
+    from .models import CustomUser, Follow, Track, TrackComment
+
+    end_dt = _end_of_day_dt(day)
+    totals = {
+        user_id: dict.fromkeys(STATS_FIELDS, 0)
+        for user_id in CustomUser.objects.values_list('id', flat=True)
+    }
+
+    sources = (
+        (Follow.objects.all(), 'following_id', {'followers': Count('id')}),
+        (Follow.objects.all(), 'follower_id', {'following': Count('id')}),
+        (Track.objects.filter(status='published'), 'uploaded_by_id', {
+            'tracks': Count('id'),
+            'total_listens': Sum('play_count'),
+            'total_likes': Sum('like_count'),
+            'total_reposts': Sum('repost_count'),
+        }),
+        (TrackComment.objects.filter(is_deleted=False), 'track__uploaded_by_id', {
+            'total_comments': Count('id'),
+        }),
+    )
+
+    for queryset, user_field, aggregates in sources:
+        rows = (queryset.filter(created_at__lt=end_dt)
+                .values(user_field)
+                .annotate(**aggregates)
+                .order_by())
+        for row in rows:
+            user_totals = totals.get(row[user_field])
+            if user_totals is None:
+                continue
+            for field in aggregates:
+                user_totals[field] = int(row[field] or 0)
+
+    return totals
+
+
+def snapshot_all_users(day):
+    """Upsert снимков UserDailyStats всех пользователей за день (одним bulk_create)"""
+    from .models import UserDailyStats
+
+    totals = compute_users_totals(day)
+    UserDailyStats.objects.bulk_create(
+        [UserDailyStats(user_id=user_id, date=day, **values) for user_id, values in totals.items()],
+        update_conflicts=True,
+        unique_fields=['user', 'date'],
+        update_fields=STATS_FIELDS + ['updated_at'],
+        batch_size=500,
+    )
+    return len(totals)
+
+
+def get_user_stats_history_points(user, start, end):
+    """
+    Точки истории [start, end]: один диапазонный запрос по снимкам;
+    недостающие дни считаются одним проходом и сохраняются одним bulk_create.
+    Сегодняшний день ещё не закончился - его точка всегда считается заново
+    и не сохраняется (иначе снимок "застыл" бы на первом запросе дня).
+    """
+    from django.utils import timezone
+    from .models import UserDailyStats
+
+    today = timezone.localdate()
+    points = {
+        row['date']: row
+        for row in UserDailyStats.objects.filter(user=user, date__gte=start, date__lte=end, date__lt=today)
+        .values('date', *STATS_FIELDS)
+    }
+
+    missing = []
+    day = start
+    while day <= end:
+        if day not in points:
+            missing.append(day)
+        day += timedelta(days=1)
+
+    if missing:
+        series = compute_user_stats_series(user.id, missing[0], end)
+        closed = [day for day in missing if day < today]
+        UserDailyStats.objects.bulk_create(
+            [UserDailyStats(user=user, date=day, **series[day]) for day in closed],
+            ignore_conflicts=True,
+        )
+        for day in missing:
+            points[day] = {'date': day, **series[day]}
+        if closed:
+            logger.info(f"📈 Статистика пользователя {user.id}: досчитано дней {len(closed)}")
+
+    return [points[day] for day in sorted(points)]
+
+
+# ==================== КЭШ ТЕКУЩЕЙ СТАТИСТИКИ (get_user_stats) ====================
+# Ключ статистики содержит версию пользователя: события (подписка, трек, лайк,
+# репост, комментарий, плейлист) только увеличивают версию - старые ключи
+# перестают читаться и вытесняются по TTL. Прослушивания версию не трогают
+# (их слишком много) - total_listens догоняет не позже STATS_CACHE_TTL.
+# Кэш общий для процессов (settings.CACHES: файловый по умолчанию, Redis/Memcached в проде).
+# incr файлового кэша не атомарен, но для версии это не важно: при гонке двух событий
+# версия вырастет на 1, а не на 2 - старый ключ всё равно перестанет читаться.
+STATS_CACHE_TTL = 60 * 5  # 5 минут
+STATS_VERSION_TTL = 60 * 60 * 24 * 30  # версия живёт дольше любого ключа статистики
+
+
+def _stats_version_key(user_id: int) -> str:
+    return f"user_stats:version:{user_id}"
+
+
+def _stats_key(user_id: int, version: int) -> str:
+    return f"user_stats:{user_id}:v{version}"
+
+
+def get_user_stats_version(user_id):
+    from django.core.cache import cache
+
+    version = cache.get(_stats_version_key(user_id))
+    if version is None:
+        version = 1
+        cache.add(_stats_version_key(user_id), version, timeout=STATS_VERSION_TTL)
+    return version
+
+
+def bump_user_stats_version(*user_ids):
+    """Инвалидирует кэш статистики пользователей (incr версии)"""
+    from django.core.cache import cache
+
+    for user_id in {uid for uid in user_ids if uid}:
+        key = _stats_version_key(user_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # версии ещё нет - любое значение, отличное от "1 по умолчанию"
+            cache.set(key, 2, timeout=STATS_VERSION_TTL)
+
+
+def compute_user_stats(user_id):
+    """Текущая статистика пользователя: только чтение (без записи UserDailyStats)"""
+    from django.db.models import Count, Sum
+    from .models import Follow, Track, Playlist
+
+    track_stats = Track.objects.filter(uploaded_by_id=user_id, status='published').aggregate(
+        tracks=Count('id'),
+        total_listens=Sum('play_count'),
+        total_likes=Sum('like_count'),
+        total_reposts=Sum('repost_count'),
+        total_comments=Sum('comment_count'),
+    )
+
+    return {
+        'followers': Follow.objects.filter(following_id=user_id).count(),
+        'following': Follow.objects.filter(follower_id=user_id).count(),
+        'tracks': track_stats['tracks'] or 0,
+        'playlists': Playlist.objects.filter(created_by_id=user_id).count(),
+        'total_listens': track_stats['total_listens'] or 0,
+        'total_likes': track_stats['total_likes'] or 0,
+        'total_reposts': track_stats['total_reposts'] or 0,
+        'total_comments': track_stats['total_comments'] or 0,
+    }
+
+
+def get_cached_user_stats(user_id):
+    """
+    (stats, computed_at, from_cache): статистика из кэша по версионному ключу,
+    при промахе - compute_user_stats и запись в кэш.
+    """
+    from django.core.cache import cache
+    from django.utils import timezone
+
+    key = _stats_key(user_id, get_user_stats_version(user_id))
+    cached = cache.get(key)
+    if cached is not None:
+        return cached['stats'], cached['computed_at'], True
+
+    stats = compute_user_stats(user_id)
+    computed_at = timezone.now().isoformat()
+    cache.set(key, {'stats': stats, 'computed_at': computed_at}, timeout=STATS_CACHE_TTL)
+    return stats, computed_at, False
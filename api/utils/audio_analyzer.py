@@ -1,5 +1,4 @@
 # api/utils/audio_analyzer.py
-import librosa
 import numpy as np
 import json
 from pathlib import Path
@@ -7,11 +6,36 @@ import warnings
 warnings.filterwarnings('ignore')
 import time
 
+def log_normalize_bars(rms, num_bars):
+    """
+    RMS столбиков → высоты 1..100 (логарифм + min-max), прореживание до num_bars.
+    Всё векторно, без циклов по столбикам.
+    """
+    bars = np.log10(np.asarray(rms, dtype=np.float64) + 0.0001 + 1)  # Логарифмическое преобразование
+    
+    min_val = bars.min()
+    max_val = bars.max()
+    
+    if max_val - min_val > 0:
+        normalized_bars = ((bars - min_val) / (max_val - min_val)) * 99 + 1
+    else:
+        normalized_bars = np.ones_like(bars) * 50
+    
+    # Прореживаем до нужного количества для фронтенда
+    if len(normalized_bars) > num_bars:
+        step = len(normalized_bars) // num_bars
+        normalized_bars = normalized_bars[::step][:num_bars]
+    
+    return np.rint(normalized_bars).astype(int).tolist()
+
 def analyze_audio_file_fast(audio_path, num_bars=60):
     """
     Быстрый анализ аудиофайла с оптимизацией для демо.
     Возвращает 60 значений для фронтенда.
+    Файл читается потоково (api.audio_analysis) - память не зависит от длины трека.
     """
+    from api.audio_analysis import analyze_audio, envelope_rms
+    
     try:
         print(f"🔍 [ANALYZER] Начинаем быстрый анализ: {audio_path}")
         start_time = time.time()
@@ -21,62 +45,24 @@ def analyze_audio_file_fast(audio_path, num_bars=60):
             print(f"❌ [ANALYZER] Файл не найден: {audio_path}")
             return generate_default_waveform(num_bars)
         
-        # 1. Загружаем аудио с пониженной частотой для скорости
-        y, sr = librosa.load(audio_path, sr=11025, mono=True)  # Понижаем частоту вдвое
+        # 1. Один потоковый проход: огибающая RMS с постоянной памятью
+        analysis = analyze_audio(audio_path)
         
         load_time = time.time() - start_time
-        print(f"✅ [ANALYZER] Аудио загружено за {load_time:.2f}с:")
-        print(f"   - Длина: {len(y):,} сэмплов")
-        print(f"   - Частота: {sr} Гц")
-        print(f"   - Длительность: {len(y)/sr:.2f} секунд")
+        print(f"✅ [ANALYZER] Аудио обработано за {load_time:.2f}с:")
+        print(f"   - Длина: {analysis['frames']:,} сэмплов")
+        print(f"   - Частота: {analysis['analysis_sample_rate']} Гц")
+        print(f"   - Длительность: {analysis['duration']:.2f} секунд")
         
-        # 2. Берем абсолютные значения амплитуды
-        amplitude = np.abs(y)
+        if not analysis['frames']:
+            return generate_default_waveform(num_bars)
         
-        # 3. Для скорости используем меньше палочек на бэкенде
+        # 2. Для скорости используем меньше палочек на бэкенде
         backend_bars = min(num_bars * 2, 120)  # 120 максимум для бэкенда
+        print(f"🔢 [ANALYZER] Создаем {backend_bars} палочек")
         
-        chunk_size = len(amplitude) // backend_bars
-        if chunk_size == 0:
-            chunk_size = 1
-        
-        print(f"🔢 [ANALYZER] Создаем {backend_bars} палочек, размер чанка: {chunk_size:,}")
-        
-        # 4. Быстрое вычисление RMS с использованием numpy
-        bars = []
-        for i in range(backend_bars):
-            start_idx = i * chunk_size
-            end_idx = min((i + 1) * chunk_size, len(amplitude))
-            
-            chunk = amplitude[start_idx:end_idx]
-            if len(chunk) > 0:
-                # Быстрое приближение RMS
-                rms = np.sqrt(np.mean(chunk**2))
-                bars.append(float(rms))
-            else:
-                bars.append(0.0)
-        
-        bars = np.array(bars)
-        
-        # 5. Быстрая нормализация
-        bars = bars + 0.0001  # Избегаем нулей
-        bars = np.log10(bars + 1)  # Логарифмическое преобразование
-        
-        min_val = bars.min()
-        max_val = bars.max()
-        
-        if max_val - min_val > 0:
-            normalized_bars = ((bars - min_val) / (max_val - min_val)) * 99 + 1
-        else:
-            normalized_bars = np.ones_like(bars) * 50
-        
-        # 6. Округляем
-        bar_heights = [int(round(h, 0)) for h in normalized_bars]
-        
-        # 7. Прореживаем до нужного количества для фронтенда
-        if len(bar_heights) > num_bars:
-            step = len(bar_heights) // num_bars
-            bar_heights = [bar_heights[i] for i in range(0, len(bar_heights), step)][:num_bars]
+        # 3. RMS по столбикам numpy-редукцией + нормализация
+        bar_heights = log_normalize_bars(envelope_rms(analysis['envelope'], backend_bars), num_bars)
         
         total_time = time.time() - start_time
         print(f"✅ [ANALYZER] Waveform сгенерирован за {total_time:.2f}с:")
@@ -1,46 +1,180 @@
 # utils/play_protection.py - Защита от накрутки прослушиваний
-from datetime import timedelta
-from django.utils import timezone
+"""
+🛡️ Лимитер прослушиваний (record_play) на кэше Django.
+
+Скользящее окно (два соседних фиксированных окна с весом): для каждой области -
+пользователь+трек, пользователь, IP - счётчик текущего окна увеличивается атомарно,
+оценка = текущее окно + предыдущее * (доля окна, ещё не ушедшая в прошлое).
+Если хотя бы одна область превысила лимит - прослушивание не пишется в БД вообще.
+
+Где живут счётчики окон:
+  - Redis/Memcached в settings.CACHES - cache.incr (атомарный на стороне сервиса)
+  - иначе (файловый кэш по умолчанию, локальный) - модель PlayRateCounter:
+    incr у этих кэшей - get + set, и параллельные процессы теряют попытки,
+    а UPDATE ... F('hits') + 1 в БД - нет
+
+Лимиты настраиваются в settings: PLAY_LIMIT_USER_TRACK / PLAY_LIMIT_USER / PLAY_LIMIT_IP
+в формате "N/секунды". Счётчики решений - get_play_protection_stats().
+"""
+import logging
+import math
+import time
+
+from django.conf import settings
 from django.core.cache import cache
 
-def can_count_play(user, track):
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMITS = {
+    'user_track': '10/1800',  # повтор одного трека: 10 раз за 30 минут
+    'user': '120/3600',       # прослушивание ≥ 30 сек: физически не больше 120 в час
+    'ip': '300/3600',         # общий IP (NAT, общежитие) - с запасом
+}
+
+STATS_KEYS = ('allowed', 'blocked_user_track', 'blocked_user', 'blocked_ip')
+STATS_TTL = 60 * 60 * 24 * 30
+
+
+def _parse_limit(value):
+    """'N/секунды' -> (N, секунды)"""
+    count, window = str(value).split('/', 1)
+    return max(1, int(count)), max(1, int(window))
+
+
+def get_play_limits():
+    """{область: (лимит, окно в секундах)} с учётом settings"""
+    return {
+        scope: _parse_limit(getattr(settings, f'PLAY_LIMIT_{scope.upper()}', default))
+        for scope, default in DEFAULT_LIMITS.items()
+    }
+
+
+def _stats_key(name):
+    return f"play_protection:stats:{name}"
+
+
+def _bump_stat(name):
+    key = _stats_key(name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=STATS_TTL):
+            cache.incr(key)
+
+
+def _cache_has_atomic_incr():
+    """incr атомарен только у Redis/Memcached - у файлового и локального кэша это get + set"""
+    # по модулю, а не по имени класса: LocMemCache тоже "...MemCache"
+    module = settings.CACHES.get('default', {}).get('BACKEND', '').rsplit('.', 1)[0].lower()
+    return 'redis' in module or module.endswith('memcached')
+
+
+def _cache_incr(key, previous_key, timeout):
+    """(текущее окно после +1, предыдущее окно) на кэше"""
+    cache.add(key, 0, timeout=timeout)
+    try:
+        current = cache.incr(key)
+    except ValueError:
+        # ключ вытеснили между add и incr
+        cache.set(key, 1, timeout=timeout)
+        current = 1
+    return current, cache.get(previous_key, 0)
+
+
+def _db_incr(key, previous_key, timeout):
     """
-    Проверяет, можно ли засчитать прослушивание.
-    Защита от накрутки по нескольким параметрам:
-    1. Один пользователь = 1 прослушивание в сутки
-    2. Один IP = максимум 5 прослушиваний в час
-    3. Проверка по User-Agent
+    (текущее окно после +1, предыдущее окно) на PlayRateCounter.
+    Первая попытка окна создаёт строку (гонку создания ловит unique по key)
+    и заодно чистит истёкшие окна.
     """
-    
-    # Ключи для кэша
-    user_track_key = f"play_user_{user.id}_track_{track.id}"
-    ip_key = f"play_ip_{request.META.get('REMOTE_ADDR')}"
-    
-    # Проверка 1: Этот пользователь уже слушал этот трек сегодня
-    if cache.get(user_track_key):
-        return False
-    
-    # Проверка 2: Слишком много запросов с этого IP
-    ip_plays = cache.get(ip_key, 0)
-    if ip_plays >= 5:  # Максимум 5 прослушиваний в час с одного IP
-        return False
-    
-    # Проверка 3: Проверяем в базе данных (дополнительная защита)
-    today = timezone.now().date()
-    today_start = timezone.make_aware(timezone.datetime.combine(today, timezone.datetime.min.time()))
-    
-    has_played_today = PlayHistory.objects.filter(
-        user=user,
-        track=track,
-        played_at__gte=today_start
-    ).exists()
-    
-    if has_played_today:
-        return False
-    
-    # Все проверки пройдены - можно засчитать
-    # Устанавливаем блокировки в кэш
-    cache.set(user_track_key, True, 86400)  # 24 часа
-    cache.set(ip_key, ip_plays + 1, 3600)   # 1 час
-    
-    return True
\ No newline at end of file
+    from datetime import timedelta
+    from django.db import IntegrityError, transaction
+    from django.db.models import F
+    from django.utils import timezone
+    from ..models import PlayRateCounter
+
+    counters = PlayRateCounter.objects.filter(key=key)
+    if not counters.update(hits=F('hits') + 1):
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                PlayRateCounter.objects.create(key=key, hits=1, expires_at=now + timedelta(seconds=timeout))
+        except IntegrityError:
+            counters.update(hits=F('hits') + 1)
+        else:
+            PlayRateCounter.objects.filter(expires_at__lt=now).delete()
+
+    # чтение после UPDATE может захватить и чужие +1 - оценка только строже, попытки не теряются
+    hits = dict(PlayRateCounter.objects.filter(key__in=[key, previous_key]).values_list('key', 'hits'))
+    return hits.get(key, 1), hits.get(previous_key, 0)
+
+
+def _hit(scope, ident, limit, window, now):
+    """
+    Учитывает попытку в окне области и возвращает (разрешено, через сколько секунд повторить).
+    Попытки сверх лимита тоже считаются - скрипт, долбящий endpoint, не "отдыхает".
+    """
+    bucket = int(now // window)
+    key = f"play_rl:{scope}:{ident}:{bucket}"
+    previous_key = f"play_rl:{scope}:{ident}:{bucket - 1}"
+    incr = _cache_incr if _cache_has_atomic_incr() else _db_incr
+    current, previous = incr(key, previous_key, window * 2)
+
+    elapsed = (now % window) / window
+    estimated = previous * (1 - elapsed) + current
+
+    if estimated <= limit:
+        return True, 0
+
+    # когда вес предыдущего окна опустится настолько, что оценка уложится в лимит
+    if previous and current <= limit:
+        retry_after = (1 - (limit - current) / previous - elapsed) * window
+    else:
+        retry_after = (1 - elapsed) * window
+    return False, max(1, math.ceil(retry_after))
+
+
+def can_count_play(user, track, ip=None):
+    """
+    Проверяет, можно ли записать прослушивание (до любой записи в БД).
+    Возвращает (разрешено, область-причина отказа или None, retry_after в секундах).
+    """
+    if not getattr(settings, 'PLAY_PROTECTION_ENABLED', True):
+        return True, None, 0
+
+    limits = get_play_limits()
+    now = time.time()
+    user_id = getattr(user, 'id', user)
+    track_id = getattr(track, 'id', track)
+
+    checks = [
+        ('user_track', f"{user_id}:{track_id}"),
+        ('user', f"{user_id}"),
+    ]
+    if ip:
+        checks.append(('ip', ip))
+
+    for scope, ident in checks:
+        limit, window = limits[scope]
+        allowed, retry_after = _hit(scope, ident, limit, window, now)
+        if not allowed:
+            _bump_stat(f'blocked_{scope}')
+            logger.warning(f"🛡️ Прослушивание отклонено ({scope}): user={user_id} track={track_id} ip={ip}")
+            return False, scope, retry_after
+
+    _bump_stat('allowed')
+    return True, None, 0
+
+
+def get_play_protection_stats():
+    """Счётчики решений лимитера (для мониторинга) + текущие лимиты"""
+    values = cache.get_many([_stats_key(name) for name in STATS_KEYS])
+    return {
+        'enabled': getattr(settings, 'PLAY_PROTECTION_ENABLED', True),
+        'counters': {name: values.get(_stats_key(name), 0) for name in STATS_KEYS},
+        'limits': {
+            scope: {'limit': limit, 'window_seconds': window}
+            for scope, (limit, window) in get_play_limits().items()
+        },
+    }
+
@@ -84,7 +84,7 @@ from .serializers import (
     
     # Треки
     TrackSerializer, CompactTrackSerializer, PlayerTrackSerializer,
-    TrackCreateSerializer, UploadedTracksSerializer,
+    TrackCreateSerializer, UploadedTracksSerializer, defer_waveform,
     
     # Лайки и репосты треков
     TrackLikeSerializer, TrackRepostSerializer,
@@ -1526,9 +1526,9 @@ def toggle_like(request, track_id=None):
                     deleted_count, _ = TrackLike.objects.filter(user=user, track=track).delete()
                     logger.info(f"✅ toggle_like: удалено {deleted_count} лайков")
                 
-                like_count = TrackLike.objects.filter(track=track).count()
-                track.like_count = like_count
-                track.save()
+                # like_count уже сдвинут сигналом TrackLike (F()-инкремент) - только читаем
+                track.refresh_from_db(fields=['like_count'])
+                like_count = track.like_count
                 
                 user_has_liked = TrackLike.objects.filter(user=user, track=track).exists()
                 
@@ -1559,10 +1559,9 @@ def toggle_like(request, track_id=None):
             else:
                 # Резервный вариант без моделей лайков
                 if liked_bool:
-                    track.like_count += 1
+                    track.increment_like_count()
                 else:
-                    track.like_count = max(0, track.like_count - 1)
-                track.save()
+                    track.decrement_like_count()
                 
                 like_count = track.like_count
                 user_has_liked = liked_bool
@@ -1631,6 +1630,13 @@ def get_track_info(request, track_id):
         user_reposted = False
         
         if HAS_TRACK:
+            # 🔥 Условный GET: валидатор - один .values()-запрос, при совпадении ETag - 304 без тела
+            from .conditional import track_validators, not_modified, apply_validators, PRIVATE_REVALIDATE
+            validators = track_validators(track_id, user)
+            cached = not_modified(request, validators)
+            if cached is not None:
+                return apply_validators(cached, validators, PRIVATE_REVALIDATE)
+            
             try:
                 # 🔥 ИСПРАВЛЕНО: Предзагружаем связи uploaded_by и hashtags
                 track = Track.objects.select_related('uploaded_by').prefetch_related('hashtags').get(id=track_id)
@@ -1664,7 +1670,7 @@ def get_track_info(request, track_id):
                 logger.info(f"Трек {track_id} из БД: {track.title}")
                 logger.info(f"Теги трека: {track_data.get('hashtag_list', [])}")  # для отладки
                 
-                return JsonResponse(track_data)
+                return apply_validators(JsonResponse(track_data), validators, PRIVATE_REVALIDATE)
                 
             except Track.DoesNotExist:
                 logger.warning(f"Трек {track_id} не найден в БД")
@@ -1818,16 +1824,15 @@ def repost_track(request):
                     'is_reposted': True
                 }, status=400)
             
-            # Создаем репост
-            repost = TrackRepost.objects.create(
-                user=user,
-                track=track,
-                comment=comment
-            )
-            
-            # Обновляем счетчик репостов у трека
-            track.repost_count = TrackRepost.objects.filter(track=track).count()
-            track.save(update_fields=['repost_count'])
+            # Создаем репост и атомарно сдвигаем счетчик репостов у трека
+            with transaction.atomic():
+                repost = TrackRepost.objects.create(
+                    user=user,
+                    track=track,
+                    comment=comment
+                )
+                Track.bump_counters(track.id, repost_count=1)
+            track.refresh_from_db(fields=['repost_count'])
             
             message = 'Трек успешно репостнут'
             is_reposted = True
@@ -1841,13 +1846,12 @@ def repost_track(request):
                     'is_reposted': False
                 }, status=400)
             
-            # Удаляем репост
+            # Удаляем репост и атомарно сдвигаем счетчик репостов у трека
             repost_id = existing_repost.id
-            existing_repost.delete()
-            
-            # Обновляем счетчик репостов у трека
-            track.repost_count = TrackRepost.objects.filter(track=track).count()
-            track.save(update_fields=['repost_count'])
+            with transaction.atomic():
+                existing_repost.delete()
+                Track.bump_counters(track.id, repost_count=-1)
+            track.refresh_from_db(fields=['repost_count'])
             
             message = 'Репост успешно удален'
             is_reposted = False
@@ -1892,18 +1896,21 @@ def record_play(request, track_id):
     - listened_seconds < 30: не считается в play_count
     - PlayHistory: пишем КАЖДЫЙ раз (для истории)
     - ListeningHistory: одна запись на пользователя, но обновляем listened_at всегда
+    🔥 Запись - через буфер прослушиваний (play_buffer): запрос только читает,
+       а PlayHistory/ListeningHistory/play_count пишутся пачкой в фоне.
+    🛡️ Накрутка режется лимитером utils.play_protection (429 + Retry-After).
     """
+    from .play_buffer import record_play_event, is_play_pending
+    from .utils.play_protection import can_count_play
+
+    track = get_object_or_404(Track.objects.only('id', 'play_count', 'duration_seconds'), id=track_id)
+    user = request.user
+
     try:
         listened_seconds = int(request.data.get('listened_seconds', 0) or 0)
-        
-        print(f"🎯 record_play: track_id={track_id}, listened_seconds={listened_seconds}, user={request.user.id}")
-
-        track = get_object_or_404(Track, id=track_id)
-        user = request.user
 
         # Если меньше 30 сек — ничего не считаем и не пишем историю
         if listened_seconds < 30:
-            print(f"⚠️ Менее 30 сек ({listened_seconds}) - пропускаем")
             return Response({
                 'success': True,
                 'play_count': track.play_count or 0,
@@ -1911,64 +1918,52 @@ def record_play(request, track_id):
                 'message': 'Прослушивание менее 30 сек – не считается'
             }, status=status.HTTP_200_OK)
 
-        # ✅ 1) ВСЕГДА пишем детальную историю (PlayHistory)
-        try:
-            ip = request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')[0].strip() or request.META.get('REMOTE_ADDR')
-            ua = request.META.get('HTTP_USER_AGENT', '') or ''
-
-            total_sec = int(getattr(track, 'duration_seconds', 0) or 0)
-            is_full = False
-            if total_sec > 0:
-                is_full = listened_seconds >= int(total_sec * 0.9)
-
-            print(f"📝 Создаём PlayHistory: track={track_id}, user={user.id}, sec={listened_seconds}")
-            
-            PlayHistory.objects.create(
-                user=user,
-                track=track,
-                ip_address=ip,
-                user_agent=ua,
-                duration_listened=listened_seconds,
-                is_full_play=is_full
-            )
-        except Exception as e:
-            print(f"❌ Ошибка создания PlayHistory: {e}")
-            logger.error(f"PlayHistory create failed: {e}")
+        ip = request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')[0].strip() or request.META.get('REMOTE_ADDR')
+        ua = request.META.get('HTTP_USER_AGENT', '') or ''
 
-        # ✅ 2) ListeningHistory: одна запись на пользователя, но listened_at обновляем всегда
-        lh, created = ListeningHistory.objects.get_or_create(
-            user=user,
-            track=track,
-            defaults={
-                'listened_seconds': listened_seconds,
-                'listened_at': timezone.now()
-            }
+        # 🛡️ Лимитер (пользователь+трек / пользователь / IP) - до записи прослушивания
+        allowed, blocked_by, retry_after = can_count_play(user, track, ip=ip)
+        if not allowed:
+            response = Response({
+                'success': False,
+                'play_count': track.play_count or 0,
+                'counted': False,
+                'throttled': True,
+                'blocked_by': blocked_by,
+                'retry_after': retry_after,
+                'error': 'Слишком много прослушиваний – попробуйте позже'
+            }, status=status.HTTP_429_TOO_MANY_REQUESTS)
+            response['Retry-After'] = str(retry_after)
+            return response
+
+        total_sec = int(getattr(track, 'duration_seconds', 0) or 0)
+        is_full = False
+        if total_sec > 0:
+            is_full = listened_seconds >= int(total_sec * 0.9)
+
+        # play_count увеличивается только за первое прослушивание пары (пользователь, трек):
+        # проверяем и БД, и ещё не сброшенные события буфера
+        already_listened = ListeningHistory.objects.filter(user=user, track_id=track.id).exists()
+        counted = not already_listened and not is_play_pending(user.id, track.id)
+
+        record_play_event(
+            user_id=user.id,
+            track_id=track.id,
+            duration_listened=listened_seconds,
+            is_full_play=is_full,
+            ip_address=ip,
+            user_agent=ua,
         )
 
-        if not created:
-            lh.listened_at = timezone.now()
-            lh.listened_seconds = max(lh.listened_seconds or 0, listened_seconds)
-            lh.save(update_fields=['listened_at', 'listened_seconds'])
-
-        # play_count увеличиваем только 1 раз
-        if created:
-            track.play_count = (track.play_count or 0) + 1
-            track.save(update_fields=['play_count'])
-            counted = True
-            print(f"✅ Увеличили play_count: теперь {track.play_count}")
-        else:
-            counted = False
-            print(f"⚠️ play_count не увеличен (уже учтено)")
-
         return Response({
             'success': True,
-            'play_count': track.play_count or 0,
+            # первое прослушивание пары ещё может ждать в буфере - учитываем его сразу
+            'play_count': (track.play_count or 0) + (0 if already_listened else 1),
             'counted': counted,
             'message': 'Прослушивание записано'
         }, status=status.HTTP_200_OK)
 
     except Exception as e:
-        print(f"🔥 Критическая ошибка в record_play: {e}")
         logger.error(f"Ошибка при записи прослушивания: {e}")
         return Response({
             'success': False, 
@@ -1983,21 +1978,22 @@ def tracks_history(request):
     Возвращает:
       - history: список событий (track_id + played_at + duration_listened + is_full_play)
       - tracks: данные треков (чтобы фронт мог addTracks)
+    Пагинация - курсором (?cursor= из next_cursor), ?page=N - для старых клиентов.
+    total (COUNT(*)) - только с ?with_total=1.
     """
+    from .pagination import InvalidCursor, paginate_queryset
+
     print(f"📚 tracks_history запрос от пользователя {request.user.id}")
-    
-    # Проверяем, существует ли модель PlayHistory
 
     per_page = min(int(request.GET.get('per_page', 200) or 200), 500)
-    page = max(int(request.GET.get('page', 1) or 1), 1)
-    offset = (page - 1) * per_page
 
-    qs = PlayHistory.objects.filter(user=request.user).select_related('track', 'track__uploaded_by').order_by('-played_at')
-    total = qs.count()
-    
-    print(f"📊 Найдено записей в истории: {total}")
-    
-    plays = list(qs[offset:offset + per_page])
+    qs = PlayHistory.objects.filter(user=request.user)
+    total = qs.count() if request.GET.get('with_total') == '1' else None
+
+    try:
+        plays, pagination = paginate_queryset(qs, request, ['-played_at', '-id'], per_page, total=total)
+    except InvalidCursor as e:
+        return Response({'success': False, 'error': str(e)}, status=400)
 
     history = []
     uniq_track_ids = []
@@ -2016,7 +2012,7 @@ def tracks_history(request):
             uniq_track_ids.append(p.track_id)
 
     # Треки для addTracks (уникальные, в порядке как в истории)
-    tracks_qs = Track.objects.filter(id__in=uniq_track_ids).select_related('uploaded_by')
+    tracks_qs = defer_waveform(Track.objects.filter(id__in=uniq_track_ids).select_related('uploaded_by'))
     tracks_by_id = {t.id: t for t in tracks_qs}
     ordered_tracks = [tracks_by_id[i] for i in uniq_track_ids if i in tracks_by_id]
 
@@ -2028,9 +2024,11 @@ def tracks_history(request):
         'success': True,
         'history': history,
         'tracks': tracks_data,
-        'page': page,
+        'page': pagination['page'],
         'per_page': per_page,
-        'total': total
+        'total': total,
+        'has_next': pagination['has_next'],
+        'next_cursor': pagination['next_cursor']
     })
 
 
@@ -2095,97 +2093,14 @@ def upload_track(request):
         
         track.save()
         
+        # 🔥 Анализ аудио (длительность, sample rate, битрейт, waveform) - в фоне.
+        # Загрузка сразу возвращается, трек в статусе обработки.
+        processing_task = None
         try:
-            audio_path = track.audio_file.path
-            logger.info(f"Определение длительности для файла: {audio_path}")
-            
-            duration_sec = 0
-            
-            try:
-                from pydub import AudioSegment
-                audio = AudioSegment.from_file(audio_path)
-                duration_sec = len(audio) / 1000.0
-                logger.info(f"Длительность определена через pydub: {duration_sec:.2f} секунд")
-                
-            except Exception as pydub_error:
-                logger.warning(f"pydub не удался: {pydub_error}")
-                
-                try:
-                    import librosa
-                    y, sr = librosa.load(audio_path, sr=None, duration=None)
-                    duration_sec = librosa.get_duration(y=y, sr=sr)
-                    logger.info(f"Длительность определена через librosa: {duration_sec:.2f} секунд")
-                    
-                except Exception as librosa_error:
-                    logger.warning(f"librosa не удался: {librosa_error}")
-                    
-                    if file_ext == '.wav':
-                        try:
-                            import wave
-                            with wave.open(audio_path, 'rb') as wav_file:
-                                frames = wav_file.getnframes()
-                                rate = wav_file.getframerate()
-                                duration_sec = frames / float(rate)
-                                logger.info(f"Длительность определена через wave: {duration_sec:.2f} секунд")
-                        except Exception as wave_error:
-                            logger.warning(f"wave не удался: {wave_error}")
-                    
-                    try:
-                        import subprocess
-                        cmd = ['ffprobe', '-v', 'error', '-show_entries', 
-                              'format=duration', '-of', 
-                              'default=noprint_wrappers=1:nokey=1', audio_path]
-                        result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
-                        if result.returncode == 0:
-                            duration_sec = float(result.stdout.strip())
-                            logger.info(f"Длительность определена через ffprobe: {duration_sec:.2f} секунд")
-                        else:
-                            logger.warning(f"ffprobe вернул ошибку: {result.stderr}")
-                    except Exception as ffprobe_error:
-                        logger.warning(f"ffprobe не удался: {ffprobe_error}")
-            
-            if duration_sec and duration_sec > 0:
-                minutes = int(duration_sec // 60)
-                seconds = int(duration_sec % 60)
-                track.duration = f"{minutes}:{seconds:02d}"
-                
-                if hasattr(track, 'duration_seconds'):
-                    track.duration_seconds = int(duration_sec)
-                
-                track.bitrate = int(audio_file.size * 8 / duration_sec / 1000) if duration_sec > 0 else 0
-                
-                try:
-                    import librosa
-                    y, sr = librosa.load(audio_path, sr=None, duration=1)
-                    track.sample_rate = sr
-                except:
-                    track.sample_rate = 44100
-                
-                logger.info(f"Длительность определена: {track.duration} ({duration_sec:.2f} секунд)")
-            else:
-                logger.warning(f"Длительность не определена или равна 0: {duration_sec}")
-                track.duration = "0:00"
-                track.bitrate = 0
-                track.sample_rate = 0
-                
+            from .waveform_tasks import enqueue_track_analysis
+            processing_task = enqueue_track_analysis(track)
         except Exception as e:
-            logger.error(f"Ошибка определения длительности: {e}")
-            track.duration = "0:00"
-            track.bitrate = 0
-            track.sample_rate = 0
-        
-        track.save(update_fields=['duration', 'duration_seconds', 'bitrate', 'sample_rate'])
-        
-        # ГЕНЕРАЦИЯ WAVEFORM ПРИ ЗАГРУЗКЕ
-        try:
-            from .waveform_utils import generate_waveform_for_track
-            if track.audio_file or track.audio_url:
-                generate_waveform_for_track(track)
-                logger.info(f"Waveform сгенерирован для трека {track.id} при загрузке")
-        except ImportError as e:
-            logger.warning(f"Не удалось импортировать waveform_utils: {e}")
-        except Exception as e:
-            logger.error(f"Ошибка генерации waveform при загрузке: {e}")
+            logger.error(f"Ошибка постановки трека {track.id} в очередь анализа: {e}")
         
         if hashtags and HAS_HASHTAG:
             tags_list = [tag.strip().replace('#', '') for tag in hashtags.split() if tag.strip()]
@@ -2208,7 +2123,10 @@ def upload_track(request):
         response_data = {
             'success': True,
             'message': 'Трек успешно загружен',
-            'track': serializer.data
+            'track': serializer.data,
+            'processing': processing_task is not None,
+            'processing_status': processing_task.status if processing_task else 'not_queued',
+            'task_id': processing_task.id if processing_task else None
         }
         
         return Response(response_data)
@@ -2225,55 +2143,66 @@ def upload_track(request):
 @permission_classes([IsAuthenticated])
 def get_feed(request):
     """
-    Лента новостей: треки от авторов, на которых подписан текущий пользователь
+    Лента новостей: треки и репосты авторов, на которых подписан текущий пользователь.
+    🔥 Читается из inbox (FeedItem, api/feed.py) - одна страница по индексу (user, -created_at).
+    Ответ - список треков (как раньше); следующая страница - ?cursor= из заголовка X-Next-Cursor.
     """
-    user = request.user
+    from .models import FeedItem, Track, ListeningHistory
+    from .serializers import TrackSerializer, prefetch_track_relations, track_viewer_context
+    from .pagination import InvalidCursor, paginate_queryset
 
-    # 1) Получаем ID авторов, на которых подписан пользователь
+    user = request.user
     try:
-        # Используем модель Follow
-        from .models import Follow
-        following_ids = Follow.objects.filter(
-            follower=user
-        ).values_list('following_id', flat=True)
-    except:
-        try:
-            # Альтернатива: если есть поле following
-            following_ids = user.following.values_list('id', flat=True)
-        except:
-            following_ids = []
+        per_page = min(max(1, int(request.GET.get('per_page') or 100)), 100)
+    except (TypeError, ValueError):
+        per_page = 100
 
-    if not following_ids:
-        # Если пользователь ни на кого не подписан, возвращаем пустой список
-        return Response([])
+    # 1) страница inbox: снятые с публикации и приватные треки отфильтровываются JOIN-ом по PK
+    items_qs = FeedItem.objects.filter(
+        user=user,
+        track__status='published',
+        track__is_private=False
+    ).select_related('actor')
+    try:
+        items, pagination = paginate_queryset(items_qs, request, ['-created_at', '-id'], per_page)
+    except InvalidCursor as e:
+        return Response({'success': False, 'error': str(e)}, status=400)
+
+    track_ids = [item.track_id for item in items]
+    tracks_by_id = {
+        track.id: track
+        for track in prefetch_track_relations(Track.objects.filter(id__in=track_ids), request)
+    }
+    items = [item for item in items if item.track_id in tracks_by_id]
+    tracks = [tracks_by_id[item.track_id] for item in items]
 
-    # 2) ✅ ИСПРАВЛЕНО: uploaded_by_id__in вместо user_id__in
-    #    ✅ Добавлены фильтры: только опубликованные и не приватные треки
-    from .models import Track
-    tracks = Track.objects.filter(
-        uploaded_by_id__in=following_ids,  # 🔥 КРИТИЧЕСКОЕ ИСПРАВЛЕНИЕ
-        status='published',                # ✅ Только опубликованные
-        is_private=False                  # ✅ Не приватные
-    ).order_by('-created_at')[:100]        # Лимит 100 треков
-
-    # 3) Определяем, какие треки "новые" (не прослушаны)
-    from .models import ListeningHistory
+    # 2) "новые" (не прослушанные) - только среди треков страницы
     listened_ids = set(
         ListeningHistory.objects.filter(
-            user=user
+            user=user,
+            track_id__in=track_ids
         ).values_list('track_id', flat=True)
     )
 
-    # 4) Сериализуем данные
-    from .serializers import TrackSerializer
-    
-    data = []
-    for track in tracks:
-        serialized = TrackSerializer(track, context={'request': request}).data
-        serialized['is_new'] = track.id not in listened_ids
-        data.append(serialized)
+    # 3) Сериализуем одним проходом: лайки/репосты зрителя - готовыми множествами
+    data = TrackSerializer(
+        tracks,
+        many=True,
+        context=track_viewer_context(request, track_ids)
+    ).data
+    for serialized, item in zip(data, items):
+        serialized['is_new'] = serialized['id'] not in listened_ids
+        serialized['feed_reason'] = item.reason
+        serialized['feed_at'] = item.created_at.isoformat()
+        serialized['reposted_by'] = (
+            {'id': item.actor_id, 'username': item.actor.username}
+            if item.reason == 'repost' else None
+        )
 
-    return Response(data)
+    response = Response(data)
+    if pagination['next_cursor']:
+        response['X-Next-Cursor'] = pagination['next_cursor']
+    return response
     
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -2297,24 +2226,105 @@ def get_feed_playlists(request):
         return Response([])
 
     from .models import Playlist
-    playlists = Playlist.objects.filter(
+    from .serializers import PlaylistSerializer, prefetch_playlist_relations, playlist_viewer_context
+    playlists = list(prefetch_playlist_relations(Playlist.objects.filter(
         created_by_id__in=following_ids,
         visibility__in=['public', 'unlisted']
-    ).select_related('created_by').order_by('-created_at')[:60]
+    )).order_by('-created_at')[:60])
 
     from django.utils import timezone
     from datetime import timedelta
     border = timezone.now() - timedelta(days=3)  # “новые” за последние 3 дня
 
-    from .serializers import PlaylistSerializer
-    data = []
-    for pl in playlists:
-        item = PlaylistSerializer(pl, context={'request': request}).data
+    # Счётчики - колонки плейлиста, лайки/репосты зрителя - готовыми множествами
+    data = PlaylistSerializer(
+        playlists,
+        many=True,
+        context=playlist_viewer_context(request, [pl.id for pl in playlists])
+    ).data
+    for item, pl in zip(data, playlists):
         item['is_new'] = pl.created_at >= border
-        data.append(item)
 
     return Response(data)
 
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_activity(request):
+    """
+    GET /api/activity/?per_page=20&cursor=...
+    Единая лента: загрузки, репосты треков, новые плейлисты и репосты плейлистов
+    от подписок - k-way merge отсортированных потоков (api/activity.py), по курсору.
+    """
+    from .activity import STREAMS, get_activity_page
+    from .models import CustomUser, Playlist
+    from .pagination import InvalidCursor, decode_cursor, encode_cursor
+    from .serializers import (
+        TrackSerializer, PlaylistSerializer, prefetch_track_relations, track_viewer_context,
+        prefetch_playlist_relations, playlist_viewer_context,
+    )
+
+    try:
+        per_page = min(max(1, int(request.GET.get('per_page') or 20)), 50)
+    except (TypeError, ValueError):
+        per_page = 20
+
+    position = None
+    cursor = (request.GET.get('cursor') or '').strip()
+    try:
+        if cursor:
+            position = decode_cursor(cursor, 3)
+        events, next_position = get_activity_page(request.user, position, per_page)
+    except InvalidCursor as e:
+        return Response({'success': False, 'error': str(e)}, status=400)
+
+    # объекты страницы - пачкой на тип, с готовыми множествами лайков/репостов зрителя
+    track_ids = [e.object_id for e in events if STREAMS[e.kind][1] == 'track']
+    playlist_ids = [e.object_id for e in events if STREAMS[e.kind][1] == 'playlist']
+
+    tracks = list(prefetch_track_relations(Track.objects.filter(id__in=track_ids), request))
+    tracks_data = dict(zip(
+        [t.id for t in tracks],
+        TrackSerializer(tracks, many=True, context=track_viewer_context(request, track_ids)).data
+    ))
+    playlists = list(prefetch_playlist_relations(Playlist.objects.filter(id__in=playlist_ids)))
+    playlists_data = dict(zip(
+        [p.id for p in playlists],
+        PlaylistSerializer(playlists, many=True, context=playlist_viewer_context(request, playlist_ids)).data
+    ))
+
+    actors = {}
+    for actor in CustomUser.objects.filter(id__in={e.actor_id for e in events}):
+        avatar_url = actor.get_avatar_url()
+        if avatar_url and avatar_url.startswith('/'):
+            avatar_url = request.build_absolute_uri(avatar_url)
+        actors[actor.id] = {'id': actor.id, 'username': actor.username, 'avatar_url': avatar_url or None}
+
+    items = []
+    for event in events:
+        object_type = STREAMS[event.kind][1]
+        data = (tracks_data if object_type == 'track' else playlists_data).get(event.object_id)
+        if data is None:
+            continue
+        items.append({
+            'id': f"{event.kind}:{event.id}",
+            'type': event.kind,
+            'object_type': object_type,
+            'created_at': event.created_at.isoformat(),
+            'actor': actors.get(event.actor_id),
+            object_type: data,
+        })
+
+    return Response({
+        'success': True,
+        'items': items,
+        'pagination': {
+            'per_page': per_page,
+            'has_next': next_position is not None,
+            'next_cursor': encode_cursor(next_position) if next_position else None,
+        }
+    })
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def publish_track(request, track_id):
@@ -2353,23 +2363,13 @@ def publish_track(request, track_id):
                 except Exception as e:
                     logger.warning(f"Не удалось скачать обложку: {e}")
             
-            # ГЕНЕРАЦИЯ WAVEFORM ПРИ ПУБЛИКАЦИИ
+            # ГЕНЕРАЦИЯ WAVEFORM ПРИ ПУБЛИКАЦИИ - ставим в фоновую очередь
             if not track.waveform_generated:
                 try:
-                    from .waveform_utils import generate_waveform_for_track
-                    generate_waveform_for_track(track)
-                    logger.info(f"Waveform сгенерирован для трека {track.id} при публикации")
-                except ImportError as e:
-                    logger.warning(f"Не удалось импортировать waveform_utils: {e}")
-                    # Резервный вариант - демо waveform
-                    from .waveform_utils import generate_demo_waveform
-                    waveform = generate_demo_waveform(track.id)
-                    track.waveform_data = waveform
-                    track.waveform_generated = True
-                    track.save(update_fields=['waveform_data', 'waveform_generated'])
-                    logger.info(f"Демо waveform создан для трека {track.id}")
+                    from .waveform_tasks import enqueue_track_analysis
+                    enqueue_track_analysis(track)
                 except Exception as e:
-                    logger.error(f"Ошибка генерации waveform при публикации: {e}")
+                    logger.error(f"Ошибка постановки в очередь waveform при публикации: {e}")
             
             # 🔥 ИСПРАВЛЕНО: Используем TrackSerializer для ответа
             serializer = TrackSerializer(
@@ -2402,20 +2402,22 @@ def publish_track(request, track_id):
 
 @require_GET
 def get_trending_hashtags(request):
+    """
+    Трендовые хештеги за скользящее окно (?window=24h|7d, по умолчанию 7d).
+    🔥 Топ считается сгруппированными запросами и берётся из кэша
+    (его обновляет update_trending_scores), без COUNT на каждый тег.
+    """
     try:
         limit = int(request.GET.get('limit', 20))
+        window = request.GET.get('window', '7d')
         
         hashtags = []
         if HAS_HASHTAG:
-            trending = Hashtag.objects.filter(usage_count__gt=0).order_by('-usage_count')[:limit]
-            
-            for tag in trending:
-                hashtags.append({
-                    'name': tag.name,
-                    'slug': tag.slug,
-                    'usage_count': tag.usage_count,
-                    'tracks_count': tag.tracks.count()
-                })
+            from .trending import HASHTAG_WINDOWS, DEFAULT_HASHTAG_WINDOW, get_trending_hashtags as load_trending_hashtags
+
+            if window not in HASHTAG_WINDOWS:
+                window = DEFAULT_HASHTAG_WINDOW
+            hashtags = load_trending_hashtags(window=window, limit=limit)
         else:
             hashtags = [
                 {'name': 'electronic', 'slug': 'electronic', 'usage_count': 125, 'tracks_count': 45},
@@ -2428,7 +2430,8 @@ def get_trending_hashtags(request):
         return JsonResponse({
             'success': True,
             'hashtags': hashtags,
-            'count': len(hashtags)
+            'count': len(hashtags),
+            'window': window
         })
         
     except Exception as e:
@@ -2453,10 +2456,10 @@ def search_by_hashtag(request, hashtag):
                     'message': 'Хештег не найден'
                 })
             
-            tracks_qs = Track.objects.filter(
+            tracks_qs = defer_waveform(Track.objects.filter(
                 hashtags=tag,
                 status='published'
-            ).select_related('uploaded_by').order_by('-published_at')
+            ).select_related('uploaded_by').order_by('-published_at'))
             
             # 🔥 ИСПРАВЛЕНО: Используем CompactTrackSerializer
             serializer = CompactTrackSerializer(
@@ -2681,18 +2684,14 @@ def add_track_comment(request, track_id):
                     }, status=404)
 
             # ✅ СОЗДАЁМ КОММЕНТАРИЙ
-            comment = TrackComment.objects.create(
-                user=user,
-                track=track,
-                text=text
-            )
-
-            # 🔥 ВАЖНОЕ МЕСТО: ОБНОВЛЯЕМ СЧЁТЧИК КОММЕНТАРИЕВ
-            track.comment_count = TrackComment.objects.filter(
-                track=track,
-                is_deleted=False
-            ).count()
-            track.save(update_fields=['comment_count'])
+            # 🔥 ВАЖНОЕ МЕСТО: СЧЁТЧИК КОММЕНТАРИЕВ - атомарный +1 в той же транзакции
+            with transaction.atomic():
+                comment = TrackComment.objects.create(
+                    user=user,
+                    track=track,
+                    text=text
+                )
+                Track.bump_counters(track.id, comment_count=1)
 
             new_comment = {
                 'id': comment.id,
@@ -2790,12 +2789,56 @@ def debug_like(request):
             'message': 'Произошла ошибка в debug endpoint'
         }, status=500)
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def get_trending_tracks(request):
+    """
+    Треки "в тренде": затухающий рейтинг прослушиваний/лайков/репостов.
+    GET /api/tracks/trending/?genre=&limit=
+    🔥 Только чтение индексированного Track.trending_score (его обновляет update_trending_scores).
+    """
+    from .models import AnalyticsRollupState
+    from .trending import STATE_NAME, get_trending_tracks as load_trending_tracks
+
+    genre = (request.query_params.get('genre') or '').strip() or None
+    try:
+        limit = max(1, min(50, int(request.query_params.get('limit', 20))))
+    except (TypeError, ValueError):
+        limit = 20
+
+    try:
+        tracks = load_trending_tracks(genre=genre, limit=limit)
+        data = CompactTrackSerializer(tracks, many=True, context={'request': request}).data
+        for item, track in zip(data, tracks):
+            item['trending_score'] = round(track.trending_score, 3)
+
+        updated_at = (AnalyticsRollupState.objects
+                      .filter(name=STATE_NAME)
+                      .values_list('updated_at', flat=True)
+                      .first())
+
+        return Response({
+            'success': True,
+            'genre': genre,
+            'tracks': data,
+            'count': len(data),
+            'updated_at': updated_at.isoformat() if updated_at else None,
+        }, status=status.HTTP_200_OK)
+
+    except Exception as e:
+        logger.error(f"Ошибка получения трендов: {e}")
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 # 🔥 ИСПРАВЛЕННЫЙ get_tracks - теперь использует CompactTrackSerializer
 @require_GET
 def get_tracks(request):
     try:
         if HAS_TRACK:
-            published_tracks = Track.objects.filter(status='published').order_by('-created_at')[:20]
+            published_tracks = defer_waveform(Track.objects.filter(status='published')).order_by('-created_at')[:20]
             
             # 🔥 ИСПРАВЛЕНО: Используем CompactTrackSerializer
             serializer = CompactTrackSerializer(
@@ -3159,12 +3202,8 @@ def sync_track_likes(request, track_id):
                 except UserTrackInteraction.DoesNotExist:
                     user_has_liked = False
         
-        if HAS_TRACK_LIKE:
-            like_count = TrackLike.objects.filter(track=track).count()
-            track.like_count = like_count
-            track.save()
-        else:
-            like_count = track.like_count
+        # Счётчик поддерживается F()-инкрементами - читаем колонку, без COUNT(*) и записи на GET
+        like_count = track.like_count
         
         return JsonResponse({
             'success': True,
@@ -3191,7 +3230,7 @@ def get_liked_tracks(request):
         liked_tracks = []
         
         if HAS_TRACK_LIKE:
-            likes = TrackLike.objects.filter(user=user).select_related('track')
+            likes = defer_waveform(TrackLike.objects.filter(user=user).select_related('track'), prefix='track__')
             tracks = [like.track for like in likes]
             
             # 🔥 ИСПРАВЛЕНО: Используем CompactTrackSerializer
@@ -3219,7 +3258,9 @@ def get_liked_tracks(request):
             })
         
         elif HAS_USER_TRACK_INTERACTION:
-            interactions = UserTrackInteraction.objects.filter(user=user, liked=True).select_related('track')
+            interactions = defer_waveform(
+                UserTrackInteraction.objects.filter(user=user, liked=True).select_related('track'), prefix='track__'
+            )
             tracks = [interaction.track for interaction in interactions]
             
             # 🔥 ИСПРАВЛЕНО: Используем CompactTrackSerializer
@@ -3396,10 +3437,10 @@ def get_uploaded_tracks(request):
             }, status=401)
         
         if HAS_TRACK:
-            tracks = Track.objects.filter(
+            tracks = defer_waveform(Track.objects.filter(
                 uploaded_by=user,
                 status='published'
-            ).order_by('-created_at')
+            )).order_by('-created_at')
             
             # 🔥 ИСПРАВЛЕНО: Используем UploadedTracksSerializer
             serializer = UploadedTracksSerializer(
@@ -3437,10 +3478,10 @@ def get_uploaded_tracks_jwt(request):
         
         if HAS_TRACK:
             try:
-                tracks = Track.objects.filter(
+                tracks = defer_waveform(Track.objects.filter(
                     uploaded_by=user,
                     status='published'
-                ).order_by('-created_at')
+                )).order_by('-created_at')
                 
                 logger.info(f"Найдено {tracks.count()} треков пользователя {user.username}")
                 
@@ -3517,9 +3558,9 @@ def recently_played_tracks(request):
         tracks = []
         
         if HAS_PLAY_HISTORY and user:
-            play_history = PlayHistory.objects.filter(
+            play_history = defer_waveform(PlayHistory.objects.filter(
                 user=user
-            ).select_related('track').order_by('-played_at')[:10]
+            ).select_related('track'), prefix='track__').order_by('-played_at')[:10]
             
             tracks = [history.track for history in play_history]
             
@@ -3747,35 +3788,147 @@ def debug_track_data(request):
             'error': str(e)
         }, status=500)
 
+# Максимум точек в одном ответе зум-режима (верхний уровень пирамиды)
+WAVEFORM_MAX_POINTS = 4096
+
+
+def _get_waveform_zoom(request, track_id):
+    """
+    Зум-режим get_waveform: ?points=N&start=&end= (start/end в секундах).
+    Отдаёт готовый уровень пирамиды waveform (срез под отрезок), без пересчёта аудио.
+    """
+    try:
+        points = int(request.GET.get('points', 256))
+        start = float(request.GET['start']) if request.GET.get('start') else None
+        end = float(request.GET['end']) if request.GET.get('end') else None
+    except (TypeError, ValueError):
+        return JsonResponse({
+            'success': False,
+            'error': 'points должен быть целым числом, start/end - числами (секунды)'
+        }, status=400)
+    
+    if not 1 <= points <= WAVEFORM_MAX_POINTS:
+        return JsonResponse({
+            'success': False,
+            'error': f'points должен быть от 1 до {WAVEFORM_MAX_POINTS}'
+        }, status=400)
+    
+    try:
+        track = Track.objects.only(
+            'id', 'waveform_data', 'waveform_pyramid', 'waveform_generated', 'waveform_generated_at'
+        ).get(id=track_id)
+    except Track.DoesNotExist:
+        return JsonResponse({
+            'success': False,
+            'error': 'Трек не найден'
+        }, status=404)
+    
+    if not track.waveform_pyramid:
+        # Пирамида ещё не построена - ставим трек в очередь анализа,
+        # а пока отдаём сохранённый waveform, растянутый до points.
+        # Если анализ уже завершён, а пирамиды нет (трек только по audio_url,
+        # без локального файла) - повторный анализ её не построит, в очередь не ставим
+        try:
+            from .waveform_tasks import enqueue_track_analysis
+            if not WaveformGenerationTask.objects.filter(track=track, status='completed').exists():
+                enqueue_track_analysis(track)
+        except Exception as e:
+            logger.error(f"Ошибка постановки трека {track_id} в очередь анализа: {e}")
+        
+        return JsonResponse({
+            'success': True,
+            'track_id': track.id,
+            'waveform': track.get_waveform(points),
+            'points': points,
+            'pyramid': False,
+            'generated': track.waveform_generated,
+            'source': 'database'
+        })
+    
+    try:
+        zoom = track.get_waveform_range(points, start, end)
+    except ValueError as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=400)
+    
+    return JsonResponse({
+        'success': True,
+        'track_id': track.id,
+        'points': points,
+        'pyramid': True,
+        'generated': True,
+        'generated_at': track.waveform_generated_at.isoformat() if track.waveform_generated_at else None,
+        'source': 'pyramid',
+        **zoom
+    })
+
+
 @require_GET
 def get_waveform(request, track_id):
     try:
+        zoom = any(param in request.GET for param in ('points', 'start', 'end'))
+        
+        # 🔥 Условный GET: готовый waveform меняется только при повторном анализе -
+        # ETag/Last-Modified по waveform_generated_at, Cache-Control: public на час
+        validators = None
+        if HAS_TRACK:
+            from .conditional import waveform_validators, not_modified, apply_validators, WAVEFORM_CACHE
+            validators = waveform_validators(track_id, request.META.get('QUERY_STRING', ''), zoom=zoom)
+            cached = not_modified(request, validators, use_last_modified=True)
+            if cached is not None:
+                return apply_validators(cached, validators, WAVEFORM_CACHE, vary_auth=False)
+        
+        # 🔥 Зум-режим: готовый уровень пирамиды под нужное количество точек и отрезок
+        if HAS_TRACK and zoom:
+            response = _get_waveform_zoom(request, track_id)
+            if response.status_code == 200:
+                apply_validators(response, validators, WAVEFORM_CACHE, vary_auth=False)
+            return response
+        
         if HAS_TRACK:
             try:
                 track = Track.objects.get(id=track_id)
                 
                 if not track.waveform_generated or not track.waveform_data:
-                    from .waveform_utils import generate_waveform_for_track
-                    from django.utils import timezone
+                    # Декодирование аудио - только в воркере анализа: ставим трек в очередь
+                    # и отдаём заглушку со статусом обработки, клиент перезапросит позже.
+                    # Анализ уже завершён, а waveform нет (трек только по audio_url) -
+                    # повторный анализ его не построит, в очередь не ставим
+                    from .waveform_tasks import enqueue_track_analysis
+                    from .waveform_utils import generate_demo_waveform
+                    
+                    task = WaveformGenerationTask.objects.filter(track=track).order_by('-created_at').first()
+                    if task is None or task.status != 'completed':
+                        try:
+                            task = enqueue_track_analysis(track)
+                        except Exception as e:
+                            logger.error(f"Ошибка постановки трека {track_id} в очередь анализа: {e}")
                     
-                    waveform = generate_waveform_for_track(track)
-                    if waveform:
-                        track.waveform_data = waveform
-                        track.waveform_generated = True
-                        track.waveform_generated_at = timezone.now()
-                        track.save(update_fields=['waveform_data', 'waveform_generated', 'waveform_generated_at'])
+                    if not track.waveform_data:
+                        return JsonResponse({
+                            'success': True,
+                            'track_id': track.id,
+                            'waveform': generate_demo_waveform(track.id, title=track.title),
+                            'generated': False,
+                            'status': task.status if task else 'not_queued',
+                            'task_id': task.id if task else None,
+                            'source': 'placeholder',
+                            'note': 'Waveform ещё строится, повторите запрос позже'
+                        }, status=202 if task and task.status in ('pending', 'processing') else 200)
                 
                 waveform_data = track.get_waveform()
                 
                 if waveform_data:
-                    return JsonResponse({
+                    return apply_validators(JsonResponse({
                         'success': True,
                         'track_id': track_id,
                         'waveform': waveform_data,
                         'generated': track.waveform_generated,
                         'generated_at': track.waveform_generated_at.isoformat() if track.waveform_generated_at else None,
                         'source': 'database'
-                    })
+                    }), validators, WAVEFORM_CACHE, vary_auth=False)
                 
             except Track.DoesNotExist:
                 logger.warning(f"Трек {track_id} не найден в БД для waveform")
@@ -3831,6 +3984,93 @@ def get_waveform(request, track_id):
             'error': str(e)
         })
 
+@require_GET
+def get_track_processing_status(request, track_id):
+    """
+    Статус фоновой обработки трека (длительность + waveform).
+    Клиент опрашивает после upload_track, пока status не станет 'completed'/'failed'.
+    """
+    try:
+        track = Track.objects.get(id=track_id)
+        
+        from .waveform_tasks import get_track_processing_status as build_processing_status
+        
+        return JsonResponse({
+            'success': True,
+            **build_processing_status(track)
+        })
+        
+    except Track.DoesNotExist:
+        return JsonResponse({
+            'success': False,
+            'error': 'Трек не найден'
+        }, status=404)
+    except Exception as e:
+        logger.error(f"Ошибка получения статуса обработки трека {track_id}: {e}")
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_track_analytics(request, track_id):
+    """
+    GET /api/track/<id>/analytics/?days=30
+    Дневная статистика трека для автора - ТОЛЬКО из rollup-таблицы TrackAnalytics
+    (заполняется командой rollup_track_analytics), без сканирования PlayHistory.
+    """
+    from .models import AnalyticsRollupState
+    from .analytics_rollup import ROLLUP_NAME
+
+    track = get_object_or_404(Track.objects.only('id', 'title', 'uploaded_by_id'), id=track_id)
+
+    if track.uploaded_by_id != request.user.id and not request.user.is_staff:
+        return Response({
+            'success': False,
+            'error': 'Статистика доступна только автору трека'
+        }, status=403)
+
+    try:
+        days = int(request.GET.get('days', 30))
+    except (TypeError, ValueError):
+        days = 30
+    days = max(1, min(days, 365))
+
+    today = timezone.localdate()
+    start = today - timedelta(days=days - 1)
+    metrics = ['plays', 'likes', 'reposts', 'comments', 'downloads', 'shares']
+
+    rows = {
+        row['date']: row
+        for row in TrackAnalytics.objects.filter(track_id=track.id, date__gte=start, date__lte=today)
+        .values('date', *metrics)
+    }
+
+    # Дни без событий в rollup-е отсутствуют - дополняем нулями
+    series = []
+    totals = dict.fromkeys(metrics, 0)
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        row = rows.get(day) or {}
+        point = {'date': day.isoformat()}
+        for metric in metrics:
+            point[metric] = row.get(metric, 0)
+            totals[metric] += point[metric]
+        series.append(point)
+
+    state = AnalyticsRollupState.objects.filter(name=ROLLUP_NAME).values('updated_at').first()
+
+    return Response({
+        'success': True,
+        'track_id': track.id,
+        'title': track.title,
+        'days': days,
+        'series': series,
+        'totals': totals,
+        'rolled_up_at': state['updated_at'].isoformat() if state else None,
+    })
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def update_track_duration(request, track_id):
@@ -4156,8 +4396,15 @@ def get_user_public_profile(request, user_id):
     """
     Получение публичного профиля пользователя по ID
     URL: /api/users/<id>/
+    🔥 Условный GET: ETag по updated_at, счётчикам и подписке зрителя - при совпадении 304 без тела
     """
     try:
+        from .conditional import profile_validators, not_modified, apply_validators, PRIVATE_REVALIDATE
+        validators = profile_validators(user_id, request.user)
+        cached = not_modified(request, validators)
+        if cached is not None:
+            return apply_validators(cached, validators, PRIVATE_REVALIDATE)
+        
         user = get_object_or_404(CustomUser, id=user_id)
         
         serializer = PublicUserSerializer(
@@ -4183,10 +4430,10 @@ def get_user_public_profile(request, user_id):
             data['is_following'] = False
             data['is_current_user'] = False
         
-        return Response({
+        return apply_validators(Response({
             'success': True,
             'user': data
-        }, status=status.HTTP_200_OK)
+        }, status=status.HTTP_200_OK), validators, PRIVATE_REVALIDATE)
         
     except Exception as e:
         logger.error(f"Ошибка получения публичного профиля: {e}")
@@ -4237,7 +4484,7 @@ def get_user_tracks(request, user_id):
             }, status=status.HTTP_200_OK)
 
         # ✅ ВАЖНО: никаких author, никаких Count — всё уже есть в модели
-        tracks = (
+        tracks = defer_waveform(
             Track.objects
             .filter(
                 uploaded_by_id=user.id,
@@ -4286,104 +4533,19 @@ def get_user_stats(request, user_id):
     - total_likes: суммарное количество лайков всех треков
     - total_reposts: суммарное количество репостов всех треков
     - total_comments: суммарное количество комментариев под всеми треками
+    🔥 Только чтение: статистика берётся из кэша (версионный ключ, сбрасывается
+    событиями подписок/треков/лайков), снимки UserDailyStats пишет команда snapshot_user_stats.
     """
+    from .user_stats import get_cached_user_stats
+
     try:
-        user = get_object_or_404(CustomUser, id=user_id)
-        
-        # Базовая статистика
-        stats = {
-            'followers': 0,
-            'following': 0,
-            'tracks': 0,
-            'playlists': 0,
-            'total_listens': 0,
-            'total_likes': 0,
-            'total_reposts': 0,
-            'total_comments': 0  # ✅ Добавлено поле для комментариев
-        }
-        
-        # Подписчики и подписки
-        if HAS_FOLLOW:
-            stats['followers'] = Follow.objects.filter(following=user).count()
-            stats['following'] = Follow.objects.filter(follower=user).count()
-        
-        # Статистика по трекам
-        if HAS_TRACK:
-            # Получаем все опубликованные треки пользователя
-            tracks = Track.objects.filter(uploaded_by=user, status='published')
-            
-            # Количество треков
-            stats['tracks'] = tracks.count()
-            
-            if stats['tracks'] > 0:
-                # Суммируем метрики по всем трекам
-                # Используем aggregate для лучшей производительности
-                from django.db.models import Sum
-                
-                track_stats = tracks.aggregate(
-                    total_listens=Sum('play_count'),
-                    total_likes=Sum('like_count'),
-                    total_reposts=Sum('repost_count'),
-                    total_comments=Sum('comment_count')
-                )
-                
-                stats['total_listens'] = track_stats['total_listens'] or 0
-                stats['total_likes'] = track_stats['total_likes'] or 0
-                stats['total_reposts'] = track_stats['total_reposts'] or 0
-                stats['total_comments'] = track_stats['total_comments'] or 0
-                
-                # Дополнительно можно посчитать комментарии через TrackComment
-                # для перекрестной проверки (опционально)
-                # comments_count = TrackComment.objects.filter(
-                #     track__uploaded_by=user,
-                #     is_deleted=False
-                # ).count()
-                # if comments_count != stats['total_comments']:
-                #     logger.warning(f"Несоответствие комментариев для user {user_id}: "
-                #                  f"track.comment_count={stats['total_comments']}, "
-                #                  f"TrackComment={comments_count}")
-        
-        # Количество плейлистов пользователя
-        from .models import Playlist
-        stats['playlists'] = Playlist.objects.filter(created_by=user).count()
-        
+        user = get_object_or_404(CustomUser.objects.only('id', 'username'), id=user_id)
+
+        stats, computed_at, from_cache = get_cached_user_stats(user.id)
+
         # Получаем сегодняшнюю дату для информации
         today = timezone.localdate().strftime('%Y-%m-%d')
-        
-        # Пытаемся получить или создать запись в UserDailyStats для сегодня
-        try:
-            from .models import UserDailyStats
-            
-            # Проверяем, есть ли запись за сегодня
-            daily_stats, created = UserDailyStats.objects.get_or_create(
-                user=user,
-                date=today,
-                defaults={
-                    'followers': stats['followers'],
-                    'following': stats['following'],
-                    'tracks': stats['tracks'],
-                    'total_listens': stats['total_listens'],
-                    'total_likes': stats['total_likes'],
-                    'total_reposts': stats['total_reposts'],
-                    'total_comments': stats['total_comments'],
-                }
-            )
-            
-            # Если запись уже существовала, обновляем её
-            if not created:
-                daily_stats.followers = stats['followers']
-                daily_stats.following = stats['following']
-                daily_stats.tracks = stats['tracks']
-                daily_stats.total_listens = stats['total_listens']
-                daily_stats.total_likes = stats['total_likes']
-                daily_stats.total_reposts = stats['total_reposts']
-                daily_stats.total_comments = stats['total_comments']
-                daily_stats.save()
-                
-        except Exception as e:
-            # Логируем ошибку, но не прерываем выполнение
-            logger.error(f"Ошибка при обновлении UserDailyStats для user {user_id}: {e}")
-        
+
         # Формируем успешный ответ
         return Response({
             'success': True,
@@ -4391,7 +4553,8 @@ def get_user_stats(request, user_id):
             'username': user.username,
             'stats': stats,
             'date': today,
-            'last_updated': timezone.now().isoformat(),
+            'last_updated': computed_at,
+            'cached': from_cache,
         }, status=status.HTTP_200_OK)
         
     except CustomUser.DoesNotExist:
@@ -4408,48 +4571,6 @@ def get_user_stats(request, user_id):
             'error': 'Не удалось получить статистику'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-def _end_of_day_dt(day_date):
-    tz = timezone.get_current_timezone()
-    # конец дня = начало следующего дня
-    return timezone.make_aware(datetime.combine(day_date + timedelta(days=1), time.min), tz)
-
-def _compute_user_totals_as_of(user, day_date):
-    end_dt = _end_of_day_dt(day_date)
-
-    followers = Follow.objects.filter(following=user, created_at__lt=end_dt).count()
-    following = Follow.objects.filter(follower=user, created_at__lt=end_dt).count()
-
-    tracks_qs = Track.objects.filter(uploaded_by=user, status='published', created_at__lt=end_dt)
-
-    tracks = tracks_qs.count()
-
-    # ✅ totals по трекам (как у тебя в get_user_stats)
-    total_listens = 0
-    total_likes = 0
-    total_reposts = 0
-
-    for t in tracks_qs.only('id', 'play_count', 'like_count', 'repost_count'):
-        total_listens += int(getattr(t, 'play_count', 0) or 0)
-        total_likes += int(getattr(t, 'like_count', 0) or 0)
-        total_reposts += int(getattr(t, 'repost_count', 0) or 0)
-
-    # ✅ comments: считаем реальные комменты под треками до конца дня
-    total_comments = TrackComment.objects.filter(
-        track__uploaded_by=user,
-        is_deleted=False,
-        created_at__lt=end_dt
-    ).count()
-
-    return {
-        'followers': followers,
-        'following': following,
-        'tracks': tracks,
-        'total_listens': total_listens,
-        'total_likes': total_likes,
-        'total_reposts': total_reposts,
-        'total_comments': total_comments,
-    }
-
 from datetime import datetime, timedelta, time
 from django.utils import timezone
 from .models import UserDailyStats, Follow, Track, TrackLike, TrackRepost, TrackAnalytics, TrackComment
@@ -4472,38 +4593,23 @@ def get_user_stats_history(request, user_id):
     today = timezone.localdate()
     start = today - timedelta(days=days - 1)
 
+    # 🔥 Один диапазонный запрос по снимкам; пропуски - одним проходом + bulk_create
+    from .user_stats import get_user_stats_history_points
+
     points = []
-    cur = start
-    while cur <= today:
-        obj = UserDailyStats.objects.filter(user=user, date=cur).first()
-
-        # если нет снимка за этот день — вычисляем и сохраняем (backfill)
-        if not obj:
-            totals = _compute_user_totals_as_of(user, cur)
-            obj = UserDailyStats.objects.create(user=user, date=cur, **totals)
-        else:
-            # если это сегодня — обновляем (чтобы прямо сейчас было актуально)
-            if cur == today:
-                totals = _compute_user_totals_as_of(user, cur)
-                for k, v in totals.items():
-                    setattr(obj, k, v)
-                obj.save()
-
-        label = cur.strftime('%d.%m')
+    for row in get_user_stats_history_points(user, start, today):
         points.append({
-            'date': str(cur),
-            'label': label,
-            'followers': obj.followers,
-            'following': obj.following,
-            'tracks': obj.tracks,
-            'total_listens': obj.total_listens,
-            'total_likes': obj.total_likes,
-            'total_reposts': obj.total_reposts,
-            'total_comments': obj.total_comments,
+            'date': str(row['date']),
+            'label': row['date'].strftime('%d.%m'),
+            'followers': row['followers'],
+            'following': row['following'],
+            'tracks': row['tracks'],
+            'total_listens': row['total_listens'],
+            'total_likes': row['total_likes'],
+            'total_reposts': row['total_reposts'],
+            'total_comments': row['total_comments'],
         })
 
-        cur += timedelta(days=1)
-
     # распакуем в серии для фронта
     series = {
         'followers': [{'label': p['label'], 'value': p['followers']} for p in points],
@@ -4652,19 +4758,18 @@ def get_user_followers(request, user_id):
         # ✅ Правильно: кто подписан НА этого пользователя (following=user)
         followers_relations = Follow.objects.filter(
             following=user  # ✅ Этот пользователь - цель подписки
-        ).select_related('follower').order_by('-created_at')
+        ).select_related('follower')
         
-        # Пагинация
-        page = request.GET.get('page', 1)
+        # Пагинация: курсор (?cursor=) или ?page=N; total - денормализованный счётчик, без COUNT(*)
+        from .pagination import InvalidCursor, paginate_queryset
         per_page = min(int(request.GET.get('per_page', 20)), 50)
         
-        from django.core.paginator import Paginator
-        paginator = Paginator(followers_relations, per_page)
-        
         try:
-            followers_page = paginator.page(page)
-        except:
-            followers_page = paginator.page(1)
+            followers_page, pagination = paginate_queryset(
+                followers_relations, request, ['-created_at', '-id'], per_page, total=user.followers_count
+            )
+        except InvalidCursor as e:
+            return Response({'success': False, 'error': str(e)}, status=400)
         
         followers = []
         for follow in followers_page:
@@ -4710,12 +4815,13 @@ def get_user_followers(request, user_id):
             'success': True,
             'followers': followers,
             'pagination': {
-                'current_page': followers_page.number,
-                'total_pages': paginator.num_pages,
-                'total_count': paginator.count,
-                'has_next': followers_page.has_next(),
-                'has_previous': followers_page.has_previous(),
-                'per_page': per_page
+                'current_page': pagination['page'],
+                'total_pages': max(1, -(-user.followers_count // per_page)),
+                'total_count': user.followers_count,
+                'has_next': pagination['has_next'],
+                'has_previous': bool(request.GET.get('cursor')) or (pagination['page'] or 1) > 1,
+                'per_page': per_page,
+                'next_cursor': pagination['next_cursor']
             },
             'user': {
                 'id': user.id,
@@ -4744,19 +4850,18 @@ def get_user_following(request, user_id):
         # ✅ Правильно: на кого подписан этот пользователь (follower=user)
         following_relations = Follow.objects.filter(
             follower=user  # ✅ Этот пользователь - подписчик
-        ).select_related('following').order_by('-created_at')
+        ).select_related('following')
         
-        # Пагинация
-        page = request.GET.get('page', 1)
+        # Пагинация: курсор (?cursor=) или ?page=N; total - денормализованный счётчик, без COUNT(*)
+        from .pagination import InvalidCursor, paginate_queryset
         per_page = min(int(request.GET.get('per_page', 20)), 50)
         
-        from django.core.paginator import Paginator
-        paginator = Paginator(following_relations, per_page)
-        
         try:
-            following_page = paginator.page(page)
-        except:
-            following_page = paginator.page(1)
+            following_page, pagination = paginate_queryset(
+                following_relations, request, ['-created_at', '-id'], per_page, total=user.following_count
+            )
+        except InvalidCursor as e:
+            return Response({'success': False, 'error': str(e)}, status=400)
         
         following = []
         for follow in following_page:
@@ -4806,12 +4911,13 @@ def get_user_following(request, user_id):
             'success': True,
             'following': following,
             'pagination': {
-                'current_page': following_page.number,
-                'total_pages': paginator.num_pages,
-                'total_count': paginator.count,
-                'has_next': following_page.has_next(),
-                'has_previous': following_page.has_previous(),
-                'per_page': per_page
+                'current_page': pagination['page'],
+                'total_pages': max(1, -(-user.following_count // per_page)),
+                'total_count': user.following_count,
+                'has_next': pagination['has_next'],
+                'has_previous': bool(request.GET.get('cursor')) or (pagination['page'] or 1) > 1,
+                'per_page': per_page,
+                'next_cursor': pagination['next_cursor']
             },
             'user': {
                 'id': user.id,
@@ -5069,9 +5175,9 @@ def get_user_reposts(request, user_id):
         target_user = get_object_or_404(CustomUser, id=user_id)
 
         # Записи репостов самого пользователя
-        repost_qs = TrackRepost.objects.filter(
+        repost_qs = defer_waveform(TrackRepost.objects.filter(
             user=target_user
-        ).select_related('track', 'track__uploaded_by').order_by('-reposted_at')
+        ).select_related('track', 'track__uploaded_by'), prefix='track__').order_by('-reposted_at')
 
         # Сериализуем только трек (весь объект репоста нам не нужен)
         tracks = [r.track for r in repost_qs]
@@ -5274,18 +5380,18 @@ def get_user_liked_tracks_public(request, user_id):
         liked_at_map = {}
 
         if HAS_TRACK_LIKE:
-            likes_qs = (TrackLike.objects
-                        .filter(user=target_user)
-                        .select_related('track', 'track__uploaded_by')
-                        .order_by('-liked_at'))
+            likes_qs = defer_waveform(TrackLike.objects
+                                      .filter(user=target_user)
+                                      .select_related('track', 'track__uploaded_by')
+                                      .order_by('-liked_at'), prefix='track__')
             tracks = [l.track for l in likes_qs]
             liked_at_map = {l.track_id: l.liked_at.isoformat() for l in likes_qs}
 
         elif HAS_USER_TRACK_INTERACTION:
-            interactions = (UserTrackInteraction.objects
-                            .filter(user=target_user, liked=True)
-                            .select_related('track', 'track__uploaded_by')
-                            .order_by('-liked_at'))
+            interactions = defer_waveform(UserTrackInteraction.objects
+                                          .filter(user=target_user, liked=True)
+                                          .select_related('track', 'track__uploaded_by')
+                                          .order_by('-liked_at'), prefix='track__')
             tracks = [i.track for i in interactions]
             liked_at_map = {i.track_id: i.liked_at.isoformat() for i in interactions}
 
@@ -5512,46 +5618,43 @@ def get_user_comments_users(request, user_id):
 @permission_classes([AllowAny])
 def search_tracks(request):
     """
-    GET /api/tracks/search/?q=xxx&page=1&per_page=24
-    Ищем по title (и чуть-чуть по username автора).
+    GET /api/tracks/search/?q=xxx&per_page=24&cursor=...
+    Ищем по title, артисту, username автора и тегам.
+    🔎 Полнотекстовый индекс FTS5 (search_index): ранжирование bm25, слова - префиксы.
+    Пагинация - курсором (pagination.next_cursor); ?page=N оставлен для старых клиентов.
+    COUNT(*) только по запросу: ?with_total=1.
     """
     from .models import Track
-    from .serializers import CompactTrackSerializer
+    from .serializers import CompactTrackSerializer, prefetch_track_relations
+    from .search_index import full_text_filter
+    from .pagination import InvalidCursor, paginate_queryset
 
     q = (request.GET.get('q') or '').strip()
-    page = int(request.GET.get('page') or 1)
     per_page = int(request.GET.get('per_page') or 24)
-    page = max(1, page)
     per_page = min(max(1, per_page), 60)
 
     if not q:
-        return Response({'success': True, 'tracks': [], 'pagination': {'page': page, 'per_page': per_page, 'total': 0}}, status=200)
-
-    qs = (Track.objects
-          .filter(status='published')
-          .select_related('uploaded_by')
-          .filter(
-              Q(title__icontains=q) |
-              Q(uploaded_by__username__icontains=q)
-          )
-          .order_by('-created_at'))
-
-    total = qs.count()
-    start = (page - 1) * per_page
-    end = start + per_page
-    tracks = qs[start:end]
+        return Response({'success': True, 'tracks': [], 'pagination': {'per_page': per_page, 'total': 0, 'has_next': False, 'next_cursor': None}}, status=200)
+
+    qs, ranked = full_text_filter(
+        Track.objects.filter(status='published'),
+        q,
+        Q(title__icontains=q) | Q(uploaded_by__username__icontains=q)
+    )
+    ordering = ['search_index__rank', '-created_at', '-id'] if ranked else ['-created_at', '-id']
+    total = qs.count() if request.GET.get('with_total') == '1' else None
+
+    try:
+        tracks, pagination = paginate_queryset(prefetch_track_relations(qs), request, ordering, per_page, total=total)
+    except InvalidCursor as e:
+        return Response({'success': False, 'error': str(e)}, status=400)
 
     data = CompactTrackSerializer(tracks, many=True, context={'request': request}).data
 
     return Response({
         'success': True,
         'tracks': data,
-        'pagination': {
-            'page': page,
-            'per_page': per_page,
-            'total': total,
-            'has_next': end < total
-        }
+        'pagination': pagination
     }, status=200)
 
 
@@ -5590,14 +5693,8 @@ def create_playlist(request):
                 playlist.cover = cover_file
                 playlist.save(update_fields=['cover'])
 
-            # пересобираем треки по порядку
-            for idx, tid in enumerate(track_ids):
-                PlaylistTrack.objects.create(
-                    playlist=playlist,
-                    track_id=tid,
-                    added_by=request.user,
-                    position=idx
-                )
+            # пересобираем треки по порядку (+ track_count / total_duration_seconds)
+            playlist.replace_tracks(track_ids, added_by=request.user)
 
         return Response({"playlist": PlaylistSerializer(playlist, context={"request": request}).data}, status=201)
 
@@ -5647,14 +5744,7 @@ def update_playlist(request, playlist_id: int):
                 playlist.save(update_fields=['cover'])
 
             if track_ids is not None:
-                PlaylistTrack.objects.filter(playlist=playlist).delete()
-                for idx, tid in enumerate(track_ids):
-                    PlaylistTrack.objects.create(
-                        playlist=playlist,
-                        track_id=tid,
-                        added_by=request.user,
-                        position=idx
-                    )
+                playlist.replace_tracks(track_ids, added_by=request.user)
 
         return Response({"playlist": PlaylistSerializer(playlist, context={"request": request}).data})
 
@@ -5700,8 +5790,7 @@ def save_playlist_copy(request, playlist_id: int):
             # cover: можно оставить пустым или сделать url
             cover_url=(src.get_cover_url() if hasattr(src, "get_cover_url") else (src.cover.url if src.cover else "")),
         )
-        for idx, tid in enumerate(items):
-            PlaylistTrack.objects.create(playlist=new_pl, track_id=tid, added_by=request.user, position=idx)
+        new_pl.replace_tracks(items, added_by=request.user)
 
     return Response({"playlist": PlaylistSerializer(new_pl, context={"request": request}).data}, status=201)
 
@@ -5721,6 +5810,39 @@ def get_user_playlists(request, user_id):
     }, status=200)
 
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def search_suggest(request):
+    """
+    GET /api/search/suggest/?q=xxx&limit=10&types=track,user,playlist,hashtag
+    🔎 Подсказки для строки поиска из префиксного индекса в памяти (suggest_index) -
+    без запросов к БД и без сериализаторов: только тип, id и подпись.
+    """
+    from time import perf_counter
+    from .suggest_index import SUGGEST_TYPES, suggest
+
+    q = (request.GET.get('q') or '').strip()
+    try:
+        limit = max(1, min(20, int(request.GET.get('limit', 10))))
+    except (TypeError, ValueError):
+        limit = 10
+
+    types = [t.strip() for t in (request.GET.get('types') or '').split(',') if t.strip() in SUGGEST_TYPES]
+
+    if not q:
+        return Response({'success': True, 'q': q, 'suggestions': []}, status=200)
+
+    started = perf_counter()
+    suggestions = suggest(q, limit=limit, types=set(types) or None)
+
+    return Response({
+        'success': True,
+        'q': q,
+        'suggestions': suggestions,
+        'took_ms': round((perf_counter() - started) * 1000, 2)
+    }, status=200)
+
+
 from django.db.models import Q
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
@@ -5731,10 +5853,16 @@ def search_hub(request):
     GET /api/search/?q=xxx&type=all|tracks|playlists|people
                    &tag=Techno&tag=Ambient
                    &country=Germany
-                   &page=1&per_page=20
+                   &per_page=20&cursor=...   (или &page=N для старых клиентов)
     """
-    from .models import Track, Playlist, CustomUser, Hashtag
-    from .serializers import CompactTrackSerializer, PlaylistSerializer, PublicUserSerializer
+    from .models import Track, Playlist, CustomUser
+    from .serializers import (
+        CompactTrackSerializer, PlaylistSerializer, PublicUserSerializer,
+        prefetch_playlist_relations, playlist_viewer_context, prefetch_track_relations,
+    )
+    from .trending import get_trending_hashtags as get_trending_hashtags_cached
+    from .search_index import full_text_filter, get_search_facets, normalize_search_key
+    from .pagination import InvalidCursor, paginate_queryset
 
     q = (request.GET.get('q') or '').strip()
     tab = (request.GET.get('type') or 'all').strip().lower()
@@ -5751,7 +5879,6 @@ def search_hub(request):
         except:
             return default
 
-    page = max(1, to_int(request.GET.get('page'), 1))
     per_page = min(max(1, to_int(request.GET.get('per_page'), 20)), 60)
 
     # --- базовые queryset-ы ---
@@ -5760,27 +5887,36 @@ def search_hub(request):
         .select_related('uploaded_by')
     )
 
+    # 🔎 текст ищем по FTS5-индексу (search_index), сортировка - по релевантности
+    def ordering(ranked):
+        return ['search_index__rank', '-created_at', '-id'] if ranked else ['-created_at', '-id']
+
+    def order(qs, ranked):
+        return qs.order_by(*ordering(ranked))
+
+    tracks_ranked = playlists_ranked = users_ranked = False
+
     if q:
-        tracks_qs = tracks_qs.filter(
+        tracks_qs, tracks_ranked = full_text_filter(
+            tracks_qs, q,
             Q(title__icontains=q) |
             Q(uploaded_by__username__icontains=q)
         )
 
     if tags:
-        # AND по тегам (все выбранные должны быть у трека)
+        # AND по тегам (все выбранные должны быть у трека) - подзапросами, без JOIN + distinct
         for t in tags:
-            tracks_qs = tracks_qs.filter(hashtags__name__iexact=t)
+            tracks_qs = tracks_qs.filter(
+                id__in=Track.hashtags.through.objects.filter(hashtag__name__iexact=t).values('track_id')
+            )
 
-    tracks_qs = tracks_qs.order_by('-created_at').distinct()
+    tracks_qs = order(tracks_qs, tracks_ranked)
 
-    playlists_qs = (Playlist.objects
-        .filter(visibility='public')
-        .select_related('created_by')
-        .prefetch_related('tracks')
-    )
+    playlists_qs = Playlist.objects.filter(visibility='public')
 
     if q:
-        playlists_qs = playlists_qs.filter(
+        playlists_qs, playlists_ranked = full_text_filter(
+            playlists_qs, q,
             Q(title__icontains=q) |
             Q(description__icontains=q) |
             Q(created_by__username__icontains=q)
@@ -5789,14 +5925,17 @@ def search_hub(request):
     if tags:
         # плейлист подходит, если в нём есть треки с тегами
         for t in tags:
-            playlists_qs = playlists_qs.filter(tracks__hashtags__name__iexact=t)
+            playlists_qs = playlists_qs.filter(
+                id__in=PlaylistTrack.objects.filter(track__hashtags__name__iexact=t).values('playlist_id')
+            )
 
-    playlists_qs = playlists_qs.order_by('-created_at').distinct()
+    playlists_qs = order(playlists_qs, playlists_ranked)
 
     users_qs = CustomUser.objects.all()
 
     if q:
-        users_qs = users_qs.filter(
+        users_qs, users_ranked = full_text_filter(
+            users_qs, q,
             Q(username__icontains=q) |
             Q(bio__icontains=q) |
             Q(country__icontains=q)
@@ -5805,45 +5944,21 @@ def search_hub(request):
     if country:
         users_qs = users_qs.filter(country__iexact=country)
 
-    users_qs = users_qs.order_by('-created_at').distinct()
-
-    # --- counts для заголовка "Found ..." ---
-    counts = {
-        "tracks": tracks_qs.count(),
-        "playlists": playlists_qs.count(),
-        "people": users_qs.count(),
-    }
+    users_qs = order(users_qs, users_ranked)
 
-    # --- фильтры слева ---
-    # страны из результата people
-    available_countries = list(
-        users_qs.exclude(country='')
-               .values_list('country', flat=True)
-               .distinct()[:60]
+    # --- counts + фасеты (теги/жанры/страны со счётчиками): один проход, кэш на минуту ---
+    facet_data = get_search_facets(
+        normalize_search_key(q, tags, country), tracks_qs, playlists_qs, users_qs
     )
+    counts = facet_data['counts']
+    facets = facet_data['facets']
 
-    # теги из результата tracks (плюс можно добавить trending)
-    available_tags = list(
-        tracks_qs.values_list('hashtags__name', flat=True)
-                 .exclude(hashtags__name__isnull=True)
-                 .exclude(hashtags__name__exact='')
-                 .distinct()[:40]
-    )
+    # трендовые теги - из кэша (trending.get_trending_hashtags), не запросом на каждый поиск
+    trending_tags = [tag['name'] for tag in get_trending_hashtags_cached(limit=20)]
 
-    trending_tags = list(
-        Hashtag.objects.order_by('-usage_count').values_list('name', flat=True)[:20]
-    )
-
-    def paginate(qs):
-        total = qs.count()
-        start = (page - 1) * per_page
-        end = start + per_page
-        return qs[start:end], {
-            "page": page,
-            "per_page": per_page,
-            "total": total,
-            "has_next": end < total
-        }
+    # keyset-пагинация вкладок (pagination.next_cursor); total - из фасетов, без отдельного COUNT
+    def paginate(qs, ranked, total):
+        return paginate_queryset(qs, request, ordering(ranked), per_page, total=total)
 
     payload = {
         "success": True,
@@ -5855,35 +5970,53 @@ def search_hub(request):
         },
         "counts": counts,
         "filters": {
-            "countries": available_countries,
-            "tags": available_tags,
+            # списки значений (совместимость) + те же значения со счётчиками в facets
+            "countries": [f['country'] for f in facets['countries']],
+            "tags": [f['name'] for f in facets['tags']],
             "trending_tags": trending_tags
-        }
+        },
+        "facets": facets
     }
 
     # --- выдача по вкладке ---
+    try:
+        if tab == 'tracks':
+            items, pagination = paginate(prefetch_track_relations(tracks_qs), tracks_ranked, counts['tracks'])
+        elif tab == 'playlists':
+            items, pagination = paginate(prefetch_playlist_relations(playlists_qs), playlists_ranked, counts['playlists'])
+        elif tab == 'people':
+            items, pagination = paginate(users_qs, users_ranked, counts['people'])
+    except InvalidCursor as e:
+        return Response({'success': False, 'error': str(e)}, status=400)
+
     if tab == 'tracks':
-        items, pagination = paginate(tracks_qs)
         payload["tracks"] = CompactTrackSerializer(items, many=True, context={"request": request}).data
         payload["pagination"] = pagination
         return Response(payload, status=200)
 
+    def serialize_playlists(items):
+        # счётчики - колонки плейлиста, лайки/репосты зрителя - множествами
+        items = list(items)
+        return PlaylistSerializer(
+            items,
+            many=True,
+            context=playlist_viewer_context(request, [p.id for p in items])
+        ).data
+
     if tab == 'playlists':
-        items, pagination = paginate(playlists_qs)
-        payload["playlists"] = PlaylistSerializer(items, many=True, context={"request": request}).data
+        payload["playlists"] = serialize_playlists(items)
         payload["pagination"] = pagination
         return Response(payload, status=200)
 
     if tab == 'people':
-        items, pagination = paginate(users_qs)
         payload["people"] = PublicUserSerializer(items, many=True, context={"request": request}).data
         payload["pagination"] = pagination
         return Response(payload, status=200)
 
     # tab == all
     payload["people"] = PublicUserSerializer(users_qs[:6], many=True, context={"request": request}).data
-    payload["tracks"] = CompactTrackSerializer(tracks_qs[:12], many=True, context={"request": request}).data
-    payload["playlists"] = PlaylistSerializer(playlists_qs[:6], many=True, context={"request": request}).data
+    payload["tracks"] = CompactTrackSerializer(prefetch_track_relations(tracks_qs)[:12], many=True, context={"request": request}).data
+    payload["playlists"] = serialize_playlists(prefetch_playlist_relations(playlists_qs)[:6])
 
     return Response(payload, status=200)
 
@@ -5920,16 +6053,18 @@ def toggle_playlist_like(request, playlist_id):
     playlist = get_object_or_404(Playlist, id=playlist_id)
 
     # Проверка, есть ли уже лайк от этого пользователя
-    existing_like = PlaylistLike.objects.filter(user=request.user, playlist=playlist).first()
+    # Лайк и F()-инкремент likes_count (сигнал) - в одной транзакции
+    with transaction.atomic():
+        existing_like = PlaylistLike.objects.filter(user=request.user, playlist=playlist).first()
 
-    if existing_like:
-        # Если лайк уже есть, удаляем его
-        existing_like.delete()
-        return Response({'success': False, 'message': 'Playlist unliked'})
-    else:
-        # Если лайка нет, создаем новый
-        PlaylistLike.objects.create(user=request.user, playlist=playlist)
-        return Response({'success': True, 'message': 'Playlist liked'})
+        if existing_like:
+            # Если лайк уже есть, удаляем его
+            existing_like.delete()
+            return Response({'success': False, 'message': 'Playlist unliked'})
+        else:
+            # Если лайка нет, создаем новый
+            PlaylistLike.objects.create(user=request.user, playlist=playlist)
+            return Response({'success': True, 'message': 'Playlist liked'})
 
 
 @api_view(['POST'])
@@ -5938,23 +6073,25 @@ def toggle_playlist_repost(request, playlist_id):
     playlist = get_object_or_404(Playlist, id=playlist_id)
 
     # Проверка, есть ли уже репост от этого пользователя
-    existing_repost = PlaylistRepost.objects.filter(user=request.user, playlist=playlist).first()
+    # Репост и F()-инкремент reposts_count (сигнал) - в одной транзакции
+    with transaction.atomic():
+        existing_repost = PlaylistRepost.objects.filter(user=request.user, playlist=playlist).first()
 
-    if existing_repost:
-        # Если репост уже есть, удаляем его
-        existing_repost.delete()
-        return Response({'success': False, 'message': 'Playlist unreposted'})
-    else:
-        # Если репоста нет, создаем новый
-        PlaylistRepost.objects.create(user=request.user, playlist=playlist)
-        return Response({'success': True, 'message': 'Playlist reposted'})
+        if existing_repost:
+            # Если репост уже есть, удаляем его
+            existing_repost.delete()
+            return Response({'success': False, 'message': 'Playlist unreposted'})
+        else:
+            # Если репоста нет, создаем новый
+            PlaylistRepost.objects.create(user=request.user, playlist=playlist)
+            return Response({'success': True, 'message': 'Playlist reposted'})
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_playlist_like_status(request, playlist_id: int):
     playlist = get_object_or_404(Playlist, id=playlist_id)
     liked = PlaylistLike.objects.filter(user=request.user, playlist=playlist).exists()
-    count = PlaylistLike.objects.filter(playlist=playlist).count()
+    count = playlist.likes_count
     return Response({'success': True, 'liked': liked, 'like_count': count})
 
 
@@ -5963,7 +6100,7 @@ def get_playlist_like_status(request, playlist_id: int):
 def get_playlist_repost_status(request, playlist_id: int):
     playlist = get_object_or_404(Playlist, id=playlist_id)
     reposted = PlaylistRepost.objects.filter(user=request.user, playlist=playlist).exists()
-    count = PlaylistRepost.objects.filter(playlist=playlist).count()
+    count = playlist.reposts_count
     return Response({'success': True, 'reposted': reposted, 'repost_count': count})
 
 def _safe_user_card(u: CustomUser):
@@ -7141,7 +7278,7 @@ def admin_list_users_tracks(request):
 
     payload = []
     for u in users:
-        tracks_qs = (
+        tracks_qs = defer_waveform(
             Track.objects
             .filter(uploaded_by=u)
             .annotate(
@@ -7264,8 +7401,8 @@ def admin_delete_track(request, track_id):
 
         # 5️⃣ Связи с плейлистами (промежуточная таблица)
         try:
-            from .models import PlaylistTrack
-            PlaylistTrack.objects.filter(track_id=track_id).delete()
+            from .models import Playlist
+            Playlist.detach_track(track_id)  # со счётчиками плейлистов
         except (ImportError, AttributeError):
             pass
 
@@ -7551,6 +7688,17 @@ def create_ban_appeal(request):
     return Response({'success': True, 'id': appeal.id}, status=201)
 
 
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def admin_play_protection_stats(request):
+    """
+    Счётчики лимитера прослушиваний (разрешено / отклонено по областям) и текущие лимиты
+    """
+    from .utils.play_protection import get_play_protection_stats
+
+    return Response({'success': True, **get_play_protection_stats()})
+
+
 @api_view(['GET'])
 @permission_classes([IsAdminUser])
 def admin_list_appeals(request):
@@ -8198,8 +8346,8 @@ def made_for_you_ai(request):
     # исключим уже слушанное (чтобы давать новое)
     cand = cand.exclude(id__in=listened_ids)
 
-    # сортируем по популярности
-    cand = cand.order_by('-like_count', '-play_count')[:30]
+    # сортируем: сначала "в тренде" (индекс), затем по популярности
+    cand = cand.order_by('-trending_score', '-like_count', '-play_count')[:30]
 
     candidates = []
     for t in cand:
@@ -8214,7 +8362,7 @@ def made_for_you_ai(request):
 
     # fallback если пусто
     if not candidates:
-        fallback = base_q.order_by('-like_count', '-play_count')[:30]
+        fallback = base_q.order_by('-trending_score', '-like_count', '-play_count')[:30]
         for t in fallback:
             candidates.append({
                 "id": t.id,
@@ -8231,7 +8379,7 @@ def made_for_you_ai(request):
     reasons = out.get("reasons") or {}
 
     # 5) грузим треки в нужном порядке
-    tracks_map = {t.id: t for t in Track.objects.filter(id__in=ids_ranked)}
+    tracks_map = {t.id: t for t in defer_waveform(Track.objects.filter(id__in=ids_ranked))}
     ordered = [tracks_map[i] for i in ids_ranked if i in tracks_map]
 
     data = CompactTrackSerializer(ordered, many=True, context={'request': request}).data
@@ -8258,7 +8406,7 @@ def playlists_for_you_ai(request):
     from django.db.models.functions import Coalesce
     from django.db.models.expressions import ExpressionWrapper
     from .models import Playlist, PlaylistTrack, Track, TrackLike, PlayHistory
-    from .serializers import PlaylistSerializer
+    from .serializers import PlaylistSerializer, prefetch_playlist_relations, playlist_viewer_context
     from .ai_ollama import recommend_playlists_for_user
 
     user = request.user
@@ -8313,22 +8461,32 @@ def playlists_for_you_ai(request):
             Coalesce(F('match_genre'), 0) * 1,    # любимые жанры
             output_field=IntegerField()
         )
-    ).order_by('-score', '-likes_count', '-created_at')[:40]  # берем чуть больше для AI
+    ).select_related('created_by').order_by('-score', '-likes_count', '-created_at')[:40]  # берем чуть больше для AI
+
+    def genres_by_playlist(playlist_ids):
+        """Жанры треков всех кандидатов одним запросом (вместо p.tracks.all() на каждый)"""
+        result = {}
+        rows = (PlaylistTrack.objects
+            .filter(playlist_id__in=playlist_ids)
+            .exclude(track__genre='')
+            .values_list('playlist_id', 'track__genre')
+            .distinct())
+        for playlist_id, genre in rows:
+            result.setdefault(playlist_id, []).append(genre)
+        return result
 
     # 4) Подготовка кандидатов для AI
+    qs = list(qs)
+    genres_map = genres_by_playlist([p.id for p in qs])
     candidates = []
     for p in qs:
-        # получаем жанры треков в плейлисте
-        playlist_tracks = p.tracks.all()[:10]  # ограничим для производительности
-        genres = list(set(t.genre for t in playlist_tracks if t.genre))
-        
         candidates.append({
             "id": p.id,
             "title": p.title,
             "creator": getattr(p.created_by, 'username', ''),
-            "tracks_count": p.tracks.count(),
+            "tracks_count": p.track_count,
             "likes_count": p.likes_count or 0,
-            "genres": genres[:5],  # топ жанров в плейлисте
+            "genres": genres_map.get(p.id, [])[:5],  # топ жанров в плейлисте
             "match_liked": int(getattr(p, 'match_liked', 0) or 0),
             "match_recent": int(getattr(p, 'match_recent', 0) or 0),
             "match_genre": int(getattr(p, 'match_genre', 0) or 0),
@@ -8337,21 +8495,20 @@ def playlists_for_you_ai(request):
 
     # Если кандидатов мало, добавим популярные плейлисты как fallback
     if len(candidates) < 5:
-        popular = Playlist.objects.filter(visibility='public')\
-            .exclude(id__in=[c['id'] for c in candidates])\
-            .order_by('-likes_count', '-created_at')[:10]
-        
+        popular = list(Playlist.objects.filter(visibility='public')
+            .exclude(id__in=[c['id'] for c in candidates])
+            .select_related('created_by')
+            .order_by('-likes_count', '-created_at')[:10])
+        genres_map = genres_by_playlist([p.id for p in popular])
+
         for p in popular:
-            playlist_tracks = p.tracks.all()[:10]
-            genres = list(set(t.genre for t in playlist_tracks if t.genre))
-            
             candidates.append({
                 "id": p.id,
                 "title": p.title,
                 "creator": getattr(p.created_by, 'username', ''),
-                "tracks_count": p.tracks.count(),
+                "tracks_count": p.track_count,
                 "likes_count": p.likes_count or 0,
-                "genres": genres[:5],
+                "genres": genres_map.get(p.id, [])[:5],
                 "match_liked": 0,
                 "match_recent": 0,
                 "match_genre": 0,
@@ -8372,10 +8529,14 @@ def playlists_for_you_ai(request):
     reasons = out.get("reasons") or {}
 
     # 6) Загружаем плейлисты в правильном порядке
-    pl_map = {p.id: p for p in Playlist.objects.filter(id__in=ids_ranked).select_related('created_by')}
+    pl_map = {p.id: p for p in prefetch_playlist_relations(Playlist.objects.filter(id__in=ids_ranked))}
     ordered = [pl_map[i] for i in ids_ranked if i in pl_map]
 
-    data = PlaylistSerializer(ordered, many=True, context={'request': request}).data
+    data = PlaylistSerializer(
+        ordered,
+        many=True,
+        context=playlist_viewer_context(request, [p.id for p in ordered])
+    ).data
     
     # 7) Добавляем AI reasons (но на фронте мы их не показываем)
     for item in data:
@@ -8451,7 +8612,7 @@ def following_recommended_tracks(request):
     out = recommend_tracks_for_user(user_profile, candidates, limit=limit)
     ids_ranked = out.get("track_ids") or []
 
-    tracks_map = {t.id: t for t in Track.objects.filter(id__in=ids_ranked)}
+    tracks_map = {t.id: t for t in defer_waveform(Track.objects.filter(id__in=ids_ranked))}
     ordered = [tracks_map[i] for i in ids_ranked if i in tracks_map]
 
     data = CompactTrackSerializer(ordered, many=True, context={'request': request}).data
@@ -0,0 +1,314 @@
+# api/waveform_tasks.py
+"""
+🔥 Фоновая очередь анализа аудио (длительность, sample rate, битрейт, waveform).
+
+Очередь хранится в БД - в модели WaveformGenerationTask:
+  - upload_track / publish_track только ставят задачу (enqueue_track_analysis)
+  - команда `python manage.py process_waveform_tasks` забирает задачи
+    и выполняет их в пуле процессов (run_track_analysis)
+  - клиент опрашивает /api/track/<id>/processing-status/
+    или получает уведомление 'waveform_ready'
+
+⚠️ Модели импортируются ВНУТРИ функций: модуль загружается в дочерних
+процессах пула (spawn на Windows) ещё до django.setup().
+"""
+import os
+import time
+import logging
+from datetime import timedelta
+
+logger = logging.getLogger(__name__)
+
+# Сколько раз пробуем обработать трек, прежде чем оставить задачу в 'failed'
+MAX_ATTEMPTS = 3
+
+# Задача в 'processing' дольше этого времени считается брошенной (упал воркер)
+STALE_PROCESSING_TIMEOUT = timedelta(minutes=15)
+
+ACTIVE_STATUSES = ('pending', 'processing')
+
+# Количество столбиков waveform, сохраняемых в Track.waveform_data
+WAVEFORM_POINTS = 120
+
+# Поля трека, которые заполняет анализ (для save(update_fields) и bulk_update)
+ANALYSIS_FIELDS = [
+    'duration', 'duration_seconds', 'bitrate', 'sample_rate', '_duration_calculated',
+    'waveform_data', 'waveform_generated', 'waveform_generated_at', 'waveform_points',
+    'waveform_pyramid',
+]
+
+
+def shift_playlist_durations(deltas):
+    """
+    Длительность треков уточнилась: сдвигает total_duration_seconds плейлистов с ними.
+    deltas - {track_id: новая длительность - старая}. Плейлист получает сумму дельт
+    своих треков; плейлисты с одинаковой суммой - одним UPDATE.
+    """
+    from collections import defaultdict
+    from .models import Playlist, PlaylistTrack
+
+    deltas = {track_id: delta for track_id, delta in deltas.items() if delta}
+    if not deltas:
+        return 0
+
+    per_playlist = defaultdict(int)
+    for playlist_id, track_id in PlaylistTrack.objects.filter(
+            track_id__in=list(deltas)).values_list('playlist_id', 'track_id'):
+        per_playlist[playlist_id] += deltas[track_id]
+
+    by_delta = defaultdict(list)
+    for playlist_id, delta in per_playlist.items():
+        by_delta[delta].append(playlist_id)
+    for delta, playlist_ids in by_delta.items():
+        Playlist.bump_counters(playlist_ids, total_duration_seconds=delta)
+    return len(per_playlist)
+
+
+def enqueue_track_analysis(track):
+    """
+    Ставит трек в очередь анализа.
+    Если для трека уже есть активная задача - возвращает её (без дублей).
+    """
+    from .models import WaveformGenerationTask
+
+    task = WaveformGenerationTask.objects.filter(
+        track=track,
+        status__in=ACTIVE_STATUSES
+    ).order_by('-created_at').first()
+
+    if task:
+        logger.info(f"⏭️ Трек {track.id} уже в очереди анализа (задача {task.id}, {task.status})")
+        return task
+
+    task = WaveformGenerationTask.objects.create(track=track, status='pending')
+    logger.info(f"📥 Трек {track.id} поставлен в очередь анализа (задача {task.id})")
+    return task
+
+
+def get_track_processing_status(track):
+    """Статус последней задачи анализа трека (для опроса клиентом)"""
+    from .models import WaveformGenerationTask
+
+    task = WaveformGenerationTask.objects.filter(track=track).order_by('-created_at').first()
+
+    if task is None:
+        status = 'completed' if track.waveform_generated else 'not_queued'
+    else:
+        status = task.status
+
+    return {
+        'track_id': track.id,
+        'status': status,
+        'task_id': task.id if task else None,
+        'attempt_count': task.attempt_count if task else 0,
+        'error': task.error_message if task and task.status == 'failed' else '',
+        'waveform_generated': track.waveform_generated,
+        'duration': track.duration,
+        'duration_seconds': track.duration_seconds,
+    }
+
+
+def claim_pending_tasks(limit):
+    """
+    Забирает до `limit` задач из очереди.
+    Захват - условный UPDATE по статусу, поэтому несколько воркеров
+    (несколько запущенных команд) не возьмут одну задачу дважды.
+    started_at ставится в том же UPDATE - по нему reset_stale_tasks находит зависшие.
+    """
+    from django.utils import timezone
+    from .models import WaveformGenerationTask
+
+    candidate_ids = list(
+        WaveformGenerationTask.objects.filter(status='pending')
+        .order_by('created_at')
+        .values_list('id', flat=True)[:limit]
+    )
+
+    claimed = []
+    for task_id in candidate_ids:
+        updated = WaveformGenerationTask.objects.filter(
+            id=task_id,
+            status='pending'
+        ).update(status='processing', started_at=timezone.now())
+        if updated:
+            claimed.append(task_id)
+
+    return claimed
+
+
+def reset_stale_tasks(timeout=STALE_PROCESSING_TIMEOUT):
+    """
+    Задачи, зависшие в 'processing' (воркер упал): возвращает в очередь,
+    а исчерпавшие MAX_ATTEMPTS (attempt_count растёт ещё в start_processing) -
+    переводит в 'failed', чтобы enqueue_track_analysis не считал их активными.
+    Возвращает число задач, возвращённых в очередь.
+    """
+    from django.db.models import Q
+    from django.utils import timezone
+    from .models import WaveformGenerationTask
+
+    now = timezone.now()
+    border = now - timeout
+    # started_at IS NULL - задачи, захваченные до того, как захват стал ставить время
+    stale = WaveformGenerationTask.objects.filter(
+        Q(started_at__lt=border) | Q(started_at__isnull=True),
+        status='processing',
+    )
+
+    failed = stale.filter(attempt_count__gte=MAX_ATTEMPTS).update(
+        status='failed',
+        completed_at=now,
+        error_message=f'Воркер не завершил анализ за {MAX_ATTEMPTS} попыток (процесс упал или завис)',
+    )
+    if failed:
+        logger.error(f"❌ Зависшие задачи анализа переведены в 'failed': {failed}")
+
+    return stale.filter(attempt_count__lt=MAX_ATTEMPTS).update(status='pending')
+
+
+def init_worker_process():
+    """
+    Инициализатор процесса пула.
+    Поднимает Django (нужно при spawn) и закрывает унаследованные соединения с БД (при fork).
+    """
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'soundcloud.settings')
+    django.setup()
+
+    from django.db import connections
+    connections.close_all()
+
+
+def _analyze_track(track):
+    """
+    Вычисляет длительность, битрейт, sample rate, waveform и пирамиду waveform
+    за один проход декодирования (audio_analysis.analyze_audio).
+    Возвращает (waveform, пирамида в байтах или None).
+    """
+    from .audio_analysis import analyze_audio, format_duration, pack_waveform_pyramid
+    from .waveform_utils import generate_waveform_for_track
+
+    if track.audio_file and os.path.exists(track.audio_file.path):
+        analysis = analyze_audio(track.audio_file.path, num_points=WAVEFORM_POINTS)
+
+        if analysis['duration'] > 0:
+            track.duration = format_duration(analysis['duration'])
+            track.duration_seconds = int(analysis['duration'])
+            track._duration_calculated = True
+        track.sample_rate = analysis['sample_rate']
+        track.bitrate = analysis['bitrate']
+
+        return analysis['waveform'], pack_waveform_pyramid(analysis['pyramid'])
+
+    # Нет локального файла - waveform по audio_url (или демо)
+    return generate_waveform_for_track(track), None
+
+
+def run_track_analysis(task_id):
+    """
+    Обработка одной задачи (выполняется в процессе пула).
+    Возвращает (task_id, status) для отчёта команды.
+    """
+    from django.db import close_old_connections
+    from django.utils import timezone
+    from .models import WaveformGenerationTask, Notification, SystemLog
+
+    close_old_connections()
+
+    try:
+        task = WaveformGenerationTask.objects.select_related('track', 'track__uploaded_by').get(id=task_id)
+    except WaveformGenerationTask.DoesNotExist:
+        logger.warning(f"Задача {task_id} не найдена")
+        return task_id, 'missing'
+
+    task.start_processing()
+    track = task.track
+    started = time.time()
+    old_duration_seconds = track.duration_seconds or 0
+
+    try:
+        waveform, pyramid = _analyze_track(track)
+        if not waveform:
+            raise RuntimeError('Пустой waveform')
+
+        track.waveform_data = waveform
+        track.waveform_generated = True
+        track.waveform_generated_at = timezone.now()
+        track.waveform_points = len(waveform)
+        track.waveform_pyramid = pyramid
+        track.save(update_fields=ANALYSIS_FIELDS + ['updated_at'])
+
+        # Длительность уточнилась - сдвигаем total_duration_seconds плейлистов с этим треком
+        shift_playlist_durations({track.id: (track.duration_seconds or 0) - old_duration_seconds})
+
+        task.complete(points_count=len(waveform), processing_time=time.time() - started)
+        logger.info(f"✅ Анализ трека {track.id} завершён за {task.processing_time:.2f}с")
+
+        try:
+            Notification.objects.create(
+                user=track.uploaded_by,
+                type='waveform_ready',
+                title='🎵 Трек обработан',
+                content=f'Waveform для трека "{track.title}" готов',
+                related_track=track
+            )
+        except Exception as e:
+            logger.error(f"Ошибка при создании уведомления: {e}")
+
+        return task_id, 'completed'
+
+    except Exception as e:
+        logger.error(f"❌ Ошибка анализа трека {track.id} (задача {task_id}): {e}")
+        task.fail(str(e))
+
+        try:
+            SystemLog.objects.create(
+                level='error',
+                module='waveform',
+                message=f'Ошибка анализа трека {track.id}: {e}',
+                details={'task_id': task_id, 'attempt': task.attempt_count},
+                user=track.uploaded_by
+            )
+        except Exception:
+            pass
+
+        # Повторная попытка: возвращаем задачу в очередь
+        if task.attempt_count < MAX_ATTEMPTS:
+            WaveformGenerationTask.objects.filter(id=task_id, status='failed').update(status='pending')
+            return task_id, 'retry'
+
+        return task_id, 'failed'
+
+
+def analyze_track_values(track_id):
+    """
+    Для массовой перегенерации (generate_all_waveforms): анализирует трек
+    в процессе пула и возвращает значения полей БЕЗ сохранения -
+    родительский процесс пишет их пачкой через bulk_update.
+    """
+    from django.db import close_old_connections
+    from .models import Track
+
+    close_old_connections()
+
+    try:
+        track = Track.objects.get(id=track_id)
+        waveform, pyramid = _analyze_track(track)
+        if not waveform:
+            raise RuntimeError('Пустой waveform')
+
+        return {
+            'id': track_id,
+            'duration': track.duration,
+            'duration_seconds': track.duration_seconds,
+            'bitrate': track.bitrate,
+            'sample_rate': track.sample_rate,
+            '_duration_calculated': track._duration_calculated,
+            'waveform_data': waveform,
+            'waveform_points': len(waveform),
+            'waveform_pyramid': pyramid,
+        }
+
+    except Exception as e:
+        logger.error(f"❌ Ошибка анализа трека {track_id}: {e}")
+        return {'id': track_id, 'error': str(e)}
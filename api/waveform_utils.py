@@ -1,79 +1,26 @@
-import librosa
 import numpy as np
-import json
 import os
-import tempfile
 import requests
-from io import BytesIO
-from pydub import AudioSegment
 import logging
 from scipy import signal
 import math
-import subprocess
-import wave
-import struct
 
 logger = logging.getLogger(__name__)
 
 def get_audio_duration(file_path):
     """
     Определяет длительность аудиофайла в секундах
-    Использует несколько методов для надежности
+    (единый движок audio_analysis: заголовок ffprobe/soundfile/mutagen, затем декодирование)
     """
-    try:
-        # Метод 1: Используем ffprobe (самый надежный)
-        try:
-            cmd = [
-                'ffprobe', '-v', 'error',
-                '-show_entries', 'format=duration',
-                '-of', 'default=noprint_wrappers=1:nokey=1',
-                file_path
-            ]
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
-            if result.returncode == 0:
-                duration = float(result.stdout.strip())
-                logger.info(f"✅ Длительность определена через ffprobe: {duration:.2f}с")
-                return duration
-        except Exception as ffprobe_error:
-            logger.debug(f"ffprobe не сработал: {ffprobe_error}")
-        
-        # Метод 2: Используем wave для .wav файлов
-        if file_path.lower().endswith('.wav'):
-            try:
-                with wave.open(file_path, 'rb') as wav_file:
-                    frames = wav_file.getnframes()
-                    rate = wav_file.getframerate()
-                    duration = frames / float(rate)
-                    logger.info(f"✅ Длительность определена через wave: {duration:.2f}с")
-                    return duration
-            except Exception as wave_error:
-                logger.debug(f"wave не сработал: {wave_error}")
-        
-        # Метод 3: Используем pydub
-        try:
-            audio = AudioSegment.from_file(file_path)
-            duration = len(audio) / 1000.0  # миллисекунды -> секунды
-            logger.info(f"✅ Длительность определена через pydub: {duration:.2f}с")
-            return duration
-        except Exception as pydub_error:
-            logger.debug(f"pydub не сработал: {pydub_error}")
-        
-        # Метод 4: Используем librosa
-        try:
-            y, sr = librosa.load(file_path, sr=None, mono=True, duration=0)
-            duration = librosa.get_duration(y=y, sr=sr)
-            logger.info(f"✅ Длительность определена через librosa: {duration:.2f}с")
-            return duration
-        except Exception as librosa_error:
-            logger.debug(f"librosa не сработал: {librosa_error}")
-        
-        # Если все методы не сработали
-        logger.warning(f"⚠️ Не удалось определить длительность файла {file_path}")
-        return 180.0  # 3 минуты по умолчанию
-        
-    except Exception as e:
-        logger.error(f"❌ Критическая ошибка определения длительности: {e}")
-        return 180.0
+    from .audio_analysis import get_audio_duration as probe_duration
+
+    duration = probe_duration(file_path)
+    if duration > 0:
+        logger.info(f"✅ Длительность определена: {duration:.2f}с")
+        return duration
+
+    logger.warning(f"⚠️ Не удалось определить длительность файла {file_path}")
+    return 180.0  # 3 минуты по умолчанию
 
 def format_duration(seconds):
     """Форматирует секунды в MM:SS или HH:MM:SS"""
@@ -91,8 +38,12 @@ def format_duration(seconds):
 
 def analyze_audio_file(file_path, num_points=120, duration_sec=None):
     """
-    Продвинутый анализ аудиофайла с учетом длительности
+    Продвинутый анализ аудиофайла с учетом длительности.
+    Потоковый проход через audio_analysis: в памяти не больше одного блока PCM,
+    столбики считаются numpy-редукциями, сглаживание - свёрткой.
     """
+    from .audio_analysis import analyze_audio, envelope_to_waveform
+
     try:
         logger.info(f"🔍 Анализ аудиофайла: {file_path}")
         
@@ -100,9 +51,13 @@ def analyze_audio_file(file_path, num_points=120, duration_sec=None):
             logger.error(f"❌ Файл не найден: {file_path}")
             return None
         
-        # Определяем длительность если не передана
+        analysis = analyze_audio(file_path)
+        if not analysis['frames']:
+            logger.error("❌ Не удалось загрузить аудио данные")
+            return generate_demo_waveform(hash(file_path) % 1000, num_points, os.path.basename(file_path))
+        
         if duration_sec is None:
-            duration_sec = get_audio_duration(file_path)
+            duration_sec = analysis['duration']
         
         # Адаптируем количество точек к длительности
         if duration_sec < 30:  # Меньше 30 секунд
@@ -112,85 +67,7 @@ def analyze_audio_file(file_path, num_points=120, duration_sec=None):
         
         logger.info(f"📊 Длительность: {duration_sec:.2f}с, точек: {num_points}")
         
-        # Пробуем разные методы загрузки
-        y = None
-        sr = None
-        
-        # Метод 1: librosa с обработкой исключений
-        try:
-            y, sr = librosa.load(file_path, sr=22050, mono=True, duration=None)
-            logger.info(f"✅ Аудио загружено через librosa: {len(y)} сэмплов, {sr} Hz")
-        except Exception as librosa_error:
-            logger.warning(f"⚠️ librosa не смог загрузить файл: {librosa_error}")
-            
-            # Метод 2: pydub
-            try:
-                audio = AudioSegment.from_file(file_path)
-                samples = np.array(audio.get_array_of_samples())
-                if audio.channels == 2:
-                    samples = samples.reshape((-1, 2)).mean(axis=1)
-                sr = audio.frame_rate
-                y = samples.astype(np.float32) / (2 ** 15)  # Нормализация для 16-bit
-                logger.info(f"✅ Аудио загружено через pydub: {len(y)} сэмплов, {sr} Hz")
-            except Exception as pydub_error:
-                logger.error(f"❌ Не удалось загрузить аудио: {pydub_error}")
-                return generate_demo_waveform(hash(file_path) % 1000, num_points, os.path.basename(file_path))
-        
-        if y is None or sr is None:
-            logger.error("❌ Не удалось загрузить аудио данные")
-            return generate_demo_waveform(hash(file_path) % 1000, num_points, os.path.basename(file_path))
-        
-        # Нормализуем audio
-        if len(y) > 0:
-            y = y / (np.max(np.abs(y)) + 1e-8)
-        
-        # Разбиваем на сегменты для waveform
-        segment_size = max(1, len(y) // num_points)
-        waveform = []
-        
-        for i in range(num_points):
-            start = i * segment_size
-            end = min(start + segment_size, len(y))
-            
-            if start < len(y) and end > start:
-                segment = y[start:end]
-                
-                # Вычисляем RMS (среднеквадратичное значение)
-                rms = np.sqrt(np.mean(segment**2)) if len(segment) > 0 else 0
-                
-                # Логарифмическая шкала (dBFS)
-                if rms > 1e-8:  # Избегаем log(0)
-                    db = 20 * np.log10(rms)
-                    # Преобразуем dBFS (от -60 до 0 dB) в 0-100
-                    normalized = np.clip((db + 60) * (100 / 60), 10, 100)
-                else:
-                    normalized = 10.0
-                
-                # Добавляем немного динамики для тихих участков
-                if normalized < 15:
-                    normalized += np.random.uniform(0, 3)
-                
-                waveform.append(float(normalized))
-            else:
-                waveform.append(10.0)
-        
-        # Сглаживаем waveform для более приятного вида
-        if len(waveform) > 5:
-            try:
-                # Используем скользящее среднее вместо savgol для надежности
-                smoothed = []
-                for i in range(len(waveform)):
-                    start = max(0, i - 2)
-                    end = min(len(waveform), i + 3)
-                    window = waveform[start:end]
-                    smoothed.append(np.mean(window))
-                waveform = smoothed
-            except Exception as smooth_error:
-                logger.debug(f"Сглаживание не удалось: {smooth_error}")
-        
-        # Гарантируем, что waveform не пустой
-        if len(waveform) == 0:
-            waveform = [10.0] * num_points
+        waveform = envelope_to_waveform(analysis['envelope'], num_points)
         
         logger.info(f"✅ Waveform сгенерирован: {len(waveform)} точек, диапазон: {min(waveform):.1f}-{max(waveform):.1f}")
         return waveform
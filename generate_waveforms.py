@@ -4,11 +4,12 @@ import sys
 import json
 import time
 import numpy as np
-import librosa
 from pathlib import Path
 
 def analyze_audio_file_simple(audio_path, num_bars=60):
-    """Простой анализ аудиофайла без зависимостей от Django"""
+    """Простой анализ аудиофайла без зависимостей от Django (потоковый, постоянная память)"""
+    from api.audio_analysis import analyze_audio, envelope_rms
+    
     try:
         print(f"🔍 Анализируем файл: {os.path.basename(audio_path)}")
         
@@ -16,39 +17,14 @@ def analyze_audio_file_simple(audio_path, num_bars=60):
             print(f"❌ Файл не найден: {audio_path}")
             return None
         
-        # Загружаем аудио с пониженной частотой для скорости
-        y, sr = librosa.load(audio_path, sr=11025, mono=True)
-        
-        print(f"✅ Аудио загружено: {len(y):,} сэмплов, {sr} Гц, {len(y)/sr:.2f} секунд")
-        
-        # Вычисляем амплитуду
-        amplitude = np.abs(y)
-        
-        # Делим на равные части
-        chunk_size = len(amplitude) // num_bars
-        if chunk_size == 0:
-            chunk_size = 1
-        
-        print(f"🔢 Создаем {num_bars} палочек, размер чанка: {chunk_size:,}")
-        
-        # Вычисляем RMS для каждого чанка
-        bars = []
-        for i in range(num_bars):
-            start_idx = i * chunk_size
-            end_idx = min((i + 1) * chunk_size, len(amplitude))
-            
-            chunk = amplitude[start_idx:end_idx]
-            if len(chunk) > 0:
-                rms = np.sqrt(np.mean(chunk**2))
-                bars.append(float(rms))
-            else:
-                bars.append(0.0)
+        # Один потоковый проход по файлу
+        analysis = analyze_audio(audio_path)
         
-        bars = np.array(bars)
+        print(f"✅ Аудио обработано: {analysis['frames']:,} сэмплов, {analysis['analysis_sample_rate']} Гц, {analysis['duration']:.2f} секунд")
+        print(f"🔢 Создаем {num_bars} палочек")
         
-        # Нормализация
-        bars = bars + 0.0001  # Избегаем нулей
-        bars = np.log10(bars + 1)  # Логарифмическое преобразование
+        # RMS для каждого столбика - numpy-редукция по огибающей
+        bars = np.log10(envelope_rms(analysis['envelope'], num_bars) + 0.0001 + 1)  # Логарифмическое преобразование
         
         min_val = bars.min()
         max_val = bars.max()
@@ -58,9 +34,8 @@ def analyze_audio_file_simple(audio_path, num_bars=60):
         else:
             normalized_bars = np.ones_like(bars) * 50
         
-        # Округляем и ограничиваем
-        bar_heights = [int(round(h, 0)) for h in normalized_bars]
-        bar_heights = [max(10, min(100, h)) for h in bar_heights]  # 10-100%
+        # Округляем и ограничиваем 10-100%
+        bar_heights = np.clip(np.rint(normalized_bars), 10, 100).astype(int).tolist()
         
         print(f"✅ Waveform сгенерирован:")
         print(f"   - Палочек: {len(bar_heights)}")
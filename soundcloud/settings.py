@@ -125,6 +125,28 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# ==================== КЭШ ====================
+# Общий для всех процессов (веб, cron-команды, воркеры): трендовые хештеги,
+# которые прогревает update_trending_scores, лимитер прослушиваний,
+# кэш статистики пользователей, фасеты поиска.
+# По умолчанию - файловый кэш (без отдельного сервиса и без createcachetable);
+# в проде можно указать Redis/Memcached через CACHE_BACKEND / CACHE_LOCATION.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', os.path.join(BASE_DIR, 'cache')),
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '20000')),
+        },
+    }
+}
+
+# ==================== AUDIO ANALYSIS ====================
+# Пути к ffmpeg/ffprobe (на Windows указываем полный путь к .exe через .env)
+FFMPEG_BINARY = os.getenv('FFMPEG_BINARY', 'ffmpeg')
+FFPROBE_BINARY = os.getenv('FFPROBE_BINARY', 'ffprobe')
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -243,6 +265,44 @@ DEFAULT_FROM_EMAIL = 'noreply@musicplatform.dev'
 MAX_UPLOAD_SIZE = 50 * 1024 * 1024  # 50MB
 TURNSTILE_SECRET_KEY = os.getenv('TURNSTILE_SECRET_KEY', '')
 
+# ==================== БУФЕР ПРОСЛУШИВАНИЙ (record_play) ====================
+# События копятся в памяти процесса и пишутся в БД пачкой:
+# каждые PLAY_BUFFER_MAX_EVENTS событий или раз в PLAY_BUFFER_FLUSH_INTERVAL_MS мс
+PLAY_BUFFER_ENABLED = os.getenv('PLAY_BUFFER_ENABLED', 'True') == 'True'
+PLAY_BUFFER_MAX_EVENTS = int(os.getenv('PLAY_BUFFER_MAX_EVENTS', '200'))
+PLAY_BUFFER_FLUSH_INTERVAL_MS = int(os.getenv('PLAY_BUFFER_FLUSH_INTERVAL_MS', '500'))
+
+# ==================== ЗАЩИТА ОТ НАКРУТКИ ПРОСЛУШИВАНИЙ ====================
+# Лимиты скользящего окна в формате "N/секунды" (api/utils/play_protection.py)
+PLAY_PROTECTION_ENABLED = os.getenv('PLAY_PROTECTION_ENABLED', 'True') == 'True'
+PLAY_LIMIT_USER_TRACK = os.getenv('PLAY_LIMIT_USER_TRACK', '10/1800')
+PLAY_LIMIT_USER = os.getenv('PLAY_LIMIT_USER', '120/3600')
+PLAY_LIMIT_IP = os.getenv('PLAY_LIMIT_IP', '300/3600')
+
+# ==================== АРХИВ PLAYHISTORY ====================
+# Строки старше горизонта переносит в gzip-архивы команда archive_play_history
+PLAY_HISTORY_RETENTION_DAYS = int(os.getenv('PLAY_HISTORY_RETENTION_DAYS', '180'))
+PLAY_HISTORY_ARCHIVE_DIR = os.getenv('PLAY_HISTORY_ARCHIVE_DIR', os.path.join(BASE_DIR, 'archive', 'play_history'))
+
+# ==================== ТРЕНДЫ ====================
+# Рейтинг затухает вдвое за TRENDING_HALF_LIFE_HOURS (команда update_trending_scores)
+TRENDING_HALF_LIFE_HOURS = float(os.getenv('TRENDING_HALF_LIFE_HOURS', '24'))
+TRENDING_WINDOW_DAYS = int(os.getenv('TRENDING_WINDOW_DAYS', '7'))
+
+# ==================== ПОДСКАЗКИ ПОИСКА ====================
+# Префиксный индекс в памяти процесса (api/suggest_index.py)
+SUGGEST_INDEX_WARM = os.getenv('SUGGEST_INDEX_WARM', 'True') == 'True'
+SUGGEST_INDEX_REBUILD_SECONDS = int(os.getenv('SUGGEST_INDEX_REBUILD_SECONDS', '900'))
+
+# ==================== ЛЕНТА НОВОСТЕЙ (FAN-OUT ON WRITE) ====================
+# Inbox ленты раскладывает воркер `python manage.py process_feed_fanout`
+# (запускается рядом с воркером анализа аудио `python manage.py process_waveform_tasks`).
+# FEED_FANOUT_INLINE=True - раскладка сразу в процессе запроса; по умолчанию включена при DEBUG,
+# чтобы лента работала в разработке без воркера. В проде - FEED_FANOUT_INLINE=False + воркер.
+FEED_MAX_ITEMS = int(os.getenv('FEED_MAX_ITEMS', '500'))
+FEED_BACKFILL_LIMIT = int(os.getenv('FEED_BACKFILL_LIMIT', '50'))
+FEED_FANOUT_INLINE = os.getenv('FEED_FANOUT_INLINE', str(DEBUG)) == 'True'
+
 print(f"✅ Django settings loaded with JWT authentication only")
 print(f"✅ REST Framework: AllowAny permissions by default")
 print(f"✅ TokenAuthentication removed, only JWTAuthentication")